@@ -5,7 +5,7 @@ import { apiErrorToMessage } from "../../api_errors/api_errors";
 import AgentToolsSection from "./AgentToolSection";
 import Loading from "../../components/loading/Loading";
 import { useIsOnMobile } from "../../util/isOnMobile";
-import { resetAgentManagersForChat } from "../../util/utils";
+import { refreshAgentManagersForChat } from "../../util/utils";
 import AgentTemplateDeletionModal from "./components/AgentTemplateDeletionModal";
 
 
@@ -156,8 +156,8 @@ function AgentSection({ agentTemplateJson, allTools, onAgentCreationSuccess, ope
         setGotServerError(false);
         setServerMessage("Successfully modified agent.");
 
-        // A template was modified, so we reset all the chat agent managers.
-        await resetAgentManagersForChat();
+        // A template was modified, so we refresh all the chat agent managers.
+        await refreshAgentManagersForChat();
     }
 
     return (
@@ -383,8 +383,8 @@ export default function AgentTemplates() {
         // Refresh the UI.
         setRefreshToggle(prev => !prev);
 
-        // A template was deleted, so we reset all the chat agent managers.
-        await resetAgentManagersForChat();
+        // A template was deleted, so we refresh all the chat agent managers.
+        await refreshAgentManagersForChat();
     }
 
     function openDeleteModal(templateId: string) {
@@ -425,8 +425,8 @@ export default function AgentTemplates() {
                                 setAddingNewAgent(false);
                                 setRefreshToggle(prev => !prev);
 
-                                // A new template was added, so we reset all the chat agent managers.
-                                await resetAgentManagersForChat();
+                                // A new template was added, so we refresh all the chat agent managers.
+                                await refreshAgentManagersForChat();
                             }}
                             openDeleteModal={openDeleteModal} // unreachable
                         />
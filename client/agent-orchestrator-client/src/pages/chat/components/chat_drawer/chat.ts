@@ -20,3 +20,17 @@ export type ChatModificationJson = {
 export type NewChatData = {
   chatName: string
 };
+
+/**
+ * Status of a chat turn (i.e. a sent message) that the server runs in the background.
+ */
+export type TurnJobJson = {
+  id: string,
+  chat_id: string,
+  status: "queued" | "running" | "succeeded" | "failed",
+  attempts: number,
+  error: string | null,
+  created_at: number,
+  started_at: number | null,
+  finished_at: number | null,
+};
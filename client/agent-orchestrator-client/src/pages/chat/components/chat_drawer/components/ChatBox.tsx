@@ -2,12 +2,21 @@ import { useEffect, useState } from "react";
 import Loading from "../../../../../components/loading/Loading";
 import { Alert, AlertTitle, Box, Stack, TextField } from "@mui/material";
 import { useNavigate, useParams } from "react-router-dom";
-import type { Message } from "../../messages/message";
+import type { LiveEvent, Message, RunningTool } from "../../messages/message";
 import MessageList from "../../messages/MessageList";
+import LiveActivity from "../../messages/LiveActivity";
 import { useChatContext } from "../../../Chat";
-import type { ChatJson } from "../chat";
+import type { ChatJson, TurnJobJson } from "../chat";
 import { apiErrorToMessage, type ApiErrorJson } from "../../../../../api_errors/api_errors";
 
+const TURN_JOB_POLL_INTERVAL_MS = 1000;
+
+function withoutKey<T>(record: Record<string, T>, key: string): Record<string, T> {
+    const copy = { ...record };
+    delete copy[key];
+    return copy;
+}
+
 type ChatBoxProps = {
     chat: ChatJson
 };
@@ -18,10 +27,14 @@ type ChatBoxProps = {
  */
 function ChatBoxDisplay({ chat }: ChatBoxProps) {
     const [userMessage, setUserMessage] = useState("");
-    const [latestMsgTimestamp, setLatestMsgTimestamp] = useState(0.0);
     const [messages, setMessages] = useState<Message[]>([]);
 
-    const [waitingForServer, setWaitingForServer] = useState(true); 
+    // Partial responses (by agent name) and running tools (by tool call ID) of the agents currently generating a response.
+    const [liveDrafts, setLiveDrafts] = useState<Record<string, string>>({});
+    const [runningTools, setRunningTools] = useState<Record<string, RunningTool>>({});
+
+    const [loadingHistory, setLoadingHistory] = useState(true);
+    const [waitingForServer, setWaitingForServer] = useState(false); 
 
     const [serverErrorMessage, setServerErrorMessage] = useState("");
 
@@ -33,23 +46,32 @@ function ChatBoxDisplay({ chat }: ChatBoxProps) {
         // Reset the chat state since it might still be lingering.
         // This effect fires whenever the chat is told to refresh, to ensure 
         // that it is actually refreshed, the state must be reset.
-        const resetTimestamp = 0.0;
-        resetChatState(resetTimestamp);
+        resetChatState();
+
+        // The server first sends the entire history for this chat, followed by a 
+        // "ready" event, and then pushes new messages as soon as they are created.
+        // On reconnects, the browser automatically resumes from the last received message.
+        const eventSource = new EventSource(buildStreamMessagesUrl());
 
-        const controller = new AbortController();
-        const signal = controller.signal;
+        eventSource.addEventListener("trace", (e) => {
+            const message: Message = JSON.parse((e as MessageEvent).data);
+            processMessage(message);
+        });
 
-        const fetchChatHistory = async () => {
-            // This always fetches the entire history for this chat.
-            await fetchNewestChatMessages(resetTimestamp, signal);
+        eventSource.addEventListener("live", (e) => {
+            const liveEvent: LiveEvent = JSON.parse((e as MessageEvent).data);
+            processLiveEvent(liveEvent);
+        });
 
-            setWaitingForServer(false);
-        };
-        fetchChatHistory();
+        eventSource.addEventListener("ready", () => {
+            // Live activity from before a reconnect may be stale.
+            resetLiveActivity();
+            setLoadingHistory(false);
+        });
 
         // Cleanup function. Required to avoid state issues with React.
         return () => {
-            controller.abort();
+            eventSource.close();
         };
 
         // The dependency on chatId on useEffect is required so that 
@@ -57,17 +79,49 @@ function ChatBoxDisplay({ chat }: ChatBoxProps) {
         // changes the chat ID.
     }, [chat.id, currentChatRefreshToggle]);
 
-    function resetChatState(resetTimestamp: number) {
-        setWaitingForServer(true);
+    function resetChatState() {
+        setLoadingHistory(true);
         setMessages([]);
-        setLatestMsgTimestamp(resetTimestamp);
+        resetLiveActivity();
+    }
+
+    function resetLiveActivity() {
+        setLiveDrafts({});
+        setRunningTools({});
     }
 
-    function processMessages(newMessages: Message[]) {
-        if (newMessages.length > 0) {
-            setLatestMsgTimestamp(newMessages.at(-1)!.timestamp);
+    function processLiveEvent(liveEvent: LiveEvent) {
+        if (liveEvent.kind === "ai_token") {
+            setLiveDrafts(prev => ({ ...prev, [liveEvent.agent_name]: (prev[liveEvent.agent_name] ?? "") + liveEvent.content }));
+        }
+        else if (liveEvent.kind === "ai_message_end") {
+            // The complete response is pushed separately as an "ai_message" message.
+            setLiveDrafts(prev => withoutKey(prev, liveEvent.agent_name));
+        }
+        else if (liveEvent.kind === "tool_start") {
+            // Any text generated before a tool call is part of a response that is not shown to the user.
+            setLiveDrafts(prev => withoutKey(prev, liveEvent.agent_name));
+            setRunningTools(prev => ({ 
+                ...prev, 
+                [liveEvent.tool_call_id]: { agent_name: liveEvent.agent_name, tool_name: liveEvent.tool_name },
+            }));
         }
-        setMessages(prevMessages => [...prevMessages, ...newMessages]);
+        else if (liveEvent.kind === "tool_end") {
+            setRunningTools(prev => withoutKey(prev, liveEvent.tool_call_id));
+        }
+    }
+
+    function processMessage(newMessage: Message) {
+        setMessages(prevMessages => {
+            // Messages may be re-sent after a reconnect.
+            if (prevMessages.some(m => m.id === newMessage.id)) {
+                return prevMessages;
+            }
+
+            // Keep the messages sorted by their timestamp, since messages 
+            // are not necessarily pushed in the order in which they were created.
+            return [...prevMessages, newMessage].sort((a, b) => a.timestamp - b.timestamp);
+        });
     }
 
     function buildChatMessageExcludeFilterQueryUrlParams() {
@@ -83,22 +137,13 @@ function ChatBoxDisplay({ chat }: ChatBoxProps) {
         return `?${excludeFilterQueries.toString()}`;
     }
 
-    function buildFetchNewstMessagesUrl(timestamp: number) {
-        const basePath = `/api/chat/${chat.id}/get-latest-messages/${timestamp}/`;
+    function buildStreamMessagesUrl() {
+        const basePath = `/api/chat/${chat.id}/stream-messages/`;
         const excludeFilterParams = buildChatMessageExcludeFilterQueryUrlParams();
 
         return `${basePath}${excludeFilterParams}`;
     }
 
-    async function fetchNewestChatMessages(timestamp: number, abortSignal?: AbortSignal) {
-        const fetchUrl = buildFetchNewstMessagesUrl(timestamp);
-
-        const resp = await fetch(fetchUrl, { signal: abortSignal });
-        const latestMessages: Message[] = await resp.json();
-
-        processMessages(latestMessages);
-    }
-
     async function submitUserMessage() {
         setWaitingForServer(true);
         setServerErrorMessage("");
@@ -126,25 +171,46 @@ function ChatBoxDisplay({ chat }: ChatBoxProps) {
             setWaitingForServer(false);
             setServerErrorMessage(errMessage);
 
-            // Still (oportunistically) fetch any partially sent messages.
-            await fetchNewestChatMessages(latestMsgTimestamp);
-
+            // Any partially sent messages are pushed by the server through the message stream.
             return;
         }
 
         setUserMessage("");
+
+        // The server only queues the message, so wait until the agents are done responding to it.
+        // The responses themselves are pushed by the server through the message stream.
+        const job: TurnJobJson = await resp.json();
+        const finishedJob = await waitForTurnJob(job);
+
         setWaitingForServer(false);
-        setServerErrorMessage("");
 
-        const respJson = await resp.json();
-        console.log(respJson);  // this response does not contain useful info
+        if (finishedJob !== null && finishedJob.status === "failed") {
+            setServerErrorMessage(finishedJob.error ?? "Unknown error while sending chat message.");
+        }
+    }
+
+    async function waitForTurnJob(job: TurnJobJson): Promise<TurnJobJson | null> {
+        while (job.status === "queued" || job.status === "running") {
+            await new Promise(resolve => setTimeout(resolve, TURN_JOB_POLL_INTERVAL_MS));
+
+            const resp = await fetch(`/api/chat/${chat.id}/jobs/${job.id}/`);
+
+            if (!resp.ok) {
+                if (resp.statusText === "Unauthorized") {
+                    navigate("/login");
+                }
+                return null;
+            }
+
+            job = await resp.json();
+        }
 
-        await fetchNewestChatMessages(latestMsgTimestamp);
+        return job;
     }
 
     async function handleChatTextFieldKeyDown(e: React.KeyboardEvent<HTMLDivElement>) {
         // Do nothing if the client is waiting for the server to process the last message.
-        if (waitingForServer) {
+        if (loadingHistory || waitingForServer) {
             e.preventDefault();
             return;
         }
@@ -189,6 +255,7 @@ function ChatBoxDisplay({ chat }: ChatBoxProps) {
                     aria-label={`Message History for chat '${chat.name}'`}
                 >
                     <MessageList messages={messages} />
+                    <LiveActivity drafts={liveDrafts} runningTools={runningTools} />
                 </Box>
 
                 {(serverErrorMessage.length === 0)? <></> : (
@@ -198,7 +265,7 @@ function ChatBoxDisplay({ chat }: ChatBoxProps) {
                 )}
 
                 <Box aria-live="polite">
-                    {(waitingForServer) ? <Loading /> : <></>}
+                    {(loadingHistory || waitingForServer) ? <Loading /> : <></>}
                     <TextField 
                         fullWidth
                         multiline 
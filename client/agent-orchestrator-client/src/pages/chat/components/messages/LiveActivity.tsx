@@ -0,0 +1,42 @@
+import { Alert, Box, Stack, Typography } from "@mui/material";
+import Markdown from "react-markdown";
+import type { RunningTool } from "./message";
+
+type LiveActivityProps = {
+    drafts: Record<string, string>,
+    runningTools: Record<string, RunningTool>,
+};
+
+/**
+ * Renders the responses that agents are currently generating, 
+ * along with the tools that are currently running.
+ */
+export default function LiveActivity({ drafts, runningTools }: LiveActivityProps) {
+    const toolEntries = Object.entries(runningTools);
+    const draftEntries = Object.entries(drafts);
+
+    if (toolEntries.length === 0 && draftEntries.length === 0) {
+        return <></>;
+    }
+
+    return (
+        <Stack spacing={2} sx={{ marginTop: 4 }}>
+            {toolEntries.map(([toolCallId, tool]) => (
+                <Alert severity="info" key={toolCallId}>
+                    <Typography component="span" style={{ fontWeight: "bold" }}>
+                        {tool.agent_name}
+                    </Typography> is running '{tool.tool_name}'...
+                </Alert>
+            ))}
+
+            {draftEntries.map(([agentName, content]) => (
+                <Box key={agentName}>
+                    <Typography component="span" style={{ fontWeight: "bold" }}>
+                        {agentName}
+                    </Typography>
+                    <Markdown>{content}</Markdown>
+                </Box>
+            ))}
+        </Stack>
+    );
+}
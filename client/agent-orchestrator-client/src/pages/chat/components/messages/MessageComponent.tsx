@@ -1,8 +1,12 @@
+import { useState } from "react";
 import { Alert, AlertTitle, Box, Paper, Typography } from "@mui/material";
 import type { Message } from "./message";
 import Markdown from "react-markdown";
 import { useIsOnMobile } from "../../../../util/isOnMobile";
 
+// Largest side of the thumbnails made by the server (its `TRACE_IMAGE_THUMBNAIL_MAX_SIZE`, 320 by default).
+const THUMBNAIL_MAX_SIZE = 320;
+
 type MessageComponentProps = {
     message: Message
 };
@@ -13,6 +17,9 @@ type MessageComponentProps = {
 export default function MessageComponent({ message }: MessageComponentProps) {
     const isMobile = useIsOnMobile();
 
+    // Images are shown as thumbnails until they are clicked.
+    const [showFullImage, setShowFullImage] = useState(false);
+
     let msgContent;
 
     if (message.kind === "ai_message") {
@@ -67,6 +74,8 @@ export default function MessageComponent({ message }: MessageComponentProps) {
         );
     }
     else if (message.kind === "image") {
+        const imageSize = imageDisplaySize(message, showFullImage);
+
         msgContent = (
             <Box 
                 sx={{
@@ -74,7 +83,20 @@ export default function MessageComponent({ message }: MessageComponentProps) {
                     textAlign: 'center',
                 }}
             >
-                <img src={`data:image/jpeg;base64,${message.base64_encoded_image}`} alt={message.caption} style={{ maxWidth: '100%' }} />
+                <img 
+                    src={imageSource(message, showFullImage)} 
+                    alt={message.caption} 
+                    width={imageSize?.width}
+                    height={imageSize?.height}
+                    loading="lazy" 
+                    title={showFullImage ? undefined : "Show the full image"}
+                    onClick={() => setShowFullImage(true)}
+                    style={{ 
+                        maxWidth: '100%', 
+                        height: 'auto', 
+                        cursor: showFullImage || message.thumbnail_url === null ? 'default' : 'zoom-in',
+                    }} 
+                />
                 <Typography variant="caption" display="block" sx={{ color: 'text.secondary', marginTop: '4px' }}>
                     {message.caption}
                 </Typography>
@@ -128,4 +150,42 @@ export default function MessageComponent({ message }: MessageComponentProps) {
     }
 
     return msgContent;
-}
\ No newline at end of file
+}
+
+
+type ImageMessage = Extract<Message, { kind: "image" }>;
+
+/**
+ * Returns the source of the image of the given message: its thumbnail, unless the full image is requested.
+ */
+function imageSource(message: ImageMessage, showFullImage: boolean): string {
+    if (message.image_url === null) {
+        return `data:image/jpeg;base64,${message.base64_encoded_image}`;
+    }
+
+    if (showFullImage || message.thumbnail_url === null) {
+        return message.image_url;
+    }
+
+    return message.thumbnail_url;
+}
+
+/**
+ * Returns the size at which the image of the given message is shown, which reserves its space before it loads. 
+ * While the thumbnail is shown, the image's size is scaled down to the thumbnail's bounds, so that the thumbnail 
+ * isn't upscaled. Returns `undefined` if the image's size is unknown.
+ */
+function imageDisplaySize(message: ImageMessage, showFullImage: boolean): { width: number, height: number } | undefined {
+    if (message.image_width === null || message.image_height === null) {
+        return undefined;
+    }
+
+    const showsThumbnail = imageSource(message, showFullImage) === message.thumbnail_url;
+    const scale = (showsThumbnail)? 
+        Math.min(1, THUMBNAIL_MAX_SIZE / Math.max(message.image_width, message.image_height)) : 1;
+
+    return {
+        width: Math.round(message.image_width * scale),
+        height: Math.round(message.image_height * scale),
+    };
+}
@@ -28,8 +28,47 @@ type MessagePayload =
     }
     | {
         kind: "image",
-        base64_encoded_image: string,
         caption: string,
+        image_url: string | null,
+        thumbnail_url: string | null,
+        image_width: number | null,
+        image_height: number | null,
+        // Only set for images that were traced before images were stored separately.
+        base64_encoded_image: string | null,
     };
 
-export type MessageFilter = 'tool' | 'image' | 'ai_message' | 'human_message';
\ No newline at end of file
+export type MessageFilter = 'tool' | 'image' | 'ai_message' | 'human_message';
+/**
+ * Live events pushed by the API while an agent is generating its response. 
+ * These are never stored; the final response arrives as an "ai_message" message.
+ */
+export type LiveEvent = 
+    | {
+        kind: "ai_token",
+        agent_name: string,
+        content: string,
+    }
+    | {
+        kind: "ai_message_end",
+        agent_name: string,
+        content: string,
+    }
+    | {
+        kind: "tool_start",
+        agent_name: string,
+        tool_name: string,
+        tool_call_id: string,
+        arguments: object,
+    }
+    | {
+        kind: "tool_end",
+        agent_name: string,
+        tool_name: string,
+        tool_call_id: string,
+        is_error: boolean,
+    };
+
+export type RunningTool = {
+    agent_name: string,
+    tool_name: string,
+};
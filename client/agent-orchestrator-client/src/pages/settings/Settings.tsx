@@ -2,7 +2,7 @@ import { Alert, Box, Button, Card, CardContent, Container, FormControl, InputLab
 import { useEffect, useRef, useState } from "react";
 import { getTimeZones } from '@vvo/tzdb';
 import Loading from "../../components/loading/Loading";
-import { resetAgentManagersForChat } from "../../util/utils";
+import { refreshAgentManagersForChat } from "../../util/utils";
 
 // Get the list of time zones and sort them alphabetically.
 const timezones = getTimeZones({ includeUtc: true }).sort((a, b) => {
@@ -134,8 +134,8 @@ export default function Settings() {
 
         setWaitingForServer(false);
 
-        // Settings changed, so we reset the agent managers for the chats.
-        await resetAgentManagersForChat();
+        // Settings changed, so we refresh the agent managers for the chats.
+        await refreshAgentManagersForChat();
     }
 
     return (
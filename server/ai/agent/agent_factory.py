@@ -3,12 +3,18 @@ from ai.agent_manager.agent_context import AgentCtx
 from ai.tools.registry.tool_factory_store import get_tool_factory_in_mem_store, ToolFactoryInMememoryStore, ToolFactory
 from ai.agent.templates.schemas import AgentTemplateSchema
 from ai.agent.runtime.runtime_agent import RuntimeAgent
+from ai.agent.runtime.lazy_agent import LazyAgent
+from ai.agent_manager.agent_context import use_scoped_agent_db
 from ai.agent.templates.agent_templates import get_all_agent_template_schemas_for_user
 from ai.agent.runtime.agent_tool_callback_logger import AgentToolCallbackLogger
 from ai.tracing.tracer import Tracer
 from auth.tables import UserTable
-from langgraph.checkpoint.memory import InMemorySaver
-from typing import Callable
+from ai.checkpointing.agent_checkpointers import create_agent_checkpointer, get_agent_thread_id, uses_durable_checkpointer
+from database.database import SessionLocal
+from langchain_core.tools import BaseTool
+from typing import Callable, Sequence
+import hashlib
+import json
 
 # Side effect imports to register the tools.
 import ai.tools.control_flow as _
@@ -39,6 +45,16 @@ def extract_tool_from_factory(tool_factory_store: ToolFactoryInMememoryStore, ct
     return tool_factory(ctx)
 
 
+def _get_tool_name(tool: Callable) -> str:
+    """
+    Returns the name that the agents use for calling the given tool.
+    """
+    if isinstance(tool, BaseTool):
+        return tool.name
+    
+    return tool.__name__
+
+
 def runtime_agent_from_agent_template(
     ctx: AgentCtx, 
     owner: UserTable, 
@@ -55,6 +71,12 @@ def runtime_agent_from_agent_template(
         for tool_schema in agent_template.tools
     ]
 
+    serial_tool_names = {
+        _get_tool_name(tool) 
+        for tool, tool_schema in zip(tools, agent_template.tools) 
+        if not tool_factory_store.is_parallel_safe(tool_schema.id)
+    }
+
     return RuntimeAgent(
         name=agent_template.name,
         persona=agent_template.persona,
@@ -62,23 +84,78 @@ def runtime_agent_from_agent_template(
         user=owner,
         chat_summaries=ctx.manager.get_chat_summary_dict(),
         tools=tools,
+        serial_tool_names=serial_tool_names,
         callbacks=[AgentToolCallbackLogger(tracer, agent_template.name)],
-        checkpointer=InMemorySaver(),
+        checkpointer=create_agent_checkpointer(),
+        graph_cache_key=str(agent_template.id),
+        thread_id=get_agent_thread_id(ctx.manager.get_chat_id(), agent_template.id),
+        on_context_summarized=lambda summary: ctx.manager.set_chat_summary_for_agent(ctx.db, agent_template.name, summary),
+    )
+
+
+def get_agent_fingerprint(owner: UserTable, agent_template: AgentTemplateSchema) -> str:
+    """
+    Returns a fingerprint of everything that an agent built from the given template depends on, i.e. the 
+    template itself and the info and settings of its owner (which are part of its prompt).
+    """
+    settings = owner.settings
+    definition = {
+        "template": agent_template.model_dump(mode="json"),
+        "user": [owner.username, owner.full_name],
+        "settings": [settings.language, settings.city, settings.country, settings.timezone],
+    }
+
+    return hashlib.sha256(json.dumps(definition, sort_keys=True).encode()).hexdigest()
+
+
+def lazy_runtime_agent_from_agent_template(
+    ctx: AgentCtx, 
+    owner: UserTable, 
+    tool_factory_store: ToolFactoryInMememoryStore, 
+    agent_template: AgentTemplateSchema,
+    tracer: Tracer,
+) -> LazyAgent:
+    """
+    Returns an agent that is only loaded from the given agent template schema once it's first used.
+    """
+    owner_id = owner.id
+
+    def build_agent() -> RuntimeAgent:
+        # The agent may be built long after the session that loaded the owner was closed (and from another 
+        # thread), so it's built with a session of its own.
+        with SessionLocal() as db, use_scoped_agent_db(db):
+            owner_in_db = db.get(UserTable, owner_id)
+            assert owner_in_db
+
+            return runtime_agent_from_agent_template(ctx, owner_in_db, tool_factory_store, agent_template, tracer)
+
+    return LazyAgent(
+        agent_template.name, 
+        build_agent, 
+        durable_memory=uses_durable_checkpointer(), 
+        fingerprint=get_agent_fingerprint(owner, agent_template),
     )
 
 
-def get_agents_for_user(ctx: AgentCtx, owner: UserTable, tracer: Tracer) -> list[IAgent]:
+def get_agents_for_user(
+    ctx: AgentCtx, 
+    owner: UserTable, 
+    tracer: Tracer, 
+    agent_templates: Sequence[AgentTemplateSchema] | None = None,
+) -> list[IAgent]:
     """
     This function converts the agent templates associated with the given user to a list 
-    of runtime agents.
+    of runtime agents. The templates are loaded once (unless they're given), while each agent 
+    is built when it's first used.
     """
 
     tool_factory_registry = get_tool_factory_in_mem_store()
-    agent_templates = get_all_agent_template_schemas_for_user(ctx.db, owner)
+    if agent_templates is None:
+        agent_templates = get_all_agent_template_schemas_for_user(ctx.db, owner)
 
     agents: list[IAgent] = [
-        runtime_agent_from_agent_template(ctx, owner, tool_factory_registry, template, tracer) 
+        lazy_runtime_agent_from_agent_template(ctx, owner, tool_factory_registry, template, tracer) 
         for template in agent_templates
     ]
 
-    return agents
\ No newline at end of file
+    return agents
@@ -30,6 +30,14 @@ def seed_agent_templates(db: Session):
     if tool_table_populated:
         existing_tools = { tool.id: tool for tool in db.scalars(select(ToolTable)) }
 
+        # Add the tools that were introduced after the DB was first seeded.
+        for tool_data in load_tool_seeds():
+            if tool_data["id"] not in existing_tools:
+                print(f"LOG: Seeding new tool `{tool_data['id']}`")
+                tool = ToolTable(**tool_data)
+                db.add(tool)
+                existing_tools[tool.id] = tool
+
     else:
         print("LOG: Seeding default tools")
         existing_tools = {}
@@ -45,6 +53,8 @@ def seed_agent_templates(db: Session):
 
     if agent_table_populated:
         print("LOG: agent template seeding skipped; agent templates already exist")
+        _link_missing_seed_tools(db, existing_tools)
+        db.commit()
         return
 
     for agent_template_data in load_agent_template_seeds():
@@ -67,4 +77,23 @@ def seed_agent_templates(db: Session):
 
     db.commit()
     print("LOG: finished seeding database with default agent templates and tools")
-    
+
+
+def _link_missing_seed_tools(db: Session, existing_tools: dict[str, ToolTable]):
+    """
+    Links the already seeded (global) agent templates to the tools that their seeds list but that they aren't 
+    linked to, such as the tools that were introduced after the DB was first seeded. Global templates can't be 
+    modified by users, so their tools always follow their seeds.
+    """
+    for agent_template_data in load_agent_template_seeds():
+        agent_template = db.get(AgentTemplateTable, UUID(agent_template_data["id"]))
+        if agent_template is None or agent_template.user_id is not None:
+            continue
+
+        linked_tool_ids = { tool.id for tool in agent_template.tools }
+
+        for tool in agent_template_data["tools"]:
+            tool_in_db = existing_tools.get(tool['id'])
+            if tool_in_db is not None and tool['id'] not in linked_tool_ids:
+                print(f"LOG: Linking tool `{tool['id']}` to agent template `{agent_template.name}`")
+                agent_template.tools.append(tool_in_db)
@@ -0,0 +1,132 @@
+"""
+This module holds the process-wide caches of chat models and compiled agent graphs, which are shared by the agents of every chat.
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+from langchain.chat_models import init_chat_model
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.tools import BaseTool, StructuredTool
+from langgraph.graph.graph import CompiledGraph
+
+from utils.utils import get_env_int_or_default
+
+_MAX_GRAPHS = get_env_int_or_default("AGENT_GRAPH_CACHE_MAX_ENTRIES", 128)
+
+
+class AgentGraphCache:
+    """
+    A bounded (LRU) cache of compiled agent graphs. A compiled graph holds the structure of an agent (its nodes, 
+    chat model binding and tool schemas), but none of the state of a chat, so it can be shared by the agents 
+    of every chat that have the same template and tool set.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+
+        self._graphs: OrderedDict[Hashable, CompiledGraph] = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+
+    def get_or_compile(self, key: Hashable, compile_graph: Callable[[], CompiledGraph]) -> CompiledGraph:
+        """
+        Returns the graph cached under the given key. Compiles and caches the graph on a miss.
+        """
+        with self._lock:
+            graph = self._graphs.get(key)
+
+            if graph is not None:
+                self.hits += 1
+                self._graphs.move_to_end(key)
+                return graph
+            
+            self.misses += 1
+
+        # Compiled without holding the lock; if two threads race, both graphs are equivalent.
+        graph = compile_graph()
+
+        with self._lock:
+            self._graphs[key] = graph
+            self._graphs.move_to_end(key)
+
+            while len(self._graphs) > self.max_entries:
+                self._graphs.popitem(last=False)
+
+        return graph
+
+
+    def __len__(self) -> int:
+        return len(self._graphs)
+
+
+_SINGLETON_GRAPH_CACHE = AgentGraphCache(_MAX_GRAPHS)
+
+def get_agent_graph_cache() -> AgentGraphCache:
+    """
+    Returns the singleton agent graph cache.
+    """
+    return _SINGLETON_GRAPH_CACHE
+
+
+_chat_models: dict[tuple[str, float], BaseChatModel] = {}
+_chat_models_lock = threading.Lock()
+
+def get_shared_chat_model(model: str, temperature: float) -> BaseChatModel:
+    """
+    Returns the process-wide chat model (client) with the given settings, creating it on first use.
+    """
+    key = (model, temperature)
+
+    with _chat_models_lock:
+        chat_model = _chat_models.get(key)
+
+        if chat_model is None:
+            chat_model = init_chat_model(model, temperature=temperature)
+            _chat_models[key] = chat_model
+
+        return chat_model
+
+
+def fingerprint_tools(tools_by_name: dict[str, BaseTool]) -> str:
+    """
+    Returns a fingerprint of the schemas of the given tools (i.e. of what the chat model sees), 
+    which identifies the tool set of a graph.
+    """
+    schemas = [
+        {
+            "name": tool.name,
+            "description": tool.description,
+            "args": tool.tool_call_schema.model_json_schema() if hasattr(tool.tool_call_schema, "model_json_schema") else str(tool.tool_call_schema),
+            "return_direct": tool.return_direct,
+        }
+        for _, tool in sorted(tools_by_name.items())
+    ]
+
+    return hashlib.sha256(json.dumps(schemas, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def detached_tool_stubs(tools_by_name: dict[str, BaseTool]) -> list[BaseTool]:
+    """
+    Returns stubs with the same schemas as the given tools. A shared graph is compiled with stubs, so that it 
+    doesn't hold on to the tools of the agent that compiled it (which reference that agent's chat).
+    """
+    def unbound_tool(**kwargs):
+        raise RuntimeError("the tools of a shared agent graph must be supplied through the config")
+
+    return [
+        StructuredTool(
+            name=tool.name, 
+            description=tool.description, 
+            args_schema=tool.args_schema, 
+            func=unbound_tool, 
+            return_direct=tool.return_direct,
+        )
+        for tool in tools_by_name.values()
+    ]
@@ -1,4 +1,6 @@
-from typing import Protocol
+from typing import AsyncIterator, Protocol
+from ai.tracing.schemas import AgentStreamEvent
+from ai.agent.runtime.schemas import AgentStats
 
 class IAgent(Protocol):
     """
@@ -12,3 +14,59 @@ class IAgent(Protocol):
     def invoke_with_text(self, text_input: str) -> str:
         ...
 
+
+    async def ainvoke_with_text(self, text_input: str) -> str:
+        ...
+
+
+    def astream_with_text(self, text_input: str) -> AsyncIterator[AgentStreamEvent]:
+        """
+        Streams the agent's response as live events. The last event is always an 
+        :py:class:`ai.tracing.schemas.AgentMessageEndEvent` holding the full response.
+        """
+        ...
+
+
+    def export_memory(self) -> list[dict]:
+        """
+        Returns the agent's conversation memory as a list of JSON-serializable message dicts.
+        """
+        ...
+
+
+    def import_memory(self, messages: list[dict]) -> None:
+        """
+        Restores a conversation memory previously returned by :py:meth:`export_memory`.
+        """
+        ...
+
+
+    def estimate_memory_bytes(self) -> int:
+        """
+        Returns a rough estimate of the memory held by the agent (e.g. by its conversation history), in bytes.
+        """
+        ...
+
+
+    def has_durable_memory(self) -> bool:
+        """
+        Returns whether the agent's conversation memory is persisted by its checkpointer (e.g. in the DB), 
+        in which case it doesn't need to be exported along with the state of its manager.
+        """
+        ...
+
+
+    def get_fingerprint(self) -> str | None:
+        """
+        Returns a fingerprint of the definition that the agent was built from (e.g. its template and the settings 
+        of its user), or `None` if unknown. Agents with the same fingerprint are interchangeable.
+        """
+        ...
+
+
+    def get_stats(self) -> AgentStats:
+        """
+        Returns the stats of the agent as of its latest invocation. Meant to be cheap enough to be called often, 
+        so it doesn't read the agent's checkpoints.
+        """
+        ...
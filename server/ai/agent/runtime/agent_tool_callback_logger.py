@@ -1,9 +1,11 @@
+from datetime import datetime, timezone
 from typing import Any
 from uuid import UUID
 from langchain.callbacks.base import BaseCallbackHandler
 
 from ai.tracing.schemas import ToolTrace
 from ai.tracing.tracer import Tracer
+from ai.agent.runtime.concurrent_tool_node import TOOL_CALL_INDEX_METADATA_KEY
 
 from dataclasses import dataclass
 
@@ -17,6 +19,10 @@ class AgentToolCallStart:
     description: str
     call_args: dict[str, Any]
 
+    # Position of the call within its agent step. Tool calls of the same agent step may run concurrently and 
+    # finish in any order, so their traces are added in this order once the whole step finished.
+    step_index: int | None = None
+
 
 class AgentToolCallbackLogger(BaseCallbackHandler):
     """
@@ -29,6 +35,9 @@ class AgentToolCallbackLogger(BaseCallbackHandler):
         self.agent_name = agent_name
         self.pending_tool_args: dict[UUID, AgentToolCallStart] = {}
 
+        # Traces of the tool calls that finished, by the run ID of their agent step and by their position in it.
+        self.finished_step_tool_traces: dict[UUID, dict[int, ToolTrace]] = {}
+
 
     def on_tool_start(
         self, 
@@ -46,6 +55,7 @@ class AgentToolCallbackLogger(BaseCallbackHandler):
             name=serialized['name'],
             description=serialized['description'],
             call_args=inputs or {},
+            step_index=(metadata or {}).get(TOOL_CALL_INDEX_METADATA_KEY),
         )
 
         return super().on_tool_start(serialized, input_str, run_id=run_id, parent_run_id=parent_run_id, tags=tags, metadata=metadata, inputs=inputs, **kwargs)
@@ -58,12 +68,16 @@ class AgentToolCallbackLogger(BaseCallbackHandler):
 
             # We don't have access to a DB session so we add the tool trace as pending.
             # They are committed to the DB by the agent manager which does have a DB session.
-            self.tracer.add_pending(ToolTrace(
+            tool_trace = ToolTrace(
                 called_by=self.agent_name,
                 name=tool_call_start.name,
                 bound_arguments=tool_call_start.call_args,
                 return_value=ret,
-            ))
+            )
+            if tool_call_start.step_index is None or parent_run_id is None:
+                self.tracer.add_pending(tool_trace)
+            else:
+                self.finished_step_tool_traces.setdefault(parent_run_id, {})[tool_call_start.step_index] = tool_trace
             
         else:
             print(f"LOG: unknown tool run ID '{run_id}'")
@@ -82,3 +96,33 @@ class AgentToolCallbackLogger(BaseCallbackHandler):
             print(f"LOG: unknown tool run ID '{run_id}'")
 
         return super().on_tool_error(error, run_id=run_id, parent_run_id=parent_run_id, **kwargs)
+
+
+    def on_chain_end(self, outputs: dict[str, Any], *, run_id: UUID, parent_run_id: UUID | None = None, **kwargs: Any) -> Any:
+        self._add_finished_step_tool_traces(run_id)
+        return super().on_chain_end(outputs, run_id=run_id, parent_run_id=parent_run_id, **kwargs)
+
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, parent_run_id: UUID | None = None, **kwargs: Any) -> Any:
+        self._add_finished_step_tool_traces(run_id)
+        return super().on_chain_error(error, run_id=run_id, parent_run_id=parent_run_id, **kwargs)
+
+
+    def _add_finished_step_tool_traces(self, step_run_id: UUID):
+        """
+        Adds the traces of the tool calls of the given agent step (if any) in the order of the calls. They're 
+        timestamped when the step finished, so that they come after every trace that was added (and possibly 
+        already committed and sent to the user) while the tools were running, such as the images they made.
+        """
+        tool_traces = self.finished_step_tool_traces.pop(step_run_id, None)
+        if tool_traces is None:
+            return
+        
+        step_finished_at = datetime.now(tz=timezone.utc).timestamp()
+
+        for position, step_index in enumerate(sorted(tool_traces)):
+            tool_trace = tool_traces[step_index]
+
+            # One microsecond apart, which is enough to keep the order without overlapping with later traces.
+            tool_trace.timestamp = step_finished_at + position * 1e-6
+            self.tracer.add_pending(tool_trace)
@@ -0,0 +1,131 @@
+import asyncio
+import copy
+from typing import Any, Optional, Sequence
+
+from langchain_core.messages import ToolMessage
+from langchain_core.runnables.config import RunnableConfig, get_config_list, get_executor_for_config
+from langgraph.prebuilt import ToolNode
+from langgraph.store.base import BaseStore
+
+TOOL_CALL_INDEX_METADATA_KEY = "tool_call_index"
+"""
+Config metadata key holding the position of a tool call within the tool calls of its agent step.
+"""
+
+TOOLS_BY_NAME_CONFIG_KEY = "agent_tools_by_name"
+"""
+Configurable key holding the tools (by name) that the tool node should run instead of its own tools. Used when 
+the graph is shared by several agents, each of which has its own tool implementations (with the same schemas).
+"""
+
+
+class ConcurrentToolNode(ToolNode):
+    """
+    Tool node that runs the tool calls of an agent step concurrently, using at most :py:attr:`max_concurrency`
+    workers. The tools named in :py:attr:`serial_tool_names` opted out of running concurrently (e.g. because they
+    have side effects), so they run one after another in the order that they were called, while the other
+    tools of the step run alongside them.
+
+    Each tool call is tagged with its position within the step, so that tool traces can be ordered 
+    deterministically even though the tools finish in any order.
+    """
+
+    def __init__(self, tools: Sequence[Any], serial_tool_names: set[str], max_concurrency: int):
+        super().__init__(tools)
+        self.serial_tool_names = serial_tool_names
+        self.max_concurrency = max_concurrency
+
+
+    def _func(self, input: Any, config: RunnableConfig, *, store: Optional[BaseStore]) -> Any:
+        node = self._with_invocation_tools(config)
+
+        tool_calls, input_type = node._parse_input(input, store)
+        config_list = _tag_tool_call_configs(config, len(tool_calls))
+        parallel_indices, serial_indices = node._partition_tool_calls(tool_calls)
+
+        outputs: list[ToolMessage] = [None] * len(tool_calls)  # type: ignore
+
+        def run(i: int):
+            outputs[i] = node._run_one(tool_calls[i], input_type, config_list[i])
+
+        def run_serial():
+            for i in serial_indices:
+                run(i)
+
+        with get_executor_for_config({**config, "max_concurrency": self.max_concurrency}) as executor:
+            futures = [executor.submit(run, i) for i in parallel_indices]
+            if len(serial_indices) > 0:
+                futures.append(executor.submit(run_serial))
+
+            for future in futures:
+                future.result()
+
+        return node._combine_tool_outputs(outputs, input_type)
+
+
+    async def _afunc(self, input: Any, config: RunnableConfig, *, store: Optional[BaseStore]) -> Any:
+        node = self._with_invocation_tools(config)
+
+        tool_calls, input_type = node._parse_input(input, store)
+        config_list = _tag_tool_call_configs(config, len(tool_calls))
+        parallel_indices, serial_indices = node._partition_tool_calls(tool_calls)
+
+        outputs: list[ToolMessage] = [None] * len(tool_calls)  # type: ignore
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run(i: int):
+            async with semaphore:
+                outputs[i] = await node._arun_one(tool_calls[i], input_type, config_list[i])
+
+        async def run_serial():
+            for i in serial_indices:
+                await run(i)
+
+        await asyncio.gather(*(run(i) for i in parallel_indices), run_serial())
+
+        return node._combine_tool_outputs(outputs, input_type)
+
+
+    def _with_invocation_tools(self, config: RunnableConfig) -> "ConcurrentToolNode":
+        """
+        Returns a (shallow) copy of this node that runs the tools supplied in the config, if any. Otherwise returns this node.
+        """
+        tools_by_name = config.get("configurable", {}).get(TOOLS_BY_NAME_CONFIG_KEY)
+        if tools_by_name is None:
+            return self
+
+        node = copy.copy(self)
+        node.tools_by_name = tools_by_name
+        return node
+
+
+    def _partition_tool_calls(self, tool_calls: list) -> tuple[list[int], list[int]]:
+        """
+        Splits the indices of the given tool calls into those that can run concurrently and those that must run serially.
+        """
+        parallel_indices = []
+        serial_indices = []
+
+        for i, tool_call in enumerate(tool_calls):
+            if tool_call["name"] in self.serial_tool_names:
+                serial_indices.append(i)
+            else:
+                parallel_indices.append(i)
+
+        return parallel_indices, serial_indices
+
+
+def _tag_tool_call_configs(config: RunnableConfig, tool_call_count: int) -> list[RunnableConfig]:
+    """
+    Returns a config for each tool call, whose metadata holds the call's position within the step.
+    """
+    return [
+        {
+            **tool_call_config,
+            "metadata": {
+                **tool_call_config.get("metadata", {}),
+                TOOL_CALL_INDEX_METADATA_KEY: i,
+            },
+        }
+        for i, tool_call_config in enumerate(get_config_list(config, tool_call_count))
+    ]
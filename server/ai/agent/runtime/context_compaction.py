@@ -0,0 +1,191 @@
+"""
+This module holds the context compaction stage of the agent graphs, which keeps the prompt of an agent bounded in
+long-running chats by folding the older messages of its conversation into a rolling summary.
+"""
+
+import asyncio
+from typing import Any, Callable, NotRequired, Sequence
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage, HumanMessage, RemoveMessage, SystemMessage, get_buffer_string
+from langchain_core.messages.utils import count_tokens_approximately
+from langchain_core.runnables.config import RunnableConfig
+from langgraph.prebuilt.chat_agent_executor import AgentState
+from langgraph.utils.runnable import RunnableCallable
+
+from utils.utils import get_env_int_or_default
+
+# The conversation of an agent is compacted once its messages (and summary) add up to more than this many tokens.
+# Set to 0 to disable compaction.
+_MAX_CONTEXT_TOKENS = get_env_int_or_default("AGENT_CONTEXT_MAX_TOKENS", 12_000)
+
+# Number of tokens of the latest messages that are kept as they are when compacting.
+_KEEP_RECENT_TOKENS = get_env_int_or_default("AGENT_CONTEXT_KEEP_RECENT_TOKENS", 4_000)
+
+# Longer messages are truncated when they're given to the summarizer, so that compacting an old chat can't overflow it.
+_MAX_SUMMARIZED_MESSAGE_CHARS = 2_000
+
+CONTEXT_SUMMARY_LISTENER_CONFIG_KEY = "agent_context_summary_listener"
+"""
+Configurable key holding a callable that's called with the new summary whenever the conversation of the
+invoking agent is compacted (e.g. to store it as the agent's chat summary).
+"""
+
+_SUMMARIZER_INSTRUCTIONS = (
+    "You maintain the running summary of a conversation between an AI assistant and a user. Write a concise summary "
+    "that merges the existing summary (if any) with the new messages. Keep the facts, decisions, preferences, open "
+    "tasks and tool results that the assistant may need later. Only respond with the summary."
+)
+
+
+class CompactingAgentState(AgentState):
+    """
+    The state of an agent graph with context compaction. :py:attr:`context_summary` summarizes the
+    messages that were removed from :py:attr:`messages`.
+    """
+    context_summary: NotRequired[str]
+
+
+class ContextCompactor:
+    """
+    Runs before every model call of an agent graph. Once the conversation grows past :py:attr:`max_tokens`, the
+    messages before the latest :py:attr:`keep_recent_tokens` are summarized (along with the previous summary)
+    and removed from the graph state, so the prompt sent to the model stays bounded no matter how old the chat is.
+
+    The kept messages always start at a user message, so that tool calls are never separated from their results.
+    """
+
+    def __init__(self, model: BaseChatModel, max_tokens: int, keep_recent_tokens: int):
+        self.model = model
+        self.max_tokens = max_tokens
+        self.keep_recent_tokens = keep_recent_tokens
+
+
+    def as_hook(self) -> RunnableCallable:
+        return RunnableCallable(self.compact, self.acompact, name="compact_context")
+
+
+    def compact(self, state: dict, config: RunnableConfig) -> dict:
+        summarized_messages = self._get_messages_to_summarize(state)
+        if summarized_messages is None:
+            return {}
+
+        response = self.model.invoke(self._summarizer_input(state, summarized_messages), config)
+        summary = str(response.content)
+
+        _notify_summary_listener(config, summary)
+        return _compacted_update(summarized_messages, summary)
+
+
+    async def acompact(self, state: dict, config: RunnableConfig) -> dict:
+        summarized_messages = self._get_messages_to_summarize(state)
+        if summarized_messages is None:
+            return {}
+
+        response = await self.model.ainvoke(self._summarizer_input(state, summarized_messages), config)
+        summary = str(response.content)
+
+        # The listener may write to the DB synchronously.
+        await asyncio.to_thread(_notify_summary_listener, config, summary)
+        return _compacted_update(summarized_messages, summary)
+
+
+    def _get_messages_to_summarize(self, state: dict) -> list[BaseMessage] | None:
+        """
+        Returns the older messages that should be folded into the summary, or `None` if the conversation is still small enough.
+        """
+        messages: list[BaseMessage] = state["messages"]
+        summary = state.get("context_summary", "")
+
+        if count_tokens_approximately(messages) + count_tokens_approximately([summary]) <= self.max_tokens:
+            return None
+
+        split = _find_compaction_split(messages, self.keep_recent_tokens)
+        if split == 0:
+            return None
+
+        return messages[:split]
+
+
+    def _summarizer_input(self, state: dict, summarized_messages: list[BaseMessage]) -> list[BaseMessage]:
+        summary = state.get("context_summary") or "(none)"
+        transcript = get_buffer_string([_truncate_message(message) for message in summarized_messages])
+
+        return [
+            SystemMessage(content=_SUMMARIZER_INSTRUCTIONS),
+            HumanMessage(content=f"Existing summary:\n{summary}\n\nNew messages:\n{transcript}"),
+        ]
+
+
+def create_context_compactor(model: BaseChatModel) -> ContextCompactor | None:
+    """
+    Returns a compactor for the agent graphs that use the given model, as configured by the `AGENT_CONTEXT_*`
+    environment variables. Returns `None` if compaction is disabled.
+    """
+    if _MAX_CONTEXT_TOKENS <= 0:
+        return None
+
+    return ContextCompactor(model, _MAX_CONTEXT_TOKENS, min(_KEEP_RECENT_TOKENS, _MAX_CONTEXT_TOKENS))
+
+
+def format_context_summary(state: dict) -> str:
+    """
+    Returns the part of the system prompt that holds the summary of the compacted messages, if any.
+    """
+    summary = state.get("context_summary")
+    if not summary:
+        return ""
+
+    return f"\n\nSummary of the earlier part of this conversation (its messages were removed to save space):\n{summary}"
+
+
+def _find_compaction_split(messages: Sequence[BaseMessage], keep_recent_tokens: int) -> int:
+    """
+    Returns the index of the first message that's kept. The kept messages fit in the token budget when possible,
+    and always start at a user message. If the latest user message alone is over budget, it (and the rest of
+    the current turn) is still kept.
+    """
+    kept_tokens = 0
+    split = len(messages)
+
+    while split > 0:
+        message_tokens = count_tokens_approximately([messages[split - 1]])
+        if kept_tokens + message_tokens > keep_recent_tokens:
+            break
+
+        kept_tokens += message_tokens
+        split -= 1
+
+    # Move forward to the next user message, so that no tool result is kept without the AI message that called it.
+    for i in range(split, len(messages)):
+        if isinstance(messages[i], HumanMessage):
+            return i
+
+    # Otherwise keep the whole current turn.
+    for i in range(split - 1, -1, -1):
+        if isinstance(messages[i], HumanMessage):
+            return i
+
+    return 0
+
+
+def _truncate_message(message: BaseMessage) -> BaseMessage:
+    content = message.text()
+    if len(content) <= _MAX_SUMMARIZED_MESSAGE_CHARS:
+        return message
+
+    return message.model_copy(update={"content": content[:_MAX_SUMMARIZED_MESSAGE_CHARS] + " [...]"})
+
+
+def _compacted_update(summarized_messages: list[BaseMessage], summary: str) -> dict[str, Any]:
+    return {
+        "messages": [RemoveMessage(id=str(message.id)) for message in summarized_messages],
+        "context_summary": summary,
+    }
+
+
+def _notify_summary_listener(config: RunnableConfig, summary: str):
+    listener: Callable[[str], None] | None = config.get("configurable", {}).get(CONTEXT_SUMMARY_LISTENER_CONFIG_KEY)
+
+    if listener is not None:
+        listener(summary)
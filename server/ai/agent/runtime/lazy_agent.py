@@ -0,0 +1,147 @@
+import asyncio
+import json
+import threading
+from typing import AsyncIterator, Callable
+
+from ai.agent.runtime.agent_interface import IAgent
+from ai.agent.runtime.schemas import AgentStats
+from ai.tracing.schemas import AgentStreamEvent
+
+
+class LazyAgent:
+    """
+    Stands in for an agent that is only built (by calling :py:attr:`build_agent`) the first time that it's used. 
+    Building an agent prepares its chat model, runs its tool factories and compiles its graph, which is wasted 
+    work for the (many) agents of a chat that never get invoked.
+
+    An agent that was never built has no memory in the process, so exporting its memory doesn't build it, and 
+    imported memory is held until the agent is built. Whether the agent's memory is durable must be known up front 
+    (:py:attr:`durable_memory`), for the same reason. The :py:attr:`fingerprint` identifies the definition that 
+    the agent is built from (see :py:meth:`get_fingerprint`).
+    """
+
+    def __init__(self, name: str, build_agent: Callable[[], IAgent], durable_memory: bool = False, fingerprint: str | None = None):
+        self.name = name
+        self.build_agent = build_agent
+        self.durable_memory = durable_memory
+        self.fingerprint = fingerprint
+
+        self._agent: IAgent | None = None
+        self._pending_memory: list[dict] = []
+        self._pending_memory_bytes = 0
+        self._lock = threading.Lock()
+
+
+    # === `IAgent` implementation ===
+
+    def get_name(self) -> str:
+        return self.name
+
+
+    def invoke_with_text(self, text_input: str) -> str:
+        return self._get_agent().invoke_with_text(text_input)
+
+
+    async def ainvoke_with_text(self, text_input: str) -> str:
+        agent = await self._aget_agent()
+        return await agent.ainvoke_with_text(text_input)
+
+
+    async def astream_with_text(self, text_input: str) -> AsyncIterator[AgentStreamEvent]:
+        agent = await self._aget_agent()
+
+        async for event in agent.astream_with_text(text_input):
+            yield event
+
+
+    def export_memory(self) -> list[dict]:
+        with self._lock:
+            if self._agent is None:
+                return list(self._pending_memory)
+        
+        return self._agent.export_memory()
+
+
+    def import_memory(self, messages: list[dict]) -> None:
+        if len(messages) == 0:
+            return
+        
+        with self._lock:
+            # Imported once the agent is built.
+            if self._agent is None:
+                self._pending_memory = messages
+                self._pending_memory_bytes = len(json.dumps(messages))
+                return
+        
+        self._agent.import_memory(messages)
+
+
+    def estimate_memory_bytes(self) -> int:
+        with self._lock:
+            if self._agent is None:
+                return self._pending_memory_bytes
+        
+        return self._agent.estimate_memory_bytes()
+
+
+    def has_durable_memory(self) -> bool:
+        # Imported memory only becomes durable once it's written to the checkpointer of the built agent.
+        with self._lock:
+            return self.durable_memory and len(self._pending_memory) == 0
+
+
+    def get_fingerprint(self) -> str | None:
+        return self.fingerprint
+
+
+    def get_stats(self) -> AgentStats:
+        with self._lock:
+            if self._agent is None:
+                return AgentStats(
+                    name=self.name,
+                    is_built=False,
+                    has_durable_memory=self.durable_memory and len(self._pending_memory) == 0,
+                    message_count=len(self._pending_memory),
+                    estimated_memory_bytes=self._pending_memory_bytes,
+                )
+
+        return self._agent.get_stats()
+
+    # === end of `IAgent` implementation
+
+
+    def is_built(self) -> bool:
+        return self._agent is not None
+
+
+    def build(self) -> IAgent:
+        """
+        Builds the agent now (if it wasn't built yet), e.g. to warm it up before its first use.
+        """
+        return self._get_agent()
+
+
+    def _get_agent(self) -> IAgent:
+        if self._agent is None:
+            with self._lock:
+                # Another thread may have built the agent while this one was waiting.
+                if self._agent is None:
+                    print(f"LOG: building agent '{self.name}'")
+                    agent = self.build_agent()
+
+                    if len(self._pending_memory) > 0:
+                        agent.import_memory(self._pending_memory)
+                        self._pending_memory = []
+                        self._pending_memory_bytes = 0
+
+                    self._agent = agent
+
+        return self._agent
+
+
+    async def _aget_agent(self) -> IAgent:
+        if self._agent is not None:
+            return self._agent
+
+        # Building runs DB queries and compiles a graph, so it's kept off the event loop.
+        return await asyncio.to_thread(self._get_agent)
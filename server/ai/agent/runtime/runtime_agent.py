@@ -1,18 +1,39 @@
 from datetime import datetime, timezone
-from langchain_core.messages import BaseMessage
+from langchain_core.messages import BaseMessage, AIMessage, AIMessageChunk, SystemMessage, ToolMessage, messages_from_dict, messages_to_dict
 from langchain_core.runnables.config import RunnableConfig
 
-from langchain.chat_models import init_chat_model
 from langgraph.prebuilt import create_react_agent
 from langchain_core.language_models.chat_models import BaseChatModel
 from langgraph.graph.graph import CompiledGraph
 from langgraph.types import Checkpointer
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.memory import InMemorySaver
 
-from typing import Callable
+from typing import AsyncIterator, Callable
 from langchain.callbacks.base import BaseCallbackHandler
 
+from ai.agent.runtime.concurrent_tool_node import ConcurrentToolNode, TOOLS_BY_NAME_CONFIG_KEY
+from ai.agent.runtime.context_compaction import CompactingAgentState, CONTEXT_SUMMARY_LISTENER_CONFIG_KEY, create_context_compactor, format_context_summary
+from ai.agent.runtime.agent_graph_cache import get_agent_graph_cache, get_shared_chat_model, fingerprint_tools, detached_tool_stubs
+from ai.agent.runtime.schemas import AgentStats
+from ai.tracing.schemas import AgentStreamEvent, AgentTokenEvent, AgentToolStartEvent, AgentToolEndEvent, AgentMessageEndEvent
+
 from auth.tables import UserTable
 from user_settings.tables import UserSettingsTable
+from utils.utils import get_env_int_or_default
+
+# Maximum number of tool calls of a single agent step that run at the same time.
+_TOOL_CALL_MAX_CONCURRENCY = get_env_int_or_default("TOOL_CALL_MAX_CONCURRENCY", 4)
+
+SYSTEM_PROMPT_CONFIG_KEY = "agent_system_prompt"
+"""
+Configurable key holding the system message of the agent that is invoking a (possibly shared) agent graph. It's a 
+message rather than a string, since string configurables are copied into the metadata of every checkpoint.
+"""
+
+# Rough size of an agent without any history (its tools, prompt and graph copy). The compiled 
+# graph and the chat model client are shared, so they're not counted.
+_AGENT_BASE_MEMORY_BYTES = 32 * 1024
 
 class RuntimeAgent:
     """
@@ -32,22 +53,48 @@ class RuntimeAgent:
 
         tools: list[Callable], 
         callbacks: list[BaseCallbackHandler],
+        serial_tool_names: set[str] | None = None,
 
         model: BaseChatModel | None = None, 
         checkpointer: Checkpointer = None,
+        graph_cache_key: str | None = None,
+        thread_id: str = "1",
+        on_context_summarized: Callable[[str], None] | None = None,
     ):
         """
-        Initializes an agent.
+        Initializes an agent. The tools named in :py:attr:`serial_tool_names` are never run concurrently 
+        with each other, while the rest of the tool calls of an agent step run concurrently.
+
+        Agents with the same :py:attr:`graph_cache_key` (e.g. the ID of their template) and the same tool 
+        schemas share their compiled graph and chat model. Their prompt, tools and checkpointer are their own.
+
+        The agent's memory is kept in the :py:attr:`thread_id` thread of its checkpointer, which must be unique 
+        when the checkpointer is shared by several agents.
+
+        Once the conversation grows too long, its older messages are compacted into a summary, which is 
+        passed to :py:attr:`on_context_summarized` (if given).
         """
         self.name = name
 
+        self.master_prompt = self._prepare_master_prompt(persona, purpose, user, user.settings, chat_summaries)
+
+        tool_node = ConcurrentToolNode(tools, serial_tool_names or set(), _TOOL_CALL_MAX_CONCURRENCY)
+
         self.config: RunnableConfig = {
-            "configurable": {"thread_id": "1"},
+            "configurable": {
+                "thread_id": thread_id,
+                SYSTEM_PROMPT_CONFIG_KEY: SystemMessage(content=self.master_prompt),
+                TOOLS_BY_NAME_CONFIG_KEY: tool_node.tools_by_name,
+                CONTEXT_SUMMARY_LISTENER_CONFIG_KEY: on_context_summarized,
+            },
             "callbacks": callbacks,
         }
 
-        self.master_prompt = self._prepare_master_prompt(persona, purpose, user, user.settings, chat_summaries)
-        self.graph = self._prepare_agent_graph(tools, model, checkpointer)
+        self.graph = self._prepare_agent_graph(tool_node, model, checkpointer, graph_cache_key)
+
+        # Kept up to date by the invocations, so that the agent's stats can be read without loading its checkpoints.
+        self._message_count = 0
+        self._estimated_memory_bytes = _AGENT_BASE_MEMORY_BYTES
 
 
     # === `IAgent` implementation ===
@@ -61,10 +108,113 @@ class RuntimeAgent:
             {"messages": [{"role": "user", "content": text_input}]},
             self.config,
         )
+        self._message_count = len(res["messages"])
+        message = self._get_latest_agent_msg(res)
+        content = str(message.content)
+
+        return content
+    
+
+    async def ainvoke_with_text(self, text_input: str) -> str:
+        res = await self.graph.ainvoke(
+            {"messages": [{"role": "user", "content": text_input}]},
+            self.config,
+        )
+        self._message_count = len(res["messages"])
         message = self._get_latest_agent_msg(res)
         content = str(message.content)
 
         return content
+    
+
+    async def astream_with_text(self, text_input: str) -> AsyncIterator[AgentStreamEvent]:
+        content = ""
+
+        # "messages" yields the tokens generated by the chat model, while "updates" yields the 
+        # messages output by each node of the graph (i.e. completed AI messages and tool results). 
+        # "values" yields the whole state after each step, which is only used for counting its messages.
+        async for mode, chunk in self.graph.astream(
+            {"messages": [{"role": "user", "content": text_input}]},
+            self.config,
+            stream_mode=["messages", "updates", "values"],
+        ):
+            if mode == "messages":
+                message, metadata = chunk
+                if isinstance(message, AIMessageChunk) and metadata.get("langgraph_node") == "agent":
+                    delta = message.text()
+                    if len(delta) > 0:
+                        yield AgentTokenEvent(agent_name=self.name, content=delta)
+
+            elif mode == "updates":
+                for message in _get_messages_from_graph_update(chunk):
+                    if isinstance(message, AIMessage):
+                        content = str(message.content)
+
+                        for tool_call in message.tool_calls:
+                            yield AgentToolStartEvent(
+                                agent_name=self.name,
+                                tool_name=tool_call["name"],
+                                tool_call_id=str(tool_call["id"]),
+                                arguments=tool_call["args"],
+                            )
+
+                    elif isinstance(message, ToolMessage):
+                        yield AgentToolEndEvent(
+                            agent_name=self.name,
+                            tool_name=str(message.name),
+                            tool_call_id=message.tool_call_id,
+                            is_error=message.status == "error",
+                        )
+
+            elif mode == "values":
+                self._message_count = len(chunk.get("messages", []))
+
+        yield AgentMessageEndEvent(agent_name=self.name, content=content)
+
+    def export_memory(self) -> list[dict]:
+        state = self.graph.get_state(self.config)
+        return messages_to_dict(state.values.get("messages", []))
+    
+
+    def import_memory(self, messages: list[dict]) -> None:
+        if len(messages) == 0:
+            return
+        
+        # Written as the output of the "agent" node, so that the restored conversation 
+        # continues from the agent's last message.
+        self.graph.update_state(self.config, {"messages": messages_from_dict(messages)}, as_node="agent")
+        self._message_count += len(messages)
+
+
+    def estimate_memory_bytes(self) -> int:
+        checkpointer = self.graph.checkpointer
+
+        # An in-memory checkpointer holds every checkpoint of the conversation (in serialized form).
+        if isinstance(checkpointer, InMemorySaver):
+            self._estimated_memory_bytes = _AGENT_BASE_MEMORY_BYTES + _count_serialized_bytes((checkpointer.storage, checkpointer.writes, checkpointer.blobs))
+        else:
+            self._estimated_memory_bytes = _AGENT_BASE_MEMORY_BYTES
+
+        return self._estimated_memory_bytes
+
+
+    def has_durable_memory(self) -> bool:
+        checkpointer = self.graph.checkpointer
+        return isinstance(checkpointer, BaseCheckpointSaver) and not isinstance(checkpointer, InMemorySaver)
+
+
+    def get_fingerprint(self) -> str | None:
+        return None
+
+
+    def get_stats(self) -> AgentStats:
+        return AgentStats(
+            name=self.name,
+            is_built=True,
+            has_durable_memory=self.has_durable_memory(),
+            message_count=self._message_count,
+            estimated_memory_bytes=self._estimated_memory_bytes,
+        )
 
     # === end of `IAgent` implementation
 
@@ -128,28 +278,100 @@ class RuntimeAgent:
 
     def _prepare_default_chat_model(self) -> BaseChatModel:
         """
-        Prepares a default chat model for an agent.
+        Prepares a default chat model for an agent. The model's client is shared by all the agents.
         """
-        return init_chat_model(
-            "google_genai:gemini-2.0-flash",
-            temperature=0,
-        )
+        return get_shared_chat_model("google_genai:gemini-2.0-flash", temperature=0)
 
 
-    def _prepare_agent_graph(self, tools: list, model: BaseChatModel | None = None, checkpointer: Checkpointer = None) -> CompiledGraph:
+    def _prepare_agent_graph(
+        self, 
+        tool_node: ConcurrentToolNode, 
+        model: BaseChatModel | None = None, 
+        checkpointer: Checkpointer = None,
+        graph_cache_key: str | None = None,
+    ) -> CompiledGraph:
         """
-        Prepares the graph that the agent uses for control flow.
+        Prepares the graph that the agent uses for control flow. Unless a custom model is given, the compiled 
+        graph is shared with the other agents that have the same cache key and tools.
         """
-        if model is None:
-            model = self._prepare_default_chat_model()
-
-        return create_react_agent(
-            model=model,  
-            tools=tools,  
-            prompt=self.master_prompt,
-            checkpointer=checkpointer,
-        )
+        if model is not None or graph_cache_key is None:
+            graph = _compile_agent_graph(model or self._prepare_default_chat_model(), tool_node)
+
+        else:
+            key = (graph_cache_key, fingerprint_tools(tool_node.tools_by_name), frozenset(tool_node.serial_tool_names))
+
+            graph = get_agent_graph_cache().get_or_compile(
+                key, 
+                lambda: _compile_agent_graph(
+                    self._prepare_default_chat_model(), 
+                    ConcurrentToolNode(detached_tool_stubs(tool_node.tools_by_name), tool_node.serial_tool_names, tool_node.max_concurrency),
+                ),
+            )
+
+        # A shallow copy, so that the (shared) compiled structure is reused with this agent's checkpointer.
+        return graph.copy(update={"checkpointer": checkpointer})
     
 
     def _get_latest_agent_msg(self, agent_response: dict) -> BaseMessage:
-        return agent_response["messages"][-1]
\ No newline at end of file
+        return agent_response["messages"][-1]
+
+
+def _compile_agent_graph(model: BaseChatModel, tool_node: ConcurrentToolNode) -> CompiledGraph:
+    """
+    Compiles a ReAct agent graph. The system prompt is read from the config of each invocation, so that the 
+    graph can be shared by agents with different prompts. The conversation is compacted before each model call 
+    (see :py:class:`ai.agent.runtime.context_compaction.ContextCompactor`).
+    """
+    compactor = create_context_compactor(model)
+
+    return create_react_agent(
+        model=model,  
+        tools=tool_node,  
+        state_schema=CompactingAgentState,
+        pre_model_hook=compactor.as_hook() if compactor is not None else None,
+
+        # Send all the tool calls of a step to the tool node at once (instead of one tool node task per 
+        # call), so that the tool node is the one that decides which calls can run concurrently.
+        version="v1",
+        prompt=_prompt_from_config,
+    )
+
+
+def _prompt_from_config(state: dict, config: RunnableConfig) -> list[BaseMessage]:
+    system_message: SystemMessage = config["configurable"][SYSTEM_PROMPT_CONFIG_KEY]
+
+    context_summary = format_context_summary(state)
+    if len(context_summary) > 0:
+        system_message = SystemMessage(content=f"{system_message.content}{context_summary}")
+
+    return [system_message, *state["messages"]]
+
+
+def _get_messages_from_graph_update(update: dict) -> list[BaseMessage]:
+    """
+    Returns the messages output by the nodes in a graph update (which maps node names to their outputs).
+    """
+    messages = []
+
+    for node_output in update.values():
+        if isinstance(node_output, dict):
+            messages.extend(node_output.get("messages", []))
+
+    return messages
+
+
+
+def _count_serialized_bytes(value) -> int:
+    """
+    Counts the bytes held by the `bytes` values nested in the given containers (i.e. the serialized checkpoints).
+    """
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+
+    if isinstance(value, dict):
+        return sum(_count_serialized_bytes(v) for v in value.values())
+
+    if isinstance(value, (tuple, list)):
+        return sum(_count_serialized_bytes(v) for v in value)
+
+    return 0
@@ -0,0 +1,17 @@
+from pydantic import BaseModel
+
+
+class AgentStats(BaseModel):
+    """
+    A cheap snapshot of the state of a runtime agent, as of its latest invocation.
+    """
+
+    name: str
+    is_built: bool
+    has_durable_memory: bool
+
+    # Number of messages in the agent's conversation memory.
+    message_count: int
+
+    # The latest estimate of the memory held by the agent (see `IAgent.estimate_memory_bytes`).
+    estimated_memory_bytes: int
@@ -1,9 +1,11 @@
 from typing import Sequence
 
-from sqlalchemy import or_
+from sqlalchemy import or_, select
 from ai.agent.templates.schemas import AgentTemplateSchema, CreateCustomAgentSchema, ModifyCustomAgentSchema, ToolSchema
 from ai.agent.templates.tables import AgentTemplateTable, ToolTable
-from sqlalchemy.orm import Session
+from ai.checkpointing.agent_checkpointers import delete_agent_checkpoints_for_template
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException
 
 from auth.tables import UserTable
@@ -42,13 +44,29 @@ def get_all_agent_template_schemas_for_user(db: Session, user: UserTable) -> Seq
     this includes immutable global templates and custom agents made by the user.
     """
     # This query shows both global (`user_id ==  None`) and custom (`user_id == user.id`) templates
+    # The tools of all the templates are loaded together, instead of with one query per template.
     templates = db.query(AgentTemplateTable)\
         .filter(or_(AgentTemplateTable.user_id.is_(None), AgentTemplateTable.user_id == user.id))\
+        .options(selectinload(AgentTemplateTable.tools))\
         .all()
 
     return [agent_template_schema_from_db(template) for template in templates]
 
 
+async def aget_all_agent_template_schemas_for_user(adb: AsyncSession, user: UserTable) -> Sequence[AgentTemplateSchema]:
+    """
+    Async version of :py:func:`get_all_agent_template_schemas_for_user`. The tools of the templates are 
+    loaded eagerly, since relationships can't be lazy loaded with async sessions.
+    """
+    stmt = select(AgentTemplateTable)\
+        .filter(or_(AgentTemplateTable.user_id.is_(None), AgentTemplateTable.user_id == user.id))\
+        .options(selectinload(AgentTemplateTable.tools))
+    
+    templates = (await adb.execute(stmt)).scalars().all()
+
+    return [agent_template_schema_from_db(template) for template in templates]
+
+
 def get_agent_template_by_name_for_user(db: Session, user: UserTable, agent_name: str) -> AgentTemplateTable | None:
     """
     Gets the agent template with the given name that is accessible to the given user. Note that agent names are not 
@@ -174,6 +192,7 @@ def try_delete_custom_agent_for_user(
     
     db.delete(agent_template_from_db)
     db.commit()
+    delete_agent_checkpoints_for_template(agent_template_id)
 
 
 def get_all_switchable_agent_names(db: Session, owner: UserTable) -> Sequence[str]:
@@ -191,6 +210,16 @@ def get_all_switchable_agent_names(db: Session, owner: UserTable) -> Sequence[st
     return [template.name for template in templates]
 
 
+def get_all_agent_names(db: Session, owner: UserTable) -> Sequence[str]:
+    """
+    Returns a list of all the names of the agents that are accessible to the given user.
+    """
+    return db.scalars(
+        select(AgentTemplateTable.name)
+            .where(or_(AgentTemplateTable.user_id.is_(None), AgentTemplateTable.user_id == owner.id))
+    ).all()
+
+
 def get_all_tool_schemas(db: Session) -> Sequence[ToolSchema]:
     """
     Gets all the tools from the DB in schema format.
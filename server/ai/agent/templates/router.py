@@ -2,29 +2,30 @@ from typing import Annotated, Sequence
 from fastapi import APIRouter, Depends
 
 from ai.agent.templates.schemas import AgentTemplateSchema, ToolSchema, CreateCustomAgentSchema, ModifyCustomAgentSchema
-from ai.agent.templates.agent_templates import get_all_agent_template_schemas_for_user, get_all_tool_schemas, try_create_custom_agent_for_user, try_modify_custom_agent_for_user, try_delete_custom_agent_for_user
+from ai.agent.templates.agent_templates import aget_all_agent_template_schemas_for_user, get_all_tool_schemas, try_create_custom_agent_for_user, try_modify_custom_agent_for_user, try_delete_custom_agent_for_user
 from sqlalchemy.orm import Session
-from auth.auth import get_current_user
+from sqlalchemy.ext.asyncio import AsyncSession
+from auth.auth import get_current_user, aget_current_user
 from auth.tables import UserTable
-from database.database import get_database
+from database.database import get_database, get_async_database
 
 import uuid
 
 router = APIRouter()
 
 @router.get("/api/agent-templates/all/", tags=["agent-templates"])
-def view_all_agent_templates(
-    db: Annotated[Session, Depends(get_database)],
-    current_user: Annotated[UserTable, Depends(get_current_user)],
+async def view_all_agent_templates(
+    adb: Annotated[AsyncSession, Depends(get_async_database)],
+    current_user: Annotated[UserTable, Depends(aget_current_user)],
 ) -> Sequence[AgentTemplateSchema]:
     """
     Returns the agent templates accessible to the user.
     """
     # TEMP: default data seeding
     from ai.agent.db_seeding.seed_agent_templates import seed_agent_templates
-    seed_agent_templates(db)
+    await adb.run_sync(seed_agent_templates)
 
-    return get_all_agent_template_schemas_for_user(db, current_user)
+    return await aget_all_agent_template_schemas_for_user(adb, current_user)
 
 
 @router.post("/api/agent-templates/custom/create/", tags=["agent-templates"])
@@ -1,6 +1,10 @@
 """
-This package contains the classes relating to agent managers. In the server, agent managers are held 
-in an in-memory store :py:class:`ai.agent_manager.agent_manager_store.AgentMangerInMemoryStore`. The entire codebase 
+This package contains the classes relating to agent managers. In the server, agent managers are held in a store 
+that implements the :py:class:`ai.agent_manager.agent_manager_store_interface.IAgentManagerStore` protocol; either the 
+in-memory store :py:class:`ai.agent_manager.agent_manager_store.AgentMangerInMemoryStore` or, when several processes 
+serve the same chats, the DB-backed :py:class:`ai.agent_manager.agent_manager_db_store.AgentManagerDbSnapshotStore`. Both stores 
+keep the managers of the process in a bounded :py:class:`ai.agent_manager.agent_manager_cache.AgentManagerCache`, so the managers 
+of idle chats are evicted and then rebuilt when their chat is used again. The entire codebase 
 only accepts types that implement the :py:class:`ai.agent_manager.agent_manager_interface.IAgentManager` protocol. This protocol 
 defines a public API for accessing and interacting with the various agents.
 """
\ No newline at end of file
@@ -1,11 +1,42 @@
 from ai.agent_manager.agent_manager_interface import IAgentManager
 from sqlalchemy.orm import Session
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
 from dataclasses import dataclass
 
+# DB session that replaces the default session of every context, within the current task or thread.
+_scoped_db: ContextVar[Session | None] = ContextVar("scoped_agent_db", default=None)
+
+
 @dataclass
 class AgentCtx:
     """
     A context object that holds a reference to an agent manager and a DB session.
     """
     manager: IAgentManager
-    db: Session
+    default_db: Session
+
+    @property
+    def db(self) -> Session:
+        """
+        The DB session that tools should use. This is :py:attr:`default_db`, unless the tool runs within 
+        :py:func:`use_scoped_agent_db`.
+        """
+        scoped_db = _scoped_db.get()
+        return scoped_db if scoped_db is not None else self.default_db
+
+
+@contextmanager
+def use_scoped_agent_db(db: Session) -> Iterator[None]:
+    """
+    Makes the tools that run within the body (in the current task or thread) use the given DB session. Needed 
+    when agents run concurrently, since a DB session can't be shared by concurrent agents.
+    """
+    token = _scoped_db.set(db)
+
+    try:
+        yield
+
+    finally:
+        _scoped_db.reset(token)
@@ -0,0 +1,295 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Literal
+
+from ai.agent_manager.agent_manager_interface import IAgentManager
+from ai.agent_manager.chat_turn_serializer import get_chat_turn_serializer
+from ai.agent_manager.schemas import AgentManagerStoreStats, AgentManagerEntryStats, AgentManagerStoreIntrospection
+from utils.utils import get_env_int_or_default
+
+_MAX_ENTRIES = get_env_int_or_default("AGENT_MANAGER_CACHE_MAX_ENTRIES", 256)
+_MAX_IDLE_SECONDS = get_env_int_or_default("AGENT_MANAGER_CACHE_MAX_IDLE_SECONDS", 30 * 60)
+_MAX_MEMORY_MB = get_env_int_or_default("AGENT_MANAGER_CACHE_MAX_MEMORY_MB", 512)
+
+EvictionReason = Literal["idle", "count", "memory"]
+
+EvictionHook = Callable[[IAgentManager, EvictionReason], None]
+"""
+A function called with each manager evicted from an :py:class:`AgentManagerCache` (and the reason it was evicted).
+"""
+
+
+@dataclass
+class _CacheEntry:
+    manager: IAgentManager
+    last_used: float
+    estimated_bytes: int
+
+
+class AgentManagerCache:
+    """
+    A bounded cache of agent managers, keyed by chat ID. Managers are evicted once they've been idle for 
+    :py:attr:`max_idle_seconds`, and the least recently used managers are evicted whenever the cache holds 
+    more than :py:attr:`max_entries` managers or more than :py:attr:`max_memory_bytes` (estimated) bytes. 
+    Managers whose chat has a turn running or waiting are never evicted.
+
+    The eviction hooks are called after a manager was evicted, e.g. for persisting or cleaning up its state.
+    """
+
+    def __init__(self, max_entries: int, max_idle_seconds: int, max_memory_bytes: int):
+        self.max_entries = max_entries
+        self.max_idle_seconds = max_idle_seconds
+        self.max_memory_bytes = max_memory_bytes
+
+        # Ordered from least to most recently used.
+        self._entries: OrderedDict[uuid.UUID, _CacheEntry] = OrderedDict()
+        self._estimated_bytes = 0
+        self._eviction_hooks: list[EvictionHook] = []
+        self._lock = threading.Lock()
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions: dict[EvictionReason, int] = { "idle": 0, "count": 0, "memory": 0 }
+
+
+    def add_eviction_hook(self, hook: EvictionHook):
+        self._eviction_hooks.append(hook)
+
+
+    def get(self, chat_id: uuid.UUID) -> IAgentManager | None:
+        """
+        Returns the cached manager of the given chat and marks it as recently used. Returns `None` on a miss.
+        """
+        with self._lock:
+            victims = self._collect_idle_victims()
+
+            entry = self._entries.get(chat_id)
+            if entry is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+                self._touch(chat_id, entry)
+
+        self._run_eviction_hooks(victims)
+
+        return entry.manager if entry is not None else None
+
+
+    def peek(self, chat_id: uuid.UUID) -> IAgentManager | None:
+        """
+        Returns the cached manager of the given chat without marking it as recently used (or counting a hit or miss).
+        """
+        with self._lock:
+            entry = self._entries.get(chat_id)
+
+        return entry.manager if entry is not None else None
+
+
+    def put(self, manager: IAgentManager):
+        """
+        Caches the given manager, replacing the previous manager of its chat (without calling the eviction hooks).
+        """
+        chat_id = manager.get_chat_id()
+        estimated_bytes = manager.estimate_memory_bytes()
+
+        with self._lock:
+            self._remove(chat_id)
+
+            self._entries[chat_id] = _CacheEntry(manager=manager, last_used=time.monotonic(), estimated_bytes=estimated_bytes)
+            self._estimated_bytes += estimated_bytes
+
+            victims = self._collect_idle_victims() + self._collect_lru_victims()
+
+        self._run_eviction_hooks(victims)
+
+
+    def refresh(self, manager: IAgentManager) -> bool:
+        """
+        Re-estimates the memory used by the given manager (e.g. after its agents ran) and marks it as recently used. 
+        Returns `False` if the manager is no longer cached, i.e. if it was evicted or replaced.
+        """
+        chat_id = manager.get_chat_id()
+        estimated_bytes = manager.estimate_memory_bytes()
+
+        with self._lock:
+            entry = self._entries.get(chat_id)
+            if entry is None or entry.manager is not manager:
+                return False
+
+            self._estimated_bytes += estimated_bytes - entry.estimated_bytes
+            entry.estimated_bytes = estimated_bytes
+            self._touch(chat_id, entry)
+
+            victims = self._collect_lru_victims()
+
+        self._run_eviction_hooks(victims)
+        return True
+
+
+    def remove(self, chat_id: uuid.UUID) -> IAgentManager | None:
+        """
+        Removes the manager of the given chat (without calling the eviction hooks). Returns the removed manager, if any.
+        """
+        with self._lock:
+            entry = self._remove(chat_id)
+
+        return entry.manager if entry is not None else None
+
+
+    def evict_idle(self):
+        """
+        Evicts the managers that have been idle for too long. Idle managers are also evicted lazily on every access.
+        """
+        with self._lock:
+            victims = self._collect_idle_victims()
+
+        self._run_eviction_hooks(victims)
+
+
+    def get_stats(self) -> AgentManagerStoreStats:
+        with self._lock:
+            return self._get_stats_locked()
+
+
+    def introspect(self) -> AgentManagerStoreIntrospection:
+        """
+        Returns the stats of the cache and of each cached manager. The managers are only asked for the stats 
+        that they keep up to date as they run, so this is cheap enough to be called every few seconds.
+        """
+        with self._lock:
+            store_stats = self._get_stats_locked()
+            entries = [(entry.manager, entry.last_used, entry.estimated_bytes) for entry in self._entries.values()]
+
+        now = time.monotonic()
+        wall_now = time.time()
+        manager_stats = []
+
+        # Ordered from most to least recently used.
+        for manager, last_used, estimated_bytes in reversed(entries):
+            idle_seconds = now - last_used
+            manager_stats.append(AgentManagerEntryStats(
+                manager=manager.get_stats(),
+                idle_seconds=idle_seconds,
+                last_active_at=wall_now - idle_seconds,
+                estimated_memory_bytes=estimated_bytes,
+            ))
+
+        return AgentManagerStoreIntrospection(
+            store=store_stats,
+            built_agent_count=sum(stats.manager.built_agent_count for stats in manager_stats),
+            message_count=sum(stats.manager.message_count for stats in manager_stats),
+            pending_trace_count=sum(stats.manager.pending_trace_count for stats in manager_stats),
+            managers=manager_stats,
+        )
+
+
+    def _get_stats_locked(self) -> AgentManagerStoreStats:
+        """
+        Returns the stats of the cache. Must be called with the lock held.
+        """
+        return AgentManagerStoreStats(
+            entries=len(self._entries),
+            estimated_memory_bytes=self._estimated_bytes,
+            max_entries=self.max_entries,
+            max_idle_seconds=self.max_idle_seconds,
+            max_memory_bytes=self.max_memory_bytes,
+            hits=self._hits,
+            misses=self._misses,
+            idle_evictions=self._evictions["idle"],
+            count_evictions=self._evictions["count"],
+            memory_evictions=self._evictions["memory"],
+        )
+
+
+    def _touch(self, chat_id: uuid.UUID, entry: _CacheEntry):
+        entry.last_used = time.monotonic()
+        self._entries.move_to_end(chat_id)
+
+
+    def _remove(self, chat_id: uuid.UUID) -> _CacheEntry | None:
+        entry = self._entries.pop(chat_id, None)
+        if entry is not None:
+            self._estimated_bytes -= entry.estimated_bytes
+
+        return entry
+
+
+    def _collect_idle_victims(self) -> list[tuple[IAgentManager, EvictionReason]]:
+        """
+        Removes the managers that have been idle for too long. Must be called while holding the lock.
+        """
+        idle_before = time.monotonic() - self.max_idle_seconds
+        victims = []
+
+        # The entries are ordered by last use, so the idle ones are at the front.
+        for chat_id, entry in list(self._entries.items()):
+            if entry.last_used >= idle_before:
+                break
+
+            if _is_evictable(chat_id):
+                self._remove(chat_id)
+                victims.append((entry.manager, "idle"))
+
+        return victims
+
+
+    def _collect_lru_victims(self) -> list[tuple[IAgentManager, EvictionReason]]:
+        """
+        Removes the least recently used managers until the cache is within its count and memory limits. 
+        The most recently used manager is never removed. Must be called while holding the lock.
+        """
+        victims = []
+
+        # All but the most recently used entry.
+        candidates = list(self._entries.keys())[:-1]
+
+        for chat_id in candidates:
+            if len(self._entries) > self.max_entries:
+                reason: EvictionReason = "count"
+            elif self._estimated_bytes > self.max_memory_bytes:
+                reason = "memory"
+            else:
+                break
+
+            if _is_evictable(chat_id):
+                victims.append((self._entries[chat_id].manager, reason))
+                self._remove(chat_id)
+
+        return victims
+
+
+    def _run_eviction_hooks(self, victims: list[tuple[IAgentManager, EvictionReason]]):
+        """
+        Runs the eviction hooks of the given evicted managers. Called without holding the lock, since hooks may be slow.
+        """
+        for manager, reason in victims:
+            with self._lock:
+                self._evictions[reason] += 1
+
+            print(f"LOG: evicted manager for chat {manager.get_chat_id()} ({reason})")
+
+            for hook in self._eviction_hooks:
+                try:
+                    hook(manager, reason)
+
+                except Exception as ex:
+                    print(f"ERROR: caught exception [{type(ex)}] {ex} while running eviction hook for chat {manager.get_chat_id()}")
+
+
+def _is_evictable(chat_id: uuid.UUID) -> bool:
+    # A manager with a running or waiting turn is still in use.
+    return get_chat_turn_serializer().get_queue_depth(chat_id) == 0
+
+
+def create_agent_manager_cache() -> AgentManagerCache:
+    """
+    Creates an agent manager cache with the limits configured by the environment.
+    """
+    return AgentManagerCache(
+        max_entries=_MAX_ENTRIES, 
+        max_idle_seconds=_MAX_IDLE_SECONDS, 
+        max_memory_bytes=_MAX_MEMORY_MB * 1024 * 1024,
+    )
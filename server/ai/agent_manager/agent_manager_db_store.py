@@ -0,0 +1,137 @@
+import threading
+import uuid
+from typing import Callable
+
+from ai.agent_manager.agent_manager_cache import AgentManagerCache, EvictionReason
+from ai.agent_manager.agent_manager_interface import IAgentManager
+from ai.agent_manager.schemas import AgentManagerStoreStats, AgentManagerStoreIntrospection
+from ai.agent_manager import agent_manager_snapshots as snapshots
+
+
+class AgentManagerDbSnapshotStore:
+    """
+    A store for agent managers that can be shared by several processes. Each process keeps its own copy 
+    of the managers, while the state of each manager (hand-offs and agent memories) is stored in the DB 
+    as a versioned snapshot after every turn. A process whose copy is behind the snapshot (because the 
+    chat's last turn was served by another process) rebuilds the manager and restores the snapshot into it.
+
+    The local copies are held in a bounded :py:class:`ai.agent_manager.agent_manager_cache.AgentManagerCache`. 
+    Evicting a copy loses nothing, since its state is already in the latest snapshot.
+
+    The snapshots don't make it safe for two processes to serve the same chat at the same time, so each chat 
+    must be routed to a single process (see :py:mod:`chat.chat_affinity`).
+    """
+
+    def __init__(self, cache: AgentManagerCache):
+        self.cache = cache
+        self.cache.add_eviction_hook(self._forget_evicted_version)
+
+        # The version of the snapshot that each local manager is in sync with.
+        self._local_versions: dict[uuid.UUID, int] = {}
+        self._lock = threading.Lock()
+
+
+    def get_manager_for_chat(self, chat_id: uuid.UUID) -> IAgentManager | None:
+        manager = self.cache.get(chat_id)
+
+        if manager is None:
+            return None
+
+        with self._lock:
+            local_version = self._local_versions.get(chat_id)
+
+        if local_version != snapshots.read_snapshot_version(chat_id):
+            print(f"LOG: manager for chat {chat_id} is out of date, dropping local copy")
+            self._drop_local_manager(chat_id)
+            return None
+
+        return manager
+
+
+    def register_manager_for_chat(self, manager: IAgentManager):
+        version = snapshots.write_snapshot(manager)
+        self._set_local_manager(manager, version)
+
+        print(f"LOG: manager registered for chat {manager.get_chat_id()}")
+
+
+    def restore_and_register_manager_for_chat(self, manager: IAgentManager):
+        snapshot = snapshots.read_snapshot(manager.get_chat_id())
+
+        if snapshot is None:
+            self.register_manager_for_chat(manager)
+            return
+        
+        version, state = snapshot
+        manager.restore_state(state)
+        self._set_local_manager(manager, version)
+
+        print(f"LOG: manager restored for chat {manager.get_chat_id()} (snapshot version {version})")
+
+
+    def save_manager_state(self, manager: IAgentManager):
+        version = snapshots.write_snapshot(manager)
+
+        with self._lock:
+            self._local_versions[manager.get_chat_id()] = version
+
+        # Re-estimates the size of the manager, whose agents just ran.
+        if not self.cache.refresh(manager):
+            self._set_local_manager(manager, version)
+
+
+    def delete_entry_with_chat_id(self, chat_id: uuid.UUID) -> bool:
+        existed = self._drop_local_manager(chat_id)
+        return snapshots.delete_snapshot(chat_id) or existed
+
+
+    def refresh_managers_for_chats(self, chat_ids: list[uuid.UUID], refresh_manager: Callable[[IAgentManager], None]):
+        """
+        Refreshes the up-to-date local managers of the given chats and writes their snapshots. The snapshots of 
+        the other chats are bumped, so that the processes holding copies of their managers rebuild them.
+        """
+        rebuilt_chat_ids = []
+
+        for chat_id in chat_ids:
+            manager = self.cache.peek(chat_id)
+
+            with self._lock:
+                local_version = self._local_versions.get(chat_id)
+
+            # A copy that's behind its snapshot is dropped rather than refreshed, since its state is out of date.
+            if manager is None or local_version != snapshots.read_snapshot_version(chat_id):
+                self._drop_local_manager(chat_id)
+                rebuilt_chat_ids.append(chat_id)
+                continue
+
+            refresh_manager(manager)
+            self.save_manager_state(manager)
+
+        snapshots.bump_snapshot_versions(rebuilt_chat_ids)
+
+
+    def get_stats(self) -> AgentManagerStoreStats:
+        return self.cache.get_stats()
+
+
+    def introspect(self) -> AgentManagerStoreIntrospection:
+        return self.cache.introspect()
+
+
+    def _set_local_manager(self, manager: IAgentManager, version: int):
+        with self._lock:
+            self._local_versions[manager.get_chat_id()] = version
+
+        self.cache.put(manager)
+
+
+    def _drop_local_manager(self, chat_id: uuid.UUID) -> bool:
+        with self._lock:
+            self._local_versions.pop(chat_id, None)
+
+        return self.cache.remove(chat_id) is not None
+
+
+    def _forget_evicted_version(self, manager: IAgentManager, reason: EvictionReason):
+        with self._lock:
+            self._local_versions.pop(manager.get_chat_id(), None)
@@ -1,6 +1,7 @@
 from typing import Protocol
 from ai.tracing.tracer import Tracer
 from ai.agent.runtime.agent_interface import IAgent
+from ai.agent_manager.schemas import AgentManagerState, AgentManagerStats, HelperAgentQuery, HelperAgentAnswer
 from sqlalchemy.orm import Session
 import uuid
 from collections import defaultdict
@@ -31,11 +32,41 @@ class IAgentManager(Protocol):
     def set_chat_summary_for_current(self, db: Session, chat_summary_content: str) -> None:
         ...
 
+    def set_chat_summary_for_agent(self, db: Session, agent_name: str, chat_summary_content: str) -> None:
+        ...
+
     def invoke_agent(self, agent: IAgent, user_input: str, db: Session, as_main_agent: bool = False) -> str:
         ...
 
     def invoke_main_agent_with_text(self, username: str, user_input: str, db: Session) -> str:
         ...
 
+    async def ainvoke_agent(self, agent: IAgent, user_input: str, db: Session, as_main_agent: bool = False) -> str:
+        ...
+
+    async def ainvoke_main_agent_with_text(self, username: str, user_input: str, db: Session) -> str:
+        ...
+
+    def consult_agents(self, queries: list[HelperAgentQuery], db: Session) -> list[HelperAgentAnswer]:
+        ...
+
+    async def aconsult_agents(self, queries: list[HelperAgentQuery], db: Session) -> list[HelperAgentAnswer]:
+        ...
+
     def queue_agent_handoff(self, agent_name_prev: str, agent_name_new: str, handoff_reason: str):
-        ...
\ No newline at end of file
+        ...
+
+    def export_state(self) -> AgentManagerState:
+        ...
+
+    def restore_state(self, state: AgentManagerState) -> None:
+        ...
+
+    def get_stats(self) -> AgentManagerStats:
+        ...
+
+    def estimate_memory_bytes(self) -> int:
+        ...
+
+    def refresh_agents(self, agents: list[IAgent]) -> int:
+        ...
@@ -0,0 +1,95 @@
+"""
+This module reads and writes the versioned snapshots of the state of agent managers, which are stored in the DB.
+"""
+
+import uuid
+from datetime import datetime, timezone
+
+from sqlalchemy.dialects import postgresql, sqlite
+
+from ai.agent_manager.agent_manager_interface import IAgentManager
+from ai.agent_manager.schemas import AgentManagerState
+from ai.agent_manager.tables import AgentManagerSnapshotTable
+from database.database import SessionLocal, engine
+
+_DIALECT_INSERTS = {
+    "sqlite": sqlite.insert,
+    "postgresql": postgresql.insert,
+}
+
+
+def read_snapshot_version(chat_id: uuid.UUID) -> int | None:
+    """
+    Returns the version of the snapshot of the given chat. Returns `None` if the chat has no snapshot.
+    """
+    with SessionLocal() as db:
+        snapshot = db.get(AgentManagerSnapshotTable, chat_id)
+        return snapshot.version if snapshot is not None else None
+
+
+def read_snapshot(chat_id: uuid.UUID) -> tuple[int, AgentManagerState] | None:
+    """
+    Returns the version and the state of the snapshot of the given chat. Returns `None` if the chat has no snapshot.
+    """
+    with SessionLocal() as db:
+        snapshot = db.get(AgentManagerSnapshotTable, chat_id)
+        if snapshot is None:
+            return None
+
+        return snapshot.version, AgentManagerState.model_validate_json(snapshot.state)
+
+
+def write_snapshot(manager: IAgentManager) -> int:
+    """
+    Writes the state of the given manager as the latest snapshot of its chat. Returns the new version of the snapshot.
+    """
+    state_json = manager.export_state().model_dump_json()
+    now = datetime.now(tz=timezone.utc).timestamp()
+
+    # A single upsert whose version is incremented by the DB itself and returned by the same statement, so that 
+    # concurrent writers from other processes neither lose increments nor report each other's version.
+    stmt = _DIALECT_INSERTS[engine.dialect.name](AgentManagerSnapshotTable)\
+        .values(chat_id=manager.get_chat_id(), version=1, state=state_json, updated_at=now)
+    stmt = stmt\
+        .on_conflict_do_update(
+            index_elements=[AgentManagerSnapshotTable.chat_id],
+            set_={
+                "version": AgentManagerSnapshotTable.version + 1,
+                "state": stmt.excluded.state,
+                "updated_at": stmt.excluded.updated_at,
+            },
+        )\
+        .returning(AgentManagerSnapshotTable.version)
+
+    with SessionLocal() as db:
+        version = db.execute(stmt).scalar_one()
+        db.commit()
+        return version
+
+
+def bump_snapshot_versions(chat_ids: list[uuid.UUID]):
+    """
+    Increments the versions of the snapshots of the given chats without changing their state, so that 
+    every process drops its copy of their managers and rebuilds them.
+    """
+    if len(chat_ids) == 0:
+        return
+
+    with SessionLocal() as db:
+        db.query(AgentManagerSnapshotTable)\
+            .filter(AgentManagerSnapshotTable.chat_id.in_(chat_ids))\
+            .update({ AgentManagerSnapshotTable.version: AgentManagerSnapshotTable.version + 1 }, synchronize_session=False)
+        db.commit()
+
+
+def delete_snapshot(chat_id: uuid.UUID) -> bool:
+    """
+    Deletes the snapshot of the given chat. Returns whether the chat had a snapshot.
+    """
+    with SessionLocal() as db:
+        deleted_count = db.query(AgentManagerSnapshotTable)\
+            .filter(AgentManagerSnapshotTable.chat_id == chat_id)\
+            .delete()
+        db.commit()
+
+        return deleted_count > 0
@@ -1,24 +1,40 @@
 from ai.agent_manager.agent_manager_interface import IAgentManager
+from ai.agent_manager.agent_manager_store_interface import IAgentManagerStore
+from ai.agent_manager.agent_manager_db_store import AgentManagerDbSnapshotStore
+from ai.agent_manager.agent_manager_cache import AgentManagerCache, EvictionReason, create_agent_manager_cache
+from ai.agent_manager.schemas import AgentManagerStoreStats, AgentManagerStoreIntrospection
+from ai.agent_manager import agent_manager_snapshots as snapshots
+from concurrent.futures import ThreadPoolExecutor
+from utils.utils import get_env_int_or_default
+import os
 import uuid
+from typing import Callable
 
 class AgentMangerInMemoryStore:
     """
-    An in-memory store for agent managers.
+    An in-memory store for agent managers. The managers are held in a bounded 
+    :py:class:`ai.agent_manager.agent_manager_cache.AgentManagerCache`. When :py:attr:`persist_evicted` is set, 
+    the state of an evicted manager is written to the DB as a snapshot, which is restored (and consumed) 
+    once the manager of the chat is rebuilt.
     """
 
-    def __init__(self):
+    def __init__(self, cache: AgentManagerCache, persist_evicted: bool):
         """
         Initializes an empty in-memory store.
         """
-        self.in_memory_store: dict[uuid.UUID, IAgentManager] = {}
+        self.cache = cache
+        self.persist_evicted = persist_evicted
+
+        if persist_evicted:
+            self.cache.add_eviction_hook(self._persist_evicted_manager)
 
     
     def get_manager_for_chat(self, chat_id: uuid.UUID) -> IAgentManager | None:
         """
         Returns the agent manager for the given chat. Returns `None` if a manager has not 
-        been registered for the chat yet.
+        been registered for the chat yet, or if it was evicted.
         """
-        return self.in_memory_store.get(chat_id)
+        return self.cache.get(chat_id)
 
     
     def register_manager_for_chat(self, manager: IAgentManager):
@@ -26,24 +42,118 @@ class AgentMangerInMemoryStore:
         Registers an agent manager to its associated chat.
         """
 
+        # A fresh manager replaces any state persisted for the chat.
+        if self.persist_evicted:
+            snapshots.delete_snapshot(manager.get_chat_id())
+
         print(f"LOG: manager registered for chat {manager.get_chat_id()}")
-        self.in_memory_store[manager.get_chat_id()] = manager
+        self.cache.put(manager)
+
+
+    def restore_and_register_manager_for_chat(self, manager: IAgentManager):
+        """
+        Registers an agent manager to its associated chat. If the chat's previous manager was evicted, its 
+        persisted state is restored into the given manager first.
+        """
+        snapshot = snapshots.read_snapshot(manager.get_chat_id()) if self.persist_evicted else None
+
+        if snapshot is None:
+            self.register_manager_for_chat(manager)
+            return
+        
+        _, state = snapshot
+        manager.restore_state(state)
+        snapshots.delete_snapshot(manager.get_chat_id())
+
+        print(f"LOG: manager restored for chat {manager.get_chat_id()}")
+        self.cache.put(manager)
+
+
+    def save_manager_state(self, manager: IAgentManager):
+        """
+        Re-estimates the memory used by the given manager, whose agents just ran. The registered manager 
+        already is the manager's state, unless it was evicted during the turn, in which case it's persisted again.
+        """
+        if not self.cache.refresh(manager) and self.persist_evicted:
+            snapshots.write_snapshot(manager)
 
 
     def delete_entry_with_chat_id(self, chat_id: uuid.UUID) -> bool:
         """
         Deletes a manager entry in the in-memory store.
         """
+        existed = self.cache.remove(chat_id) is not None
 
-        if chat_id in self.in_memory_store:
-            del self.in_memory_store[chat_id]
-            return True
-        
-        return False
+        if self.persist_evicted:
+            existed = snapshots.delete_snapshot(chat_id) or existed
+
+        return existed
+
+
+    def refresh_managers_for_chats(self, chat_ids: list[uuid.UUID], refresh_manager: Callable[[IAgentManager], None]):
+        """
+        Refreshes the managers of the given chats that are in memory. The state persisted for evicted managers 
+        is restored into managers built from scratch, so it needs no refreshing.
+        """
+        for chat_id in chat_ids:
+            manager = self.cache.peek(chat_id)
+
+            if manager is not None:
+                refresh_manager(manager)
 
 
-_SINGLETON_MEM_STORE = AgentMangerInMemoryStore()
+    def get_stats(self) -> AgentManagerStoreStats:
+        return self.cache.get_stats()
 
-def get_manager_in_mem_store() -> AgentMangerInMemoryStore:
-    return _SINGLETON_MEM_STORE
 
+    def introspect(self) -> AgentManagerStoreIntrospection:
+        return self.cache.introspect()
+
+
+    def _persist_evicted_manager(self, manager: IAgentManager, reason: EvictionReason):
+        snapshots.write_snapshot(manager)
+
+
+# Sandboxes are deleted through a remote API, which shouldn't slow down the request that triggered the eviction.
+_sandbox_cleanup_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sandbox-cleanup")
+
+def _clean_up_sandbox_of_evicted_manager(manager: IAgentManager, reason: EvictionReason):
+    """
+    Deletes the sandbox of an evicted manager whose chat was handed off to the coding agent. The 
+    sandbox is recreated on demand if the chat continues.
+    """
+    from ai.tools.code_sandbox.sandbox_management import clean_up_sandbox_for_chat
+
+    if manager.get_agent_dict()["main_agent"].get_name() == "coding_agent":
+        _sandbox_cleanup_executor.submit(clean_up_sandbox_for_chat, manager.get_chat_id())
+
+
+# "memory" keeps the managers local to the process, while "db" shares their state through the DB, which is 
+# needed when running several workers or replicas. Those must still be behind a load balancer that routes 
+# each chat to a single worker (see `chat.chat_affinity`).
+_AGENT_MANAGER_STORE_KIND = os.getenv("AGENT_MANAGER_STORE", "memory")
+
+# Whether the in-memory store persists the state of evicted managers, so that their chats keep their memory.
+_PERSIST_EVICTED_MANAGERS = get_env_int_or_default("AGENT_MANAGER_STORE_PERSIST_EVICTED", 1) == 1
+
+_SINGLETON_STORE: IAgentManagerStore
+_cache = create_agent_manager_cache()
+
+if _AGENT_MANAGER_STORE_KIND == "memory":
+    # Only this process serves the chat, so nothing else is using the sandbox of an evicted manager. With the 
+    # "db" store, another worker may be running the chat's turns in the same sandbox, so it's left alone.
+    _cache.add_eviction_hook(_clean_up_sandbox_of_evicted_manager)
+    _SINGLETON_STORE = AgentMangerInMemoryStore(_cache, persist_evicted=_PERSIST_EVICTED_MANAGERS)
+
+elif _AGENT_MANAGER_STORE_KIND == "db":
+    _SINGLETON_STORE = AgentManagerDbSnapshotStore(_cache)
+
+else:
+    raise ValueError(f"Unknown agent manager store '{_AGENT_MANAGER_STORE_KIND}', expected 'memory' or 'db'")
+
+
+def get_agent_manager_store() -> IAgentManagerStore:
+    """
+    Returns the singleton agent manager store configured by the `AGENT_MANAGER_STORE` environment variable.
+    """
+    return _SINGLETON_STORE
@@ -0,0 +1,57 @@
+from typing import Callable, Protocol
+from ai.agent_manager.agent_manager_interface import IAgentManager
+from ai.agent_manager.schemas import AgentManagerStoreStats, AgentManagerStoreIntrospection
+import uuid
+
+class IAgentManagerStore(Protocol):
+    """
+    An interface that represents a store of the agent managers of each chat.
+    """
+
+    def get_manager_for_chat(self, chat_id: uuid.UUID) -> IAgentManager | None:
+        """
+        Returns the up-to-date agent manager for the given chat. Returns `None` if the manager needs 
+        to be (re)built, after which it should be passed to :py:meth:`restore_and_register_manager_for_chat`.
+        """
+        ...
+
+    def register_manager_for_chat(self, manager: IAgentManager):
+        """
+        Registers a fresh agent manager to its associated chat, replacing any state stored for the chat.
+        """
+        ...
+
+    def restore_and_register_manager_for_chat(self, manager: IAgentManager):
+        """
+        Restores the stored state of the manager's chat (if any) into the given freshly built 
+        manager, and then registers it to the chat.
+        """
+        ...
+
+    def save_manager_state(self, manager: IAgentManager):
+        """
+        Stores the current state of the given manager. Called after each turn of the manager's chat.
+        """
+        ...
+
+    def delete_entry_with_chat_id(self, chat_id: uuid.UUID) -> bool:
+        ...
+
+    def refresh_managers_for_chats(self, chat_ids: list[uuid.UUID], refresh_manager: Callable[[IAgentManager], None]):
+        """
+        Calls :py:attr:`refresh_manager` on the live managers of the given chats (e.g. after their agent templates 
+        changed) and stores their refreshed state. Managers that aren't live are built from scratch on their next use.
+        """
+        ...
+
+    def get_stats(self) -> AgentManagerStoreStats:
+        """
+        Returns the statistics of the managers held by this process (hits, misses, evictions, etc).
+        """
+        ...
+
+    def introspect(self) -> AgentManagerStoreIntrospection:
+        """
+        Returns the stats of this store and of each of the managers that it holds in this process.
+        """
+        ...
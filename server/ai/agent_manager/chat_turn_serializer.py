@@ -0,0 +1,117 @@
+import asyncio
+import threading
+import uuid
+from collections.abc import AsyncIterator, Iterator
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, field
+
+# How often an async turn checks whether a (rare) sync turn of the same chat released the chat.
+_SYNC_TURN_POLL_INTERVAL_SECONDS = 0.05
+
+
+@dataclass
+class _ChatTurnSlot:
+    # Held for the whole duration of a turn, by both sync and async turns.
+    mutex: threading.Lock = field(default_factory=threading.Lock)
+
+    # Queues up the async turns of the chat in arrival order, without blocking the event loop.
+    async_order: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+    # Number of turns of the chat that are either running or waiting.
+    depth: int = 0
+
+
+class ChatTurnSerializer:
+    """
+    Orders the turns of each chat, such that only one turn runs at a time per chat. Turns of different
+    chats are not ordered with respect to each other, so they run concurrently.
+
+    Turns are keyed by chat ID instead of by agent manager, since a chat's manager may be replaced
+    (e.g. when it's reset) while one of its turns is still running.
+    """
+
+    def __init__(self):
+        self._slots: dict[uuid.UUID, _ChatTurnSlot] = {}
+        self._lock = threading.Lock()
+
+
+    @asynccontextmanager
+    async def aturn(self, chat_id: uuid.UUID) -> AsyncIterator[None]:
+        """
+        Waits until the given chat has no other running turns, then runs the body as the chat's turn.
+        """
+        slot = self._enter(chat_id)
+
+        try:
+            async with slot.async_order:
+                while not slot.mutex.acquire(blocking=False):
+                    await asyncio.sleep(_SYNC_TURN_POLL_INTERVAL_SECONDS)
+
+                try:
+                    yield
+                finally:
+                    slot.mutex.release()
+
+        finally:
+            self._leave(chat_id, slot)
+
+
+    @contextmanager
+    def turn(self, chat_id: uuid.UUID) -> Iterator[None]:
+        """
+        Sync version of :py:meth:`aturn`. Blocks the calling thread while waiting.
+        """
+        slot = self._enter(chat_id)
+
+        try:
+            with slot.mutex:
+                yield
+
+        finally:
+            self._leave(chat_id, slot)
+
+
+    def get_queue_depth(self, chat_id: uuid.UUID) -> int:
+        """
+        Returns the number of turns of the given chat that are either running or waiting.
+        """
+        with self._lock:
+            slot = self._slots.get(chat_id)
+            return slot.depth if slot is not None else 0
+
+
+    def get_queue_depths(self) -> dict[uuid.UUID, int]:
+        """
+        Returns the queue depth of every chat that currently has running or waiting turns.
+        """
+        with self._lock:
+            return { chat_id: slot.depth for chat_id, slot in self._slots.items() }
+
+
+    def _enter(self, chat_id: uuid.UUID) -> _ChatTurnSlot:
+        with self._lock:
+            slot = self._slots.get(chat_id)
+            if slot is None:
+                slot = _ChatTurnSlot()
+                self._slots[chat_id] = slot
+
+            slot.depth += 1
+            return slot
+
+
+    def _leave(self, chat_id: uuid.UUID, slot: _ChatTurnSlot):
+        with self._lock:
+            slot.depth -= 1
+
+            # Forget idle chats, so that the slots don't accumulate over time.
+            if slot.depth == 0:
+                del self._slots[chat_id]
+
+
+_SINGLETON_TURN_SERIALIZER = ChatTurnSerializer()
+
+def get_chat_turn_serializer() -> ChatTurnSerializer:
+    """
+    Returns the singleton chat turn serializer.
+    """
+    return _SINGLETON_TURN_SERIALIZER
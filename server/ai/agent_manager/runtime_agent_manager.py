@@ -2,21 +2,35 @@ from collections import defaultdict
 from dotenv import load_dotenv
 load_dotenv()
 
-from ai.tracing.schemas import AIMessageTrace, HumanMessageTrace
+from ai.tracing.schemas import Trace, AIMessageTrace, HumanMessageTrace
 from ai.tracing.tracer import Tracer
 from ai.agent.runtime.agent_interface import IAgent
 from chat.tables import ChatTable
 from chat.chat_summaries import chat_summaries
 from sqlalchemy.orm import Session
+from database.database import SessionLocal, AsyncSessionLocal
 from langchain_google_genai.chat_models import ChatGoogleGenerativeAIError
 from langgraph.errors import GraphRecursionError
 from google.api_core.exceptions import ResourceExhausted as GeminiResourceExhausted
-from ai.agent_manager.agent_context import AgentCtx
+from ai.agent_manager.agent_context import AgentCtx, use_scoped_agent_db
 from ai.agent_manager.errors import AgentManagerException
+from ai.agent_manager.schemas import AgentManagerState, AgentManagerStats, HelperAgentQuery, HelperAgentAnswer
+from ai.agent_manager.chat_turn_serializer import get_chat_turn_serializer
+from langchain_core.runnables.config import ContextThreadPoolExecutor
+from utils.utils import get_env_int_or_default
+import asyncio
 import uuid
 
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
 from dataclasses import dataclass
 
+_CONSULTATION_MAX_CONCURRENCY = get_env_int_or_default("HELPER_CONSULTATION_MAX_CONCURRENCY", 4)
+
+# Name of the helper agent being consulted by the current task or thread (if any). Consulted agents run 
+# concurrently, so they can't be tracked through the manager's shared 'current_agent' entry.
+_consulted_agent_name: ContextVar[str | None] = ContextVar("consulted_agent_name", default=None)
+
 @dataclass
 class AgentHandoff:
     agent_name_prev: str
@@ -52,6 +66,10 @@ class RuntimeAgentManager:
 
         self.queued_handoff: AgentHandoff | None = None
 
+        # Turns mutate the state of the manager (e.g. the current agent and the queued hand-off), 
+        # so only one turn of the chat is allowed to run at a time.
+        self.turn_serializer = get_chat_turn_serializer()
+
 
     # ===== Protocol methods for `AgentManager` interface. =====
 
@@ -74,7 +92,10 @@ class RuntimeAgentManager:
         return self.chat_summaries
     
     def set_chat_summary_for_current(self, db: Session, chat_summary_content: str) -> None:
-        self._set_chat_summary(db, chat_summary_content)
+        self._set_chat_summary(db, self._get_current_agent_name(), chat_summary_content)
+
+    def set_chat_summary_for_agent(self, db: Session, agent_name: str, chat_summary_content: str) -> None:
+        self._set_chat_summary(db, agent_name, chat_summary_content)
 
     def invoke_agent(self, agent: IAgent, user_input: str, db: Session, as_main_agent: bool = False) -> str:
         """
@@ -82,63 +103,106 @@ class RuntimeAgentManager:
         """
 
         # Bookeeping to keep track of the agent currently in control.
-        prev_agent = self.agents["current_agent"]
-        self.agents["current_agent"] = agent
+        prev_agent = self._swap_current_agent(agent)
 
         content = agent.invoke_with_text(user_input)
 
-        had_err_generating_content = len(content) == 0
-
-        if not had_err_generating_content:
-            self.tracer.add(db, AIMessageTrace(agent_name=agent.get_name(), content=content, is_main_agent=as_main_agent))
-
-        if self.queued_handoff is not None:
-            handoff = self.queued_handoff
-            self.queued_handoff = None
-            
+        handoff = self._record_agent_output(db, agent, prev_agent, content, as_main_agent)
+        if handoff is not None:
             self._execute_agent_handoff(db, handoff)
 
-        else:
-            # If no hand-off occured, then we can safely restore the 'current_agent' back to its original value.
-            self.agents["current_agent"] = prev_agent
-
-        if had_err_generating_content:
-            raise AgentManagerException(f"Agent '{agent.get_name()}' could not generate its response. Try again.")
-
-        return content
+        return self._checked_agent_output(agent, content)
 
     def invoke_main_agent_with_text(self, username: str, user_input: str, db: Session) -> str:
         """
-        Invokes the agent that is currently designated to be the main agent.
+        Invokes the agent that is currently designated to be the main agent. Waits for any other turn 
+        of the chat to finish first.
         """
-        try:
+        with self.turn_serializer.turn(self.chat_id), self._main_agent_invocation(db):
             self.curr_db_session = db
             self.tracer.add(db, HumanMessageTrace(username=username, content=user_input))
 
             main_agent_output = self.invoke_agent(self.agents["main_agent"], user_input, db, as_main_agent=True)
 
-        except ChatGoogleGenerativeAIError as ex:
-            raise AgentManagerException(str(ex))
+        return main_agent_output
+
+    async def ainvoke_agent(self, agent: IAgent, user_input: str, db: Session, as_main_agent: bool = False) -> str:
+        """
+        Async version of :py:meth:`invoke_agent`. The agent's graph is awaited, so other requests 
+        can be served by the event loop while the agent is generating its response.
+        """
+
+        # Bookeeping to keep track of the agent currently in control.
+        prev_agent = self._swap_current_agent(agent)
 
-        except GeminiResourceExhausted:
-            raise AgentManagerException(f"Gemini quota exceeded. Agent '{self.agents["main_agent"].get_name()}' could not generate its message. For more information, read: https://ai.google.dev/gemini-api/docs/rate-limits. To monitor usage, read: https://ai.dev/usage?tab=rate-limit.")
+        content = await self._arun_agent(agent, user_input)
 
-        except GraphRecursionError:
-            raise AgentManagerException(f"Agent '{self.agents["main_agent"].get_name()}' timed out.")
+        handoff = await self._arecord_agent_output(agent, prev_agent, content, as_main_agent)
+        if handoff is not None:
+            await self._aexecute_agent_handoff(db, handoff)
 
-        # Log and wrap known exceptions with a generic error message.
-        except Exception as ex:
-            print(f"ERROR: caught exception [{type(ex)}] {ex} while generating latest message")
-            raise AgentManagerException("Unknown error while sending message, try again later.")
+        return self._checked_agent_output(agent, content)
 
-        finally:
-            # The agents may have generated pending tool traces, which need to be commited.
-            self.tracer.commit_all_pending(db)
+    async def ainvoke_main_agent_with_text(self, username: str, user_input: str, db: Session) -> str:
+        """
+        Async version of :py:meth:`invoke_main_agent_with_text`.
+        """
+        async with self.turn_serializer.aturn(self.chat_id), self._amain_agent_invocation():
+            self.curr_db_session = db
+            await self._aadd_trace(HumanMessageTrace(username=username, content=user_input))
+
+            main_agent_output = await self.ainvoke_agent(self.agents["main_agent"], user_input, db, as_main_agent=True)
 
         return main_agent_output
 
 
+    def consult_agents(self, queries: list[HelperAgentQuery], db: Session) -> list[HelperAgentAnswer]:
+        """
+        Invokes the agents named in the given queries concurrently, and returns their answers in the same order 
+        as the queries. Unlike :py:meth:`invoke_agent`, the consulted agents don't take control of the chat; 
+        the calling agent stays in control and any hand-off requested by a consulted agent is ignored.
+        """
+        agents, answers = self._resolve_consulted_agents(queries)
+
+        with ContextThreadPoolExecutor(max_workers=_CONSULTATION_MAX_CONCURRENCY) as executor:
+            futures = {
+                i: executor.submit(self._consult_agent, agent, queries[i].query)
+                for i, agent in agents.items()
+            }
+
+            for i, future in futures.items():
+                answers[i] = future.result()
+
+        for i in agents:
+            self._trace_consultation_answer(db, answers[i])
+
+        return answers
+
+    async def aconsult_agents(self, queries: list[HelperAgentQuery], db: Session) -> list[HelperAgentAnswer]:
+        """
+        Async version of :py:meth:`consult_agents`.
+        """
+        agents, answers = self._resolve_consulted_agents(queries)
+        semaphore = asyncio.Semaphore(_CONSULTATION_MAX_CONCURRENCY)
+
+        async def consult(i: int, agent: IAgent):
+            async with semaphore:
+                answers[i] = await self._aconsult_agent(agent, queries[i].query)
+
+        await asyncio.gather(*(consult(i, agent) for i, agent in agents.items()))
+
+        # Traced once every agent answered, so that the traces follow the order of the queries.
+        for i in agents:
+            await self._atrace_consultation_answer(answers[i])
+
+        return answers
+
+
     def queue_agent_handoff(self, agent_name_prev: str, agent_name_new: str, handoff_reason: str):
+        if _consulted_agent_name.get() is not None:
+            print(f"LOG: ignored hand-off to '{agent_name_new}' requested by consulted agent '{_consulted_agent_name.get()}'")
+            return
+
         self.queued_handoff = AgentHandoff(
             agent_name_prev=agent_name_prev,
             agent_name_new=agent_name_new,
@@ -146,6 +210,53 @@ class RuntimeAgentManager:
         )
 
 
+    def export_state(self) -> AgentManagerState:
+        return AgentManagerState(
+            main_agent_name=self.agents["main_agent"].get_name(),
+            # Durable memories are already persisted by the checkpointer of their agent.
+            agent_memories={
+                name: agent.export_memory() 
+                for name, agent in self.agents.items() 
+                if name not in ("main_agent", "current_agent") and not agent.has_durable_memory()
+            },
+        )
+    
+    def restore_state(self, state: AgentManagerState) -> None:
+        for name, memory in state.agent_memories.items():
+            # The agent may have been deleted since the state was exported.
+            if name in self.agents:
+                self.agents[name].import_memory(memory)
+
+        if state.main_agent_name in self.agents:
+            self.agents["main_agent"] = self.agents[state.main_agent_name]
+            self.agents["current_agent"] = self.agents["main_agent"]
+
+    def get_stats(self) -> AgentManagerStats:
+        agent_stats = [
+            agent.get_stats() 
+            for name, agent in list(self.agents.items()) 
+            if name not in ("main_agent", "current_agent")
+        ]
+
+        return AgentManagerStats(
+            chat_id=self.chat_id,
+            main_agent_name=self.agents["main_agent"].get_name(),
+            current_agent_name=self.agents["current_agent"].get_name(),
+            agent_count=len(agent_stats),
+            built_agent_count=sum(1 for stats in agent_stats if stats.is_built),
+            message_count=sum(stats.message_count for stats in agent_stats),
+            pending_trace_count=len(self.tracer.pending_traces),
+            agents=agent_stats,
+        )
+
+    def estimate_memory_bytes(self) -> int:
+        return sum(
+            agent.estimate_memory_bytes() 
+            for name, agent in self.agents.items() 
+            if name not in ("main_agent", "current_agent")
+        )
+
+
     # ===== Other methods =====
 
     def initialize_agents(self, agents: list[IAgent]):
@@ -163,8 +274,43 @@ class RuntimeAgentManager:
         self.agents["current_agent"] = self.agents["main_agent"]
 
 
+    def refresh_agents(self, agents: list[IAgent]) -> int:
+        """
+        Replaces the agents whose definition changed (going by their fingerprints) with the given (fresh) agents, 
+        registers the new agents and drops the agents that no longer exist. The memory of each replaced agent 
+        is carried over, unless it's durable (in which case its replacement picks it up from the checkpointer). 
+        Returns the number of agents that were replaced, added or dropped.
+        """
+        new_agents = {agent.get_name(): agent for agent in agents}
+        changed_count = 0
+
+        for name in list(self.agents):
+            if name not in ("main_agent", "current_agent") and name not in new_agents:
+                del self.agents[name]
+                changed_count += 1
+
+        for name, agent in new_agents.items():
+            old_agent = self.agents.get(name)
+            fingerprint = agent.get_fingerprint()
+
+            if old_agent is not None and fingerprint is not None and old_agent.get_fingerprint() == fingerprint:
+                continue
+
+            if old_agent is not None and not old_agent.has_durable_memory():
+                agent.import_memory(old_agent.export_memory())
+
+            self._register_agent(agent)
+            changed_count += 1
+
+        # Point the main and current agents at their replacements (or back at the supervisor if they were dropped).
+        for role in ("main_agent", "current_agent"):
+            self.agents[role] = self.agents.get(self.agents[role].get_name(), self.agents["supervisor_agent"])
+
+        return changed_count
+
+
     def to_ctx(self, db: Session) -> AgentCtx:
-        return AgentCtx(manager=self, db=db)
+        return AgentCtx(manager=self, default_db=db)
 
     def _register_agent(self, agent: IAgent):
         """
@@ -174,18 +320,236 @@ class RuntimeAgentManager:
         self.agents[agent.get_name()] = agent
 
 
-    def _set_chat_summary(self, db: Session, chat_summary_content: str):
+    def _set_chat_summary(self, db: Session, agent_name: str, chat_summary_content: str):
         """
-        Sets the chat summary for the current agent.
+        Sets the chat summary for the given agent.
         """
-        agent_name = self._get_current_agent_name()
-
         # Save the chat summary to both the DB and the manager's runtime dictionary.
         chat_summaries.set_agent_chat_summary_in_db(db, self.chat_id, agent_name, chat_summary_content)
         self.chat_summaries[agent_name] = chat_summary_content
 
 
+    @contextmanager
+    def _main_agent_invocation(self, db: Session):
+        """
+        Wraps an invocation of the main agent. Translates known exceptions into 
+        :py:class:`ai.agent_manager.errors.AgentManagerException` and commits any pending traces.
+        """
+        try:
+            yield
+
+        except Exception as ex:
+            raise self._to_agent_manager_exception(ex)
+
+        finally:
+            # The agents may have generated pending tool traces, which need to be commited.
+            try:
+                self.tracer.commit_all_pending(db)
+
+            # A failed flush must not replace the outcome of the turn. The tracer keeps the traces for its next flush.
+            except Exception as ex:
+                print(f"ERROR: caught exception [{type(ex)}] {ex} while committing the pending traces of chat '{self.chat_id}'")
+
+
+    @asynccontextmanager
+    async def _amain_agent_invocation(self):
+        """
+        Async version of :py:meth:`_main_agent_invocation`. The pending traces are committed using an async DB session.
+        """
+        try:
+            yield
+
+        except Exception as ex:
+            raise self._to_agent_manager_exception(ex)
+
+        finally:
+            try:
+                async with AsyncSessionLocal() as adb:
+                    await self.tracer.acommit_all_pending(adb)
+
+            # A failed flush must not replace the outcome of the turn. The tracer keeps the traces for its next flush.
+            except Exception as ex:
+                print(f"ERROR: caught exception [{type(ex)}] {ex} while committing the pending traces of chat '{self.chat_id}'")
+
+
+    def _to_agent_manager_exception(self, ex: Exception) -> AgentManagerException:
+        """
+        Translates an exception raised while invoking the main agent into an exception that can be shown to the user.
+        """
+        if isinstance(ex, ChatGoogleGenerativeAIError):
+            return AgentManagerException(str(ex))
+
+        elif isinstance(ex, GeminiResourceExhausted):
+            return AgentManagerException(f"Gemini quota exceeded. Agent '{self.agents["main_agent"].get_name()}' could not generate its message. For more information, read: https://ai.google.dev/gemini-api/docs/rate-limits. To monitor usage, read: https://ai.dev/usage?tab=rate-limit.")
+
+        elif isinstance(ex, GraphRecursionError):
+            return AgentManagerException(f"Agent '{self.agents["main_agent"].get_name()}' timed out.")
+
+        # Log and wrap known exceptions with a generic error message.
+        else:
+            print(f"ERROR: caught exception [{type(ex)}] {ex} while generating latest message")
+            return AgentManagerException("Unknown error while sending message, try again later.")
+
+
+    def _swap_current_agent(self, agent: IAgent) -> IAgent:
+        """
+        Makes the given agent the 'current_agent'. Returns the agent that was previously in control.
+        """
+        prev_agent = self.agents["current_agent"]
+        self.agents["current_agent"] = agent
+        return prev_agent
+
+
+    async def _arun_agent(self, agent: IAgent, user_input: str) -> str:
+        """
+        Runs the given agent. While a client is subscribed to the chat, the agent's response is streamed 
+        and its live events are pushed to the client as they happen.
+        """
+        if not self.tracer.has_live_subscribers():
+            return await agent.ainvoke_with_text(user_input)
+
+        content = ""
+
+        async for event in agent.astream_with_text(user_input):
+            if event.kind == "ai_message_end":
+                content = event.content
+
+            self.tracer.publish_live_event(event)
+
+        return content
+
+
+    def _record_agent_output(self, db: Session, agent: IAgent, prev_agent: IAgent, content: str, as_main_agent: bool) -> AgentHandoff | None:
+        """
+        Traces the output of an agent invocation. Returns the hand-off queued during the invocation (if any), 
+        which must then be executed by the caller.
+        """
+        had_err_generating_content = len(content) == 0
+
+        if not had_err_generating_content:
+            self.tracer.add(db, AIMessageTrace(agent_name=agent.get_name(), content=content, is_main_agent=as_main_agent))
+
+        return self._take_queued_handoff(prev_agent)
+
+
+    async def _arecord_agent_output(self, agent: IAgent, prev_agent: IAgent, content: str, as_main_agent: bool) -> AgentHandoff | None:
+        """
+        Async version of :py:meth:`_record_agent_output`. The output is traced using an async DB session.
+        """
+        had_err_generating_content = len(content) == 0
+
+        if not had_err_generating_content:
+            await self._aadd_trace(AIMessageTrace(agent_name=agent.get_name(), content=content, is_main_agent=as_main_agent))
+
+        return self._take_queued_handoff(prev_agent)
+
+
+    async def _aadd_trace(self, trace: Trace):
+        async with AsyncSessionLocal() as adb:
+            await self.tracer.aadd(adb, trace)
+
+
+    def _take_queued_handoff(self, prev_agent: IAgent) -> AgentHandoff | None:
+        if self.queued_handoff is not None:
+            handoff = self.queued_handoff
+            self.queued_handoff = None
+            return handoff
+
+        # If no hand-off occured, then we can safely restore the 'current_agent' back to its original value.
+        self.agents["current_agent"] = prev_agent
+        return None
+
+
+    def _resolve_consulted_agents(self, queries: list[HelperAgentQuery]) -> tuple[dict[int, IAgent], list[HelperAgentAnswer]]:
+        """
+        Finds the agent of each query. Returns the agents to consult (keyed by the position of their query) and a 
+        list of answers, in which the queries that can't be sent have their error already filled in.
+        """
+        caller_name = self._get_current_agent_name()
+
+        agents: dict[int, IAgent] = {}
+        answers: list[HelperAgentAnswer] = []
+        consulted_names = set()
+
+        for i, query in enumerate(queries):
+            answers.append(HelperAgentAnswer(agent_name=query.agent_name))
+
+            if query.agent_name in ("main_agent", "current_agent") or query.agent_name not in self.agents:
+                answers[i].error = f"unknown agent name '{query.agent_name}'"
+
+            elif query.agent_name == caller_name:
+                answers[i].error = "an agent cannot consult itself"
+
+            # Each agent has a single conversation memory, so it can only answer one query at a time.
+            elif query.agent_name in consulted_names:
+                answers[i].error = f"agent '{query.agent_name}' was already sent a query, combine the queries into one"
+
+            else:
+                agents[i] = self.agents[query.agent_name]
+                consulted_names.add(query.agent_name)
+
+        return agents, answers
+
+
+    def _consult_agent(self, agent: IAgent, query: str) -> HelperAgentAnswer:
+        # Each consultation runs in its own thread, which has its own copy of the context.
+        _consulted_agent_name.set(agent.get_name())
+
+        # The tools of the consulted agent get their own DB session, since sessions can't be shared between threads.
+        with SessionLocal() as consultation_db, use_scoped_agent_db(consultation_db):
+            try:
+                return HelperAgentAnswer(agent_name=agent.get_name(), answer=self._checked_agent_output(agent, agent.invoke_with_text(query)))
+
+            except Exception as ex:
+                return self._failed_consultation_answer(agent, ex)
+
+
+    async def _aconsult_agent(self, agent: IAgent, query: str) -> HelperAgentAnswer:
+        # Each consultation runs in its own task, which has its own copy of the context.
+        _consulted_agent_name.set(agent.get_name())
+
+        with SessionLocal() as consultation_db, use_scoped_agent_db(consultation_db):
+            try:
+                # Not streamed, since the live events of the concurrent agents would be interleaved.
+                return HelperAgentAnswer(agent_name=agent.get_name(), answer=self._checked_agent_output(agent, await agent.ainvoke_with_text(query)))
+
+            except Exception as ex:
+                return self._failed_consultation_answer(agent, ex)
+
+
+    def _failed_consultation_answer(self, agent: IAgent, ex: Exception) -> HelperAgentAnswer:
+        """
+        Turns an exception raised by a consulted agent into an answer, so that the other consultations are unaffected.
+        """
+        if isinstance(ex, AgentManagerException):
+            return HelperAgentAnswer(agent_name=agent.get_name(), error=str(ex))
+
+        print(f"ERROR: caught exception [{type(ex)}] {ex} while consulting agent '{agent.get_name()}'")
+        return HelperAgentAnswer(agent_name=agent.get_name(), error=f"agent '{agent.get_name()}' could not answer")
+
+
+    def _trace_consultation_answer(self, db: Session, answer: HelperAgentAnswer):
+        if answer.answer is not None:
+            self.tracer.add(db, AIMessageTrace(agent_name=answer.agent_name, content=answer.answer, is_main_agent=False))
+
+
+    async def _atrace_consultation_answer(self, answer: HelperAgentAnswer):
+        if answer.answer is not None:
+            await self._aadd_trace(AIMessageTrace(agent_name=answer.agent_name, content=answer.answer, is_main_agent=False))
+
+
+    def _checked_agent_output(self, agent: IAgent, content: str) -> str:
+        if len(content) == 0:
+            raise AgentManagerException(f"Agent '{agent.get_name()}' could not generate its response. Try again.")
+
+        return content
+
+
     def _get_current_agent_name(self) -> str:
+        consulted_agent_name = _consulted_agent_name.get()
+        if consulted_agent_name is not None:
+            return consulted_agent_name
+        
         return self.agents["current_agent"].get_name()
     
         
@@ -197,7 +561,24 @@ class RuntimeAgentManager:
         # NOTE: We don't use the `invoke_main_agent_with_text` method since that assumes the message is from a user.
         self.invoke_agent(
             self.get_agent_dict()["main_agent"], 
-            f"The '{agent_handoff.agent_name_prev}' agent handed off the user to you! Do your best. This was its reason: {agent_handoff.handoff_reason}",
+            _handoff_message(agent_handoff),
             db,
             as_main_agent=True,
-        )
\ No newline at end of file
+        )
+
+
+    async def _aexecute_agent_handoff(self, db: Session, agent_handoff: AgentHandoff):
+        # Switch the 'main_agent' (i.e. the agent actually in control).
+        self.get_agent_dict()["main_agent"] = self.get_agent_dict()[agent_handoff.agent_name_new]
+
+        # Tell the new 'main_agent' what it's supposed to do.
+        await self.ainvoke_agent(
+            self.get_agent_dict()["main_agent"], 
+            _handoff_message(agent_handoff),
+            db,
+            as_main_agent=True,
+        )
+
+
+def _handoff_message(agent_handoff: AgentHandoff) -> str:
+    return f"The '{agent_handoff.agent_name_prev}' agent handed off the user to you! Do your best. This was its reason: {agent_handoff.handoff_reason}"
\ No newline at end of file
@@ -0,0 +1,123 @@
+from typing import Literal
+from pydantic import BaseModel, Field
+import uuid
+
+from ai.agent.runtime.schemas import AgentStats
+
+
+class AgentManagerState(BaseModel):
+    """
+    The serializable state of an agent manager, which is needed for recreating the manager in another process.
+    """
+
+    # The agent currently in control of the chat (i.e. the result of the hand-offs so far).
+    main_agent_name: str
+
+    # The conversation memory of each agent, as returned by :py:meth:`ai.agent.runtime.agent_interface.IAgent.export_memory`.
+    agent_memories: dict[str, list[dict]]
+
+
+
+class HelperAgentQuery(BaseModel):
+    """
+    A sub-query sent to a helper agent as part of a consultation.
+    """
+
+    agent_name: str = Field(description="The name of the helper agent to consult.")
+    query: str = Field(description="The question or task for the helper agent. Include all the context that it needs.")
+
+
+class HelperAgentAnswer(BaseModel):
+    """
+    The outcome of consulting a helper agent. Exactly one of :py:attr:`answer` or :py:attr:`error` is set.
+    """
+
+    agent_name: str
+    answer: str | None = None
+    error: str | None = None
+
+
+
+class AgentManagerStoreStats(BaseModel):
+    """
+    Statistics of the local cache of agent managers held by an agent manager store.
+    """
+
+    entries: int
+    estimated_memory_bytes: int
+
+    max_entries: int
+    max_idle_seconds: int
+    max_memory_bytes: int
+
+    hits: int
+    misses: int
+
+    idle_evictions: int
+    count_evictions: int
+    memory_evictions: int
+
+
+class AgentManagerWarmUpStats(BaseModel):
+    """
+    Progress of the startup warm-up of the agent managers of the most recently active chats.
+    """
+
+    # "failed" means that the warm-up itself stopped early (e.g. the DB was unreachable), which still counts 
+    # as ready since the managers are then just built on demand. Failures of single chats are counted in `failed`.
+    status: Literal["disabled", "pending", "warming", "ready", "failed"]
+    ready: bool
+
+    chat_count: int
+    concurrency: int
+
+    warmed: int
+    failed: int
+
+    started_at: float | None = None
+    finished_at: float | None = None
+
+
+class AgentManagerStats(BaseModel):
+    """
+    A snapshot of the state of an agent manager and of its agents.
+    """
+
+    chat_id: uuid.UUID
+    main_agent_name: str
+    current_agent_name: str
+
+    agent_count: int
+    built_agent_count: int
+    message_count: int
+
+    # Traces that were added to the manager's tracer but not committed yet.
+    pending_trace_count: int
+
+    agents: list[AgentStats]
+
+
+class AgentManagerEntryStats(BaseModel):
+    """
+    The stats of an agent manager held by an agent manager store, along with its entry in the store's cache.
+    """
+
+    manager: AgentManagerStats
+
+    idle_seconds: float
+    last_active_at: float
+    estimated_memory_bytes: int
+
+
+class AgentManagerStoreIntrospection(BaseModel):
+    """
+    The stats of an agent manager store and of each of the managers that it holds in this process.
+    """
+
+    store: AgentManagerStoreStats
+
+    built_agent_count: int
+    message_count: int
+    pending_trace_count: int
+
+    managers: list[AgentManagerEntryStats]
@@ -0,0 +1,23 @@
+"""
+This module defines the `agent_manager_snapshots` table in the DB, which holds the serialized state 
+of the agent manager of each chat when the managers are shared through the DB.
+"""
+
+from sqlalchemy import ForeignKey, Integer, Text, Float
+from sqlalchemy.orm import mapped_column, Mapped
+from database.database import Base
+import uuid
+
+
+class AgentManagerSnapshotTable(Base):
+    __tablename__ = "agent_manager_snapshots"
+
+    chat_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("chats.id", ondelete='CASCADE'), primary_key=True)
+
+    # Incremented every time that the snapshot is written, so that processes can tell whether their 
+    # local copy of the manager is out of date.
+    version: Mapped[int] = mapped_column(Integer)
+
+    # JSON of an `AgentManagerState` schema.
+    state: Mapped[str] = mapped_column(Text)
+    updated_at: Mapped[float] = mapped_column(Float)
@@ -0,0 +1,3 @@
+"""
+This package contains the DB-backed LangGraph checkpointer, which persists the conversation memory of the agents.
+"""
@@ -0,0 +1,54 @@
+import os
+import uuid
+
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.memory import InMemorySaver
+
+from ai.checkpointing.db_checkpoint_saver import get_db_checkpoint_saver
+
+# "db" persists the conversation memory of the agents in the DB, while "memory" keeps it in the 
+# process (so it's only persisted through the snapshots of the agent manager store).
+_AGENT_CHECKPOINTER_KIND = os.getenv("AGENT_CHECKPOINTER", "db")
+
+if _AGENT_CHECKPOINTER_KIND not in ("memory", "db"):
+    raise ValueError(f"Unknown agent checkpointer '{_AGENT_CHECKPOINTER_KIND}', expected 'memory' or 'db'")
+
+
+def uses_durable_checkpointer() -> bool:
+    """
+    Returns whether the agents persist their conversation memory through the DB checkpointer.
+    """
+    return _AGENT_CHECKPOINTER_KIND == "db"
+
+
+def create_agent_checkpointer() -> BaseCheckpointSaver:
+    """
+    Returns the checkpointer for a new agent, as configured by the `AGENT_CHECKPOINTER` environment variable.
+    """
+    if uses_durable_checkpointer():
+        return get_db_checkpoint_saver()
+    
+    return InMemorySaver()
+
+
+def get_agent_thread_id(chat_id: uuid.UUID, agent_template_id: uuid.UUID) -> str:
+    """
+    Returns the checkpointer thread that holds the memory of the given agent within the given chat.
+    """
+    return f"{chat_id}:{agent_template_id}"
+
+
+def delete_agent_checkpoints_for_chat(chat_id: uuid.UUID) -> None:
+    """
+    Deletes the persisted conversation memory of all the agents of the given chat.
+    """
+    if uses_durable_checkpointer():
+        get_db_checkpoint_saver().delete_threads_with_prefix(f"{chat_id}:")
+
+
+def delete_agent_checkpoints_for_template(agent_template_id: uuid.UUID) -> None:
+    """
+    Deletes the persisted conversation memory of the agents created from the given template, across all chats.
+    """
+    if uses_durable_checkpointer():
+        get_db_checkpoint_saver().delete_threads_with_suffix(f":{agent_template_id}")
@@ -0,0 +1,505 @@
+import random
+from collections.abc import AsyncIterator, Iterator, Sequence
+from typing import Any
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from sqlalchemy import Delete, Select, delete, select, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ai.checkpointing.tables import CheckpointTable, CheckpointBlobTable, CheckpointWriteTable
+from database.database import SessionLocal, AsyncSessionLocal, engine
+from utils.utils import get_env_int_or_default
+
+# Number of checkpoints kept per thread. Older checkpoints (and the channel values that only they use) are pruned.
+_HISTORY_LIMIT = get_env_int_or_default("AGENT_CHECKPOINT_HISTORY_LIMIT", 4)
+
+# Threads are pruned once every this many steps, instead of on every checkpoint.
+_PRUNE_INTERVAL = get_env_int_or_default("AGENT_CHECKPOINT_PRUNE_INTERVAL", 8)
+
+_DIALECT_INSERTS = {
+    "sqlite": sqlite.insert,
+    "postgresql": postgresql.insert,
+}
+
+
+class DbCheckpointSaver(BaseCheckpointSaver[str]):
+    """
+    A LangGraph checkpointer that persists the checkpoints of the agents in the DB, so that the agents
+    remember their conversations across manager evictions, resets and server restarts. Nothing is held
+    in memory; the latest checkpoint of a thread is loaded from the DB whenever the thread's agent runs.
+
+    Writes are incremental: a checkpoint only stores the versions of its channels, and the value of a channel
+    is only written when the channel was updated. Only the latest :py:attr:`history_limit` checkpoints of each
+    thread are kept.
+    """
+
+    def __init__(self, history_limit: int, prune_interval: int):
+        super().__init__()
+        self.history_limit = max(history_limit, 1)
+        self.prune_interval = max(prune_interval, 1)
+        self._insert = _DIALECT_INSERTS[engine.dialect.name]
+
+
+    # ===== Reads =====
+
+    def get_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        with SessionLocal() as db:
+            row = db.scalars(self._checkpoints_stmt(config, limit=1)).first()
+            if row is None:
+                return None
+
+            return self._load_checkpoint_tuple(db, row)
+
+
+    async def aget_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        async with AsyncSessionLocal() as adb:
+            row = (await adb.scalars(self._checkpoints_stmt(config, limit=1))).first()
+            if row is None:
+                return None
+
+            return await self._aload_checkpoint_tuple(adb, row)
+
+
+    def list(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> Iterator[CheckpointTuple]:
+        with SessionLocal() as db:
+            # The metadata filter is applied after loading, so the limit can only be applied by the DB without one.
+            rows = db.scalars(self._checkpoints_stmt(config, before, None if filter else limit)).all()
+
+            for row in self._filter_rows(rows, filter, limit):
+                yield self._load_checkpoint_tuple(db, row)
+
+
+    async def alist(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        async with AsyncSessionLocal() as adb:
+            rows = (await adb.scalars(self._checkpoints_stmt(config, before, None if filter else limit))).all()
+
+            for row in self._filter_rows(rows, filter, limit):
+                yield await self._aload_checkpoint_tuple(adb, row)
+
+
+    # ===== Writes =====
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        with SessionLocal() as db:
+            for stmt in self._put_stmts(config, checkpoint, metadata, new_versions):
+                db.execute(stmt)
+
+            if self._should_prune(metadata):
+                self._prune(db, config)
+
+            db.commit()
+
+        return _checkpoint_config(config, checkpoint["id"])
+
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        async with AsyncSessionLocal() as adb:
+            for stmt in self._put_stmts(config, checkpoint, metadata, new_versions):
+                await adb.execute(stmt)
+
+            if self._should_prune(metadata):
+                await adb.run_sync(lambda db: self._prune(db, config))
+
+            await adb.commit()
+
+        return _checkpoint_config(config, checkpoint["id"])
+
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        if len(writes) == 0:
+            return
+
+        with SessionLocal() as db:
+            db.execute(self._put_writes_stmt(config, writes, task_id, task_path))
+            db.commit()
+
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        if len(writes) == 0:
+            return
+
+        async with AsyncSessionLocal() as adb:
+            await adb.execute(self._put_writes_stmt(config, writes, task_id, task_path))
+            await adb.commit()
+
+
+    def delete_thread(self, thread_id: str) -> None:
+        with SessionLocal() as db:
+            for stmt in _delete_thread_stmts(lambda table: table.thread_id == thread_id):
+                db.execute(stmt)
+
+            db.commit()
+
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        async with AsyncSessionLocal() as adb:
+            for stmt in _delete_thread_stmts(lambda table: table.thread_id == thread_id):
+                await adb.execute(stmt)
+
+            await adb.commit()
+
+
+    def delete_threads_with_prefix(self, prefix: str) -> None:
+        """
+        Deletes all the threads whose ID starts with the given prefix (e.g. all the threads of a chat).
+        """
+        with SessionLocal() as db:
+            for stmt in _delete_thread_stmts(lambda table: table.thread_id.startswith(prefix, autoescape=True)):
+                db.execute(stmt)
+
+            db.commit()
+
+
+    def delete_threads_with_suffix(self, suffix: str) -> None:
+        """
+        Deletes all the threads whose ID ends with the given suffix (e.g. all the threads of an agent template).
+        """
+        with SessionLocal() as db:
+            for stmt in _delete_thread_stmts(lambda table: table.thread_id.endswith(suffix, autoescape=True)):
+                db.execute(stmt)
+
+            db.commit()
+
+
+    def get_next_version(self, current: str | None, channel: None) -> str:
+        """
+        Returns versions that sort (as strings) in the order that they were created, which is what pruning relies on.
+        """
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+
+        return f"{current_v + 1:032}.{random.random():016}"
+
+
+    # ===== Helpers =====
+
+    def _checkpoints_stmt(self, config: RunnableConfig | None, before: RunnableConfig | None = None, limit: int | None = None) -> Select:
+        """
+        Returns a query for the checkpoints matching the given config, from newest to oldest.
+        """
+        stmt = select(CheckpointTable)
+
+        if config is not None:
+            stmt = stmt.where(CheckpointTable.thread_id == config["configurable"]["thread_id"])
+
+            checkpoint_ns = config["configurable"].get("checkpoint_ns")
+            if checkpoint_ns is not None:
+                stmt = stmt.where(CheckpointTable.checkpoint_ns == checkpoint_ns)
+
+            if checkpoint_id := get_checkpoint_id(config):
+                stmt = stmt.where(CheckpointTable.checkpoint_id == checkpoint_id)
+
+        if before is not None and (before_checkpoint_id := get_checkpoint_id(before)):
+            stmt = stmt.where(CheckpointTable.checkpoint_id < before_checkpoint_id)
+
+        # Checkpoint IDs are time-ordered.
+        stmt = stmt.order_by(CheckpointTable.checkpoint_id.desc())
+
+        if limit is not None:
+            stmt = stmt.limit(limit)
+
+        return stmt
+
+
+    def _filter_rows(self, rows: Sequence[CheckpointTable], filter: dict[str, Any] | None, limit: int | None) -> Iterator[CheckpointTable]:
+        count = 0
+
+        for row in rows:
+            if limit is not None and count >= limit:
+                return
+
+            if filter:
+                metadata = self.serde.loads_typed((row.metadata_type, row.checkpoint_metadata))
+                if not all(metadata.get(key) == value for key, value in filter.items()):
+                    continue
+
+            count += 1
+            yield row
+
+
+    def _blobs_stmt(self, row: CheckpointTable, checkpoint: Checkpoint) -> Select | None:
+        versions = [(channel, str(version)) for channel, version in checkpoint["channel_versions"].items()]
+        if len(versions) == 0:
+            return None
+
+        return select(CheckpointBlobTable).where(
+            CheckpointBlobTable.thread_id == row.thread_id,
+            CheckpointBlobTable.checkpoint_ns == row.checkpoint_ns,
+            tuple_(CheckpointBlobTable.channel, CheckpointBlobTable.version).in_(versions),
+        )
+
+
+    def _writes_stmt(self, row: CheckpointTable) -> Select:
+        return select(CheckpointWriteTable)\
+            .where(
+                CheckpointWriteTable.thread_id == row.thread_id,
+                CheckpointWriteTable.checkpoint_ns == row.checkpoint_ns,
+                CheckpointWriteTable.checkpoint_id == row.checkpoint_id,
+            )\
+            .order_by(CheckpointWriteTable.task_id, CheckpointWriteTable.idx)
+
+
+    def _load_checkpoint_tuple(self, db: Session, row: CheckpointTable) -> CheckpointTuple:
+        checkpoint = self.serde.loads_typed((row.type, row.checkpoint))
+
+        blobs_stmt = self._blobs_stmt(row, checkpoint)
+        blobs = db.scalars(blobs_stmt).all() if blobs_stmt is not None else []
+        writes = db.scalars(self._writes_stmt(row)).all()
+
+        return self._to_checkpoint_tuple(row, checkpoint, blobs, writes)
+
+
+    async def _aload_checkpoint_tuple(self, adb: AsyncSession, row: CheckpointTable) -> CheckpointTuple:
+        checkpoint = self.serde.loads_typed((row.type, row.checkpoint))
+
+        blobs_stmt = self._blobs_stmt(row, checkpoint)
+        blobs = (await adb.scalars(blobs_stmt)).all() if blobs_stmt is not None else []
+        writes = (await adb.scalars(self._writes_stmt(row))).all()
+
+        return self._to_checkpoint_tuple(row, checkpoint, blobs, writes)
+
+
+    def _to_checkpoint_tuple(
+        self,
+        row: CheckpointTable,
+        checkpoint: Checkpoint,
+        blobs: Sequence[CheckpointBlobTable],
+        writes: Sequence[CheckpointWriteTable],
+    ) -> CheckpointTuple:
+        channel_values = {
+            blob.channel: self.serde.loads_typed((blob.type, blob.blob))
+            for blob in blobs
+            if blob.type != "empty"
+        }
+
+        return CheckpointTuple(
+            config=_checkpoint_config(_thread_config(row.thread_id, row.checkpoint_ns), row.checkpoint_id),
+            checkpoint={ **checkpoint, "channel_values": channel_values },
+            metadata=self.serde.loads_typed((row.metadata_type, row.checkpoint_metadata)),
+            parent_config=(
+                _checkpoint_config(_thread_config(row.thread_id, row.checkpoint_ns), row.parent_checkpoint_id)
+                if row.parent_checkpoint_id
+                else None
+            ),
+            pending_writes=[
+                (write.task_id, write.channel, self.serde.loads_typed((write.type, write.blob)))
+                for write in writes
+            ],
+        )
+
+
+    def _put_stmts(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> list:
+        """
+        Returns the statements that store the given checkpoint. Only the values of the updated channels are written.
+        """
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+
+        checkpoint_without_values = checkpoint.copy()
+        values: dict[str, Any] = checkpoint_without_values.pop("channel_values")  # type: ignore[misc]
+
+        stmts = []
+
+        if len(new_versions) > 0:
+            blob_rows = []
+            for channel, version in new_versions.items():
+                type_, blob = self.serde.dumps_typed(values[channel]) if channel in values else ("empty", b"")
+                blob_rows.append({
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "channel": channel,
+                    "version": str(version),
+                    "type": type_,
+                    "blob": blob,
+                })
+
+            # A channel version always has the same value, so existing blobs are left as they are.
+            stmts.append(self._insert(CheckpointBlobTable).values(blob_rows).on_conflict_do_nothing())
+
+        type_, checkpoint_bytes = self.serde.dumps_typed(checkpoint_without_values)
+        metadata_type, metadata_bytes = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+
+        checkpoint_row = {
+            "type": type_,
+            "checkpoint": checkpoint_bytes,
+            "metadata_type": metadata_type,
+            "checkpoint_metadata": metadata_bytes,
+            "parent_checkpoint_id": config["configurable"].get("checkpoint_id"),
+        }
+
+        stmts.append(
+            self._insert(CheckpointTable)
+                .values(thread_id=thread_id, checkpoint_ns=checkpoint_ns, checkpoint_id=checkpoint["id"], **checkpoint_row)
+                .on_conflict_do_update(
+                    index_elements=[CheckpointTable.thread_id, CheckpointTable.checkpoint_ns, CheckpointTable.checkpoint_id],
+                    set_=checkpoint_row,
+                )
+        )
+
+        return stmts
+
+
+    def _put_writes_stmt(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str, task_path: str):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            type_, blob = self.serde.dumps_typed(value)
+            rows.append({
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint_id,
+                "task_id": task_id,
+                "idx": WRITES_IDX_MAP.get(channel, idx),
+                "channel": channel,
+                "type": type_,
+                "blob": blob,
+                "task_path": task_path,
+            })
+
+        stmt = self._insert(CheckpointWriteTable).values(rows)
+
+        # Special writes (errors, interrupts, etc) replace the previous ones, while regular writes are only written once.
+        if all(channel in WRITES_IDX_MAP for channel, _ in writes):
+            return stmt.on_conflict_do_update(
+                index_elements=[
+                    CheckpointWriteTable.thread_id,
+                    CheckpointWriteTable.checkpoint_ns,
+                    CheckpointWriteTable.checkpoint_id,
+                    CheckpointWriteTable.task_id,
+                    CheckpointWriteTable.idx,
+                ],
+                set_={ "channel": stmt.excluded.channel, "type": stmt.excluded.type, "blob": stmt.excluded.blob },
+            )
+
+        return stmt.on_conflict_do_nothing()
+
+
+    def _should_prune(self, metadata: CheckpointMetadata) -> bool:
+        return metadata.get("step", 0) % self.prune_interval == 0
+
+
+    def _prune(self, db: Session, config: RunnableConfig):
+        """
+        Deletes the checkpoints of the config's thread that are older than the latest :py:attr:`history_limit` ones,
+        along with their writes and the channel values that no kept checkpoint uses.
+        """
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+
+        oldest_kept = db.scalars(
+            select(CheckpointTable)
+                .where(CheckpointTable.thread_id == thread_id, CheckpointTable.checkpoint_ns == checkpoint_ns)
+                .order_by(CheckpointTable.checkpoint_id.desc())
+                .offset(self.history_limit - 1)
+                .limit(1)
+        ).first()
+
+        if oldest_kept is None:
+            return
+
+        same_thread = lambda table: (table.thread_id == thread_id) & (table.checkpoint_ns == checkpoint_ns)
+
+        db.execute(delete(CheckpointTable).where(same_thread(CheckpointTable), CheckpointTable.checkpoint_id < oldest_kept.checkpoint_id))
+        db.execute(delete(CheckpointWriteTable).where(same_thread(CheckpointWriteTable), CheckpointWriteTable.checkpoint_id < oldest_kept.checkpoint_id))
+
+        # Channel versions only increase, so the kept checkpoints never use a version older than the ones used by the oldest kept checkpoint.
+        oldest_kept_versions = self.serde.loads_typed((oldest_kept.type, oldest_kept.checkpoint))["channel_versions"]
+
+        for channel, version in oldest_kept_versions.items():
+            db.execute(
+                delete(CheckpointBlobTable)
+                    .where(same_thread(CheckpointBlobTable), CheckpointBlobTable.channel == channel, CheckpointBlobTable.version < str(version))
+            )
+
+
+def _thread_config(thread_id: str, checkpoint_ns: str) -> RunnableConfig:
+    return { "configurable": { "thread_id": thread_id, "checkpoint_ns": checkpoint_ns } }
+
+
+def _checkpoint_config(config: RunnableConfig, checkpoint_id: str) -> RunnableConfig:
+    return {
+        "configurable": {
+            "thread_id": config["configurable"]["thread_id"],
+            "checkpoint_ns": config["configurable"].get("checkpoint_ns", ""),
+            "checkpoint_id": checkpoint_id,
+        }
+    }
+
+
+def _delete_thread_stmts(matches_thread) -> list[Delete]:
+    return [
+        delete(table).where(matches_thread(table))
+        for table in (CheckpointTable, CheckpointBlobTable, CheckpointWriteTable)
+    ]
+
+
+_SINGLETON_CHECKPOINT_SAVER = DbCheckpointSaver(_HISTORY_LIMIT, _PRUNE_INTERVAL)
+
+def get_db_checkpoint_saver() -> DbCheckpointSaver:
+    """
+    Returns the singleton DB checkpointer, which is shared by all the agents (each agent uses its own thread).
+    """
+    return _SINGLETON_CHECKPOINT_SAVER
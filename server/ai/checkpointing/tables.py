@@ -0,0 +1,52 @@
+"""
+This module defines the tables that hold the LangGraph checkpoints of the agents. A checkpoint only stores the 
+versions of its channels, while the value of each channel version is stored once in `agent_checkpoint_blobs`, 
+so that a checkpoint only writes the channels that changed since the previous one.
+"""
+
+from sqlalchemy import Integer, LargeBinary, Text
+from sqlalchemy.orm import mapped_column, Mapped
+from database.database import Base
+
+
+class CheckpointTable(Base):
+    __tablename__ = "agent_checkpoints"
+
+    thread_id: Mapped[str] = mapped_column(Text, primary_key=True)
+    checkpoint_ns: Mapped[str] = mapped_column(Text, primary_key=True, default="")
+    checkpoint_id: Mapped[str] = mapped_column(Text, primary_key=True)
+    parent_checkpoint_id: Mapped[str] = mapped_column(Text, nullable=True)
+
+    # The checkpoint without its channel values, serialized by the checkpointer's serde.
+    type: Mapped[str] = mapped_column(Text)
+    checkpoint: Mapped[bytes] = mapped_column(LargeBinary)
+
+    metadata_type: Mapped[str] = mapped_column(Text)
+    checkpoint_metadata: Mapped[bytes] = mapped_column(LargeBinary)
+
+
+class CheckpointBlobTable(Base):
+    __tablename__ = "agent_checkpoint_blobs"
+
+    thread_id: Mapped[str] = mapped_column(Text, primary_key=True)
+    checkpoint_ns: Mapped[str] = mapped_column(Text, primary_key=True, default="")
+    channel: Mapped[str] = mapped_column(Text, primary_key=True)
+    version: Mapped[str] = mapped_column(Text, primary_key=True)
+
+    type: Mapped[str] = mapped_column(Text)
+    blob: Mapped[bytes] = mapped_column(LargeBinary)
+
+
+class CheckpointWriteTable(Base):
+    __tablename__ = "agent_checkpoint_writes"
+
+    thread_id: Mapped[str] = mapped_column(Text, primary_key=True)
+    checkpoint_ns: Mapped[str] = mapped_column(Text, primary_key=True, default="")
+    checkpoint_id: Mapped[str] = mapped_column(Text, primary_key=True)
+    task_id: Mapped[str] = mapped_column(Text, primary_key=True)
+    idx: Mapped[int] = mapped_column(Integer, primary_key=True)
+
+    channel: Mapped[str] = mapped_column(Text)
+    type: Mapped[str] = mapped_column(Text)
+    blob: Mapped[bytes] = mapped_column(LargeBinary)
+    task_path: Mapped[str] = mapped_column(Text, default="")
@@ -2,7 +2,9 @@
 This module defines coding-related tools for the coding agent.
 """
 
-from ai.tracing.schemas import ImageCreationTrace
+import base64
+
+from ai.tracing.trace_images import create_image_trace
 from ai.agent_manager.agent_context import AgentCtx
 from ai.tools.code_sandbox.sandbox_management import get_sandbox, exec_command_on_sandbox, add_file_to_sandbox, exec_code_on_sandbox
 
@@ -11,7 +13,7 @@ from ai.tools.code_sandbox.models import RunCommandSchema, RunCodeSnippetSchema
 from ai.tools.registry.tool_register_decorator import register_tool_factory
 
 
-@register_tool_factory(tool_id='run_command')
+@register_tool_factory(tool_id='run_command', parallel_safe=False)
 def prepare_run_command_tool(ctx: AgentCtx):
     """
     Prepares a tool that runs a given command in a secure environment.
@@ -48,7 +50,7 @@ def prepare_run_command_tool(ctx: AgentCtx):
     return run_command
 
 
-@register_tool_factory(tool_id='create_file')
+@register_tool_factory(tool_id='create_file', parallel_safe=False)
 def prepare_create_file_tool(ctx: AgentCtx):
     """
     Prepares a tool that creates a file inside of the secure Linux environment.
@@ -74,7 +76,7 @@ def prepare_create_file_tool(ctx: AgentCtx):
     return create_file
 
 
-@register_tool_factory(tool_id='run_code_snippet_tool')
+@register_tool_factory(tool_id='run_code_snippet_tool', parallel_safe=False)
 def prepare_run_code_snippet_tool(ctx: AgentCtx):
     """
     Prepares a tool that runs the given code snippet in a Linux environment.
@@ -99,13 +101,13 @@ def prepare_run_code_snippet_tool(ctx: AgentCtx):
             # The `png` attribute is nullable.
             if chart.png is None:
                 continue
-            _add_image_to_trace_history(ctx, chart.png, chart.title)
+            _add_image_to_trace_history(ctx, base64.b64decode(chart.png), chart.title)
 
         return str((exit_code, output))
     
     return run_code_snippet_tool
 
 
-def _add_image_to_trace_history(ctx: AgentCtx, image_base64: str, caption: str):
+def _add_image_to_trace_history(ctx: AgentCtx, image: bytes, caption: str):
     # Used for showing the image to the user.
-    ctx.manager.get_tracer().add(ctx.db, ImageCreationTrace(base64_encoded_image=image_base64, caption=caption))
\ No newline at end of file
+    ctx.manager.get_tracer().add(ctx.db, create_image_trace(image, caption))
\ No newline at end of file
@@ -1,16 +1,18 @@
 """
 This module defines tools mainly used by the supervisor agent 
-to switch the identity of the current agent.
+to switch the identity of the current agent or to consult other agents.
 """
 
 from typing import Literal
 from ai.agent_manager.agent_context import AgentCtx
+from ai.agent_manager.schemas import HelperAgentQuery, HelperAgentAnswer
+from langchain_core.tools import StructuredTool
 import json
 from ai.tools.registry.tool_register_decorator import register_tool_factory
-from ai.agent.templates.agent_templates import get_all_switchable_agent_names
+from ai.agent.templates.agent_templates import get_all_switchable_agent_names, get_all_agent_names
 from auth.auth import get_user_by_username
 
-@register_tool_factory(tool_id='switch_to_more_qualified_agent')
+@register_tool_factory(tool_id='switch_to_more_qualified_agent', parallel_safe=False)
 def prepare_switch_to_more_qualified_agent_tool(ctx: AgentCtx):
     # Dynamically build the doc-comment for this tool since we don't know what the 
     # valid switchable agents are at build time.
@@ -45,6 +47,39 @@ def prepare_switch_to_more_qualified_agent_tool(ctx: AgentCtx):
     return switch_to_more_qualified_agent
 
 
+@register_tool_factory(tool_id='consult_helper_agents', parallel_safe=False)
+def prepare_consult_helper_agents_tool(ctx: AgentCtx):
+    """
+    Prepares a tool that sends sub-queries to several helper agents at once and gathers their answers.
+    """
+    owner = get_user_by_username(ctx.db, ctx.manager.get_owner_username())
+
+    consult_tool_doc_for_agent = f"""
+        Sends a query to each of the given helper agents at the same time, and returns their answers. 
+        Use this instead of asking the agents one by one when a question has several independent parts. 
+        Each agent can only be sent one query per call, and the agents don't take over the chat.
+        The agents that you can consult are: {get_all_agent_names(ctx.db, owner)}
+        """
+
+    def consult_helper_agents(queries: list[HelperAgentQuery]) -> str:
+        return _format_helper_agent_answers(ctx.manager.consult_agents(queries, ctx.db))
+
+    async def aconsult_helper_agents(queries: list[HelperAgentQuery]) -> str:
+        return _format_helper_agent_answers(await ctx.manager.aconsult_agents(queries, ctx.db))
+
+    # Provide both a sync and an async implementation, so that the helper agents are awaited 
+    # (instead of blocking the event loop) when the calling agent is invoked asynchronously.
+    return StructuredTool.from_function(
+        func=consult_helper_agents,
+        coroutine=aconsult_helper_agents,
+        description=consult_tool_doc_for_agent,
+    )
+
+
+def _format_helper_agent_answers(answers: list[HelperAgentAnswer]) -> str:
+    return json.dumps([answer.model_dump(exclude_none=True) for answer in answers])
+
+
 @register_tool_factory(tool_id='check_helper_agent_chat_summaries')
 def prepare_check_helper_agent_summaries_tool(ctx: AgentCtx):
     def check_helper_agent_chat_summaries():
@@ -56,7 +91,7 @@ def prepare_check_helper_agent_summaries_tool(ctx: AgentCtx):
     return check_helper_agent_chat_summaries
 
 
-@register_tool_factory(tool_id='summarize_chat')
+@register_tool_factory(tool_id='summarize_chat', parallel_safe=False)
 def prepare_summarization_tool(ctx: AgentCtx):
     """
     Prepares a tool that stores a summary of the current current agent's chat with the user.
@@ -73,7 +108,7 @@ def prepare_summarization_tool(ctx: AgentCtx):
     return summarize_chat
 
 
-@register_tool_factory(tool_id='switch_back_to_supervisor')
+@register_tool_factory(tool_id='switch_back_to_supervisor', parallel_safe=False)
 def prepare_switch_back_to_supervisor_tool(ctx: AgentCtx):
     """
     Prepares a tool that switches the current agent back to the supervisor.
@@ -2,19 +2,27 @@
 This module defines the tools used by the math agent, along with helper functions.
 """
 
-import os
 import requests
-import base64
-from ai.tracing.schemas import ImageCreationTrace
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from ai.tracing.trace_images import create_image_trace
 from ai.agent_manager.agent_context import AgentCtx
 from ai.tools.registry.tool_register_decorator import register_tool_factory
 
-from utils.utils import get_env_raise_if_none
+from utils.utils import get_env_raise_if_none, get_env_int_or_default
 
 _API_URL = "https://www.wolframalpha.com/api/v1/llm-api"
 
+_CONNECT_TIMEOUT_SECONDS = get_env_int_or_default("WOLFRAM_ALPHA_CONNECT_TIMEOUT_SECONDS", 5)
+_API_READ_TIMEOUT_SECONDS = get_env_int_or_default("WOLFRAM_ALPHA_READ_TIMEOUT_SECONDS", 30)
+_IMAGE_READ_TIMEOUT_SECONDS = get_env_int_or_default("WOLFRAM_ALPHA_IMAGE_READ_TIMEOUT_SECONDS", 15)
 
-@register_tool_factory(tool_id='run_wolfram_alpha_tool')
+# Maximum number of images (of a single response or across concurrent tool calls) that are downloaded at a time.
+_IMAGE_FETCH_CONCURRENCY = get_env_int_or_default("WOLFRAM_ALPHA_IMAGE_FETCH_CONCURRENCY", 6)
+
+
+@register_tool_factory(tool_id='run_wolfram_alpha_tool', parallel_safe=False)
 def prepare_run_wolfram_alpha_tool(ctx: AgentCtx):
     """
     Prepares a tool that sends queries to the Wolfram Alpha API.
@@ -34,16 +42,23 @@ def prepare_run_wolfram_alpha_tool(ctx: AgentCtx):
                 "input": query,
                 "appid": get_env_raise_if_none("WOLFRAM_ALPHA_APPID"),
             }
-            resp = requests.get(_API_URL, params=params)
+            resp = _get_http_session().get(
+                _API_URL, 
+                params=params, 
+                timeout=(_CONNECT_TIMEOUT_SECONDS, _API_READ_TIMEOUT_SECONDS),
+            )
             resp.raise_for_status()
             
             output = resp.text
 
-            for image_link, caption in _extract_image_links_from_api_response(output):
-                image_base64 = _get_image_as_base64(image_link)
+            image_links = _extract_image_links_from_api_response(output)
+
+            # The images are downloaded concurrently, but added to the trace history in the order that they appear in.
+            images = _get_image_fetch_executor().map(_get_image, [link for link, _ in image_links])
 
-                if image_base64 is not None:
-                    _add_image_to_trace_history(ctx, image_base64, caption)
+            for (_, caption), image in zip(image_links, images):
+                if image is not None:
+                    _add_image_to_trace_history(ctx, image, caption)
 
             return output
         
@@ -67,24 +82,15 @@ def prepare_run_wolfram_alpha_tool(ctx: AgentCtx):
     return run_wolfram_alpha_tool
 
 
-def _get_image_as_base64(url: str) -> str | None:
+def _get_image(url: str) -> bytes | None:
     """
-    Fetches an image from a URL and returns its base64 encoded string.
+    Fetches an image from a URL and returns its raw content.
     """
     try:
-        response = requests.get(url, stream=True)
+        response = _get_http_session().get(url, timeout=(_CONNECT_TIMEOUT_SECONDS, _IMAGE_READ_TIMEOUT_SECONDS))
         response.raise_for_status() # Raise an exception for bad status codes
 
-        # The raw content of the image.
-        image_content = response.content
-
-        # Encode the binary content to Base64.
-        base64_encoded_bytes = base64.b64encode(image_content)
-
-        # Decode the bytes to a string.
-        base64_encoded_string = base64_encoded_bytes.decode('utf-8')
-
-        return base64_encoded_string
+        return response.content
 
     except requests.exceptions.RequestException as e:
         print(f"Error fetching the image: {e}")
@@ -105,6 +111,47 @@ def _extract_image_links_from_api_response(tool_output: str) -> list[tuple[str,
     return image_links
 
 
-def _add_image_to_trace_history(ctx: AgentCtx, image_base64: str, caption: str):
+def _add_image_to_trace_history(ctx: AgentCtx, image: bytes, caption: str):
     # Used for showing the image to the user.
-    ctx.manager.get_tracer().add(ctx.db, ImageCreationTrace(base64_encoded_image=image_base64, caption=caption))
\ No newline at end of file
+    ctx.manager.get_tracer().add(ctx.db, create_image_trace(image, caption))
+
+
+_SINGLETON_HTTP_SESSION: requests.Session | None = None
+_SINGLETON_IMAGE_FETCH_EXECUTOR: ThreadPoolExecutor | None = None
+_init_lock = threading.Lock()
+
+def _get_http_session() -> requests.Session:
+    """
+    Returns the HTTP session shared by the Wolfram Alpha tool, so that the connections to the API 
+    and to its image hosts are kept alive and reused across requests.
+    """
+    global _SINGLETON_HTTP_SESSION
+
+    with _init_lock:
+        if _SINGLETON_HTTP_SESSION is None:
+            session = requests.Session()
+
+            # Large enough for every concurrent image download to keep its own connection to the same host.
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=_IMAGE_FETCH_CONCURRENCY * 2)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+
+            _SINGLETON_HTTP_SESSION = session
+
+        return _SINGLETON_HTTP_SESSION
+
+
+def _get_image_fetch_executor() -> ThreadPoolExecutor:
+    """
+    Returns the executor used for downloading the images of API responses.
+    """
+    global _SINGLETON_IMAGE_FETCH_EXECUTOR
+
+    with _init_lock:
+        if _SINGLETON_IMAGE_FETCH_EXECUTOR is None:
+            _SINGLETON_IMAGE_FETCH_EXECUTOR = ThreadPoolExecutor(
+                max_workers=_IMAGE_FETCH_CONCURRENCY, 
+                thread_name_prefix="wolfram-image-fetch",
+            )
+
+        return _SINGLETON_IMAGE_FETCH_EXECUTOR
@@ -18,14 +18,24 @@ class ToolFactoryInMememoryStore:
         # tool ID -> tool factory
         self._in_memory_store: dict[str, ToolFactory] = {}
 
+        # IDs of the tools that opted out of running concurrently with other tool calls.
+        self._serial_tool_ids: set[str] = set()
+
 
     def get(self, tool_id: str) -> ToolFactory | None:
         return self._in_memory_store.get(tool_id)
     
 
-    def register_factory(self, tool_id: str, factory: ToolFactory):
+    def is_parallel_safe(self, tool_id: str) -> bool:
+        return tool_id not in self._serial_tool_ids
+    
+
+    def register_factory(self, tool_id: str, factory: ToolFactory, parallel_safe: bool = True):
         self._in_memory_store[tool_id] = factory
 
+        if not parallel_safe:
+            self._serial_tool_ids.add(tool_id)
+
 
 _SINGLETON_MEM_STORE = ToolFactoryInMememoryStore()
 
@@ -1,13 +1,17 @@
 from ai.tools.registry.tool_factory_store import ToolFactory, get_tool_factory_in_mem_store
 
-def register_tool_factory(tool_id: str):
+def register_tool_factory(tool_id: str, parallel_safe: bool = True):
     """
     Registers a tool factory under the given tool ID.
     This is for associating tools (using their tool IDs) with their factory.
+
+    Tools with side effects (e.g. tools that use the agent context's DB session or that change the 
+    state of the agent manager) should pass `parallel_safe=False`, so that they never run concurrently 
+    with other such tools called in the same agent step.
     """
     
     def tool_factory_register_decorator(factory: ToolFactory):
-        get_tool_factory_in_mem_store().register_factory(tool_id, factory)
+        get_tool_factory_in_mem_store().register_factory(tool_id, factory, parallel_safe)
         return factory
 
     return tool_factory_register_decorator
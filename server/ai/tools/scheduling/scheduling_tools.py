@@ -12,7 +12,7 @@ from auth.auth import get_user_by_username
 from ai.tools.registry.tool_register_decorator import register_tool_factory
 
 
-@register_tool_factory(tool_id='view_schedule')
+@register_tool_factory(tool_id='view_schedule', parallel_safe=False)
 def prepare_view_schedule_tool(ctx: AgentCtx):
     """
     Prepares a tool that returns a list of events on the schedule.
@@ -27,7 +27,7 @@ def prepare_view_schedule_tool(ctx: AgentCtx):
     return view_schedule
 
 
-@register_tool_factory(tool_id='add_new_event')
+@register_tool_factory(tool_id='add_new_event', parallel_safe=False)
 def prepare_add_new_event_tool(ctx: AgentCtx):
     """
     Prepares a tool that adds a new event to the schedule.
@@ -48,7 +48,7 @@ def prepare_add_new_event_tool(ctx: AgentCtx):
     return add_new_event
 
 
-@register_tool_factory(tool_id='remove_event_with_id')
+@register_tool_factory(tool_id='remove_event_with_id', parallel_safe=False)
 def prepare_delete_event_tool(ctx: AgentCtx):
     """
     Prepares a tool that removes the event with the given ID from the schedule.
@@ -72,7 +72,7 @@ def prepare_delete_event_tool(ctx: AgentCtx):
     return remove_event_with_id
 
 
-@register_tool_factory(tool_id='modify_event')
+@register_tool_factory(tool_id='modify_event', parallel_safe=False)
 def prepare_modify_event_tool(ctx: AgentCtx):
     """
     Prepares a tool that modifies an existing event on the schedule.
@@ -3,6 +3,7 @@ This module is for defining tools relating to web searches.
 """
 
 from langchain_tavily import TavilySearch
+from langchain_core.tools import StructuredTool
 from ai.agent_manager.agent_context import AgentCtx
 from ai.tools.registry.tool_register_decorator import register_tool_factory
 
@@ -34,7 +35,7 @@ def prepare_web_search_tool(ctx: AgentCtx):
     return perform_web_search
 
 
-@register_tool_factory(tool_id='request_external_information')
+@register_tool_factory(tool_id='request_external_information', parallel_safe=False)
 def prepare_request_external_info_tool(ctx: AgentCtx):
     """
     Prepares a tool that requests external information from the research agent.
@@ -44,4 +45,12 @@ def prepare_request_external_info_tool(ctx: AgentCtx):
         """Asks the research agent for help whenever external information is needed, such as external websites or the current date."""
         return ctx.manager.invoke_agent(ctx.manager.get_agent_dict()["research_agent"], query, ctx.db)
     
-    return request_external_information
\ No newline at end of file
+    async def arequest_external_information(query: str) -> str:
+        return await ctx.manager.ainvoke_agent(ctx.manager.get_agent_dict()["research_agent"], query, ctx.db)
+
+    # Provide both a sync and an async implementation, so that the research agent is awaited 
+    # (instead of blocking the event loop) when the calling agent is invoked asynchronously.
+    return StructuredTool.from_function(
+        func=request_external_information,
+        coroutine=arequest_external_information,
+    )
\ No newline at end of file
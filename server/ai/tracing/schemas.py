@@ -52,14 +52,73 @@ class ToolTrace(TraceBase):
 
 class ImageCreationTrace(TraceBase):
     """
-    Trace that logs the creation, contents, and caption of an image by a tool.
+    Trace that logs the creation, contents, and caption of an image by a tool. The image itself is kept in the 
+    blob store (see :py:func:`ai.tracing.trace_images.create_image_trace`), and is served from :py:attr:`image_url`.
+    Traces of the same image share the same stored image.
     """
     kind: Literal["image"] = "image"
-    base64_encoded_image: str
     caption: str
+    image_blob_hash: str | None = None
+    image_url: str | None = None
+
+    # Lightweight preview of the image, so that the full image is only loaded on demand.
+    thumbnail_url: str | None = None
+    image_width: int | None = None
+    image_height: int | None = None
+
+    # Only set for the images that were traced before images were moved to the blob store.
+    base64_encoded_image: str | None = None
 
 
 Trace = AIMessageTrace | HumanMessageTrace | ToolTrace | ImageCreationTrace
 """
 A union type representing all the traces that can be used for logging agent and user activity.
 """
+
+
+class AgentTokenEvent(BaseModel):
+    """
+    Live event that carries a piece of the response that an agent is currently generating. 
+    Live events are pushed to the client but never stored; the complete response is stored 
+    as an :py:class:`ai.tracing.schemas.AIMessageTrace` once the agent finishes.
+    """
+    kind: Literal["ai_token"] = "ai_token"
+    agent_name: str
+    content: str
+
+
+class AgentToolStartEvent(BaseModel):
+    """
+    Live event that signals that an agent started running a tool.
+    """
+    kind: Literal["tool_start"] = "tool_start"
+    agent_name: str
+    tool_name: str
+    tool_call_id: str
+    arguments: dict
+
+
+class AgentToolEndEvent(BaseModel):
+    """
+    Live event that signals that a tool started by an agent finished running.
+    """
+    kind: Literal["tool_end"] = "tool_end"
+    agent_name: str
+    tool_name: str
+    tool_call_id: str
+    is_error: bool
+
+
+class AgentMessageEndEvent(BaseModel):
+    """
+    Live event that signals that an agent finished generating its response. Carries the full response.
+    """
+    kind: Literal["ai_message_end"] = "ai_message_end"
+    agent_name: str
+    content: str
+
+
+AgentStreamEvent = AgentTokenEvent | AgentToolStartEvent | AgentToolEndEvent | AgentMessageEndEvent
+"""
+A union type representing the live events that an agent emits while it is being streamed.
+"""
@@ -4,7 +4,7 @@ are modeled using table inheritance. Each table subtype corresponds to a
 trace schema as defined in the `ai.tracing.schemas` module.
 """
 
-from sqlalchemy import ForeignKey, Text, UUID, Float, Boolean
+from sqlalchemy import ForeignKey, Index, Integer, Text, UUID, Float, Boolean
 from sqlalchemy.orm import mapped_column, Mapped, relationship
 from database.database import Base
 import uuid
@@ -23,6 +23,11 @@ class TraceTable(Base):
 
     chat: Mapped["ChatTable"] = relationship(back_populates="trace_history")
 
+    __table_args__ = (
+        # The traces of all the chats are in this table, and they're always read per chat in timestamp order.
+        Index("ix_traces_chat_id_timestamp", "chat_id", "timestamp"),
+    )
+
     __mapper_args__ = {
         'polymorphic_on': 'kind',
     }
@@ -67,9 +72,40 @@ class ToolTraceTable(TraceTable):
 class ImageCreationTraceTable(TraceTable):
     __tablename__ = None
 
-    base64_encoded_image: Mapped[str] = mapped_column(Text, nullable=True)
+    base64_encoded_image: Mapped[str] = mapped_column(Text, nullable=True) # Legacy, new images are in the blob store.
     caption: Mapped[str] = mapped_column(Text, nullable=True)
+    image_blob_hash: Mapped[str] = mapped_column(Text, nullable=True, index=True)
+    image_width: Mapped[int] = mapped_column(Integer, nullable=True)
+    image_height: Mapped[int] = mapped_column(Integer, nullable=True)
 
     __mapper_args__ = {
         'polymorphic_identity': 'image'
     }
+
+
+class TraceImageTable(Base):
+    """
+    Metadata of each distinct traced image (identified by its blob hash), which is shared 
+    by all the image traces that show the same image.
+    """
+    __tablename__ = "trace_images"
+
+    image_blob_hash: Mapped[str] = mapped_column(Text, primary_key=True)
+    size_bytes: Mapped[int] = mapped_column(Integer)
+    width: Mapped[int] = mapped_column(Integer, nullable=True)
+    height: Mapped[int] = mapped_column(Integer, nullable=True)
+    thumbnail_blob_hash: Mapped[str] = mapped_column(Text)
+
+
+class TraceArchiveWatermarkTable(Base):
+    """
+    Records how much of the trace history of a chat was moved to the trace archive (see 
+    :py:mod:`ai.tracing.trace_archive`). Traces up to :py:attr:`archived_until` may be in the archive.
+    """
+    __tablename__ = "trace_archive_watermarks"
+
+    chat_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("chats.id", ondelete='CASCADE'), primary_key=True)
+    archived_until: Mapped[float] = mapped_column(Float)
+    archived_trace_count: Mapped[int] = mapped_column(Integer)
+
+    chat: Mapped["ChatTable"] = relationship(back_populates="trace_archive_watermark")
@@ -0,0 +1,223 @@
+"""
+This module holds the cold archive of the traces, which keeps the old traces of each chat in compressed 
+NDJSON files on local disk instead of in the `traces` table. Traces are moved to the archive by the 
+retention job (see :py:mod:`ai.tracing.trace_retention`), and the reads of the :py:class:`ai.tracing.tracer.Tracer` 
+fall through to the archive for the part of a chat's history that was archived.
+
+Whether a trace is archived is decided by the watermark of its chat, which is stored in the DB. So when several 
+workers or replicas share a DB, :envvar:`TRACE_ARCHIVE_DIR` must point to storage that they all share (e.g. a 
+network file system), otherwise the traces archived by one of them can't be read by the others.
+"""
+
+import bisect
+import gzip
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Sequence
+
+from pydantic import TypeAdapter
+
+from ai.tracing.schemas import Trace, TraceKind
+from utils.utils import get_env_int_or_default
+
+# Directory of the archive. Relative paths are resolved against the server's directory. Must be shared 
+# storage if several processes use the same DB (see above).
+_TRACE_ARCHIVE_DIR = Path(__file__).parent.parent.parent / os.getenv("TRACE_ARCHIVE_DIR", "trace_archives")
+
+# Number of parsed segments kept in memory, so that reading a long archived history page by page 
+# (e.g. the backlog of a trace stream) parses each segment once instead of once per page.
+_SEGMENT_CACHE_SIZE = get_env_int_or_default("TRACE_ARCHIVE_SEGMENT_CACHE_SIZE", 4)
+
+_SEGMENT_SUFFIX = ".ndjson.gz"
+
+_TRACE_ADAPTER: TypeAdapter[Trace] = TypeAdapter(Trace)
+
+
+class TraceArchive:
+    """
+    Archive of traces, keyed by chat. The archived traces of a chat are stored in segments: each time traces 
+    are archived, they're written (in timestamp order) to a new gzipped NDJSON file in the chat's directory. 
+    Segment files are named after the range of timestamps that they hold, so reads skip the segments that 
+    are entirely before their cursor.
+
+    Segments are never modified once written, so the last :py:attr:`segment_cache_size` segments that were 
+    read are kept parsed in memory.
+    """
+
+    def __init__(self, root_dir: Path, segment_cache_size: int = _SEGMENT_CACHE_SIZE):
+        self.root_dir = root_dir
+        self.segment_cache_size = segment_cache_size
+
+        self._segment_cache: OrderedDict[Path, list[Trace]] = OrderedDict()
+        self._segment_cache_lock = threading.Lock()
+
+
+    def write_segment(self, chat_id: uuid.UUID, traces: Sequence[Trace]):
+        """
+        Archives the given traces (sorted by timestamp) of the given chat in a new segment.
+        """
+        if len(traces) == 0:
+            return
+
+        chat_dir = self._chat_dir(chat_id)
+        chat_dir.mkdir(parents=True, exist_ok=True)
+
+        segment_name = f"{traces[0].timestamp!r}_{traces[-1].timestamp!r}_{uuid.uuid4().hex}{_SEGMENT_SUFFIX}"
+
+        # Written to a temporary file first, so that a segment is never read half-written.
+        fd, tmp_path = tempfile.mkstemp(dir=chat_dir, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f, gzip.GzipFile(fileobj=f, mode="wb") as gz:
+                for trace in traces:
+                    gz.write(trace.model_dump_json().encode("utf-8"))
+                    gz.write(b"\n")
+
+            os.replace(tmp_path, chat_dir / segment_name)
+
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+
+    def read(
+        self, 
+        chat_id: uuid.UUID, 
+        timestamp: float, 
+        exclude_filters: list[TraceKind], 
+        after_id: uuid.UUID | None = None, 
+        limit: int | None = None,
+    ) -> list[Trace]:
+        """
+        Returns the archived traces of the given chat that come after the given cursor, ordered like 
+        :py:meth:`ai.tracing.tracer.Tracer.get_traces_after_timestamp` does.
+        """
+        traces: list[Trace] = []
+
+        for min_timestamp, max_timestamp, path in self._list_segments(chat_id):
+            if max_timestamp < timestamp:
+                continue
+
+            # The segments are sorted by their first timestamp, so no later segment can have an earlier trace.
+            if limit is not None and len(traces) >= limit and min_timestamp > trace_sort_key(traces[limit - 1])[0]:
+                break
+
+            segment = self._read_segment(path)
+
+            # A segment is sorted, so its traces after the cursor are found by bisecting, and only its first 
+            # `limit` traces after the cursor can be part of the page.
+            if after_id is None:
+                start = bisect.bisect_right(segment, timestamp, key=lambda tr: tr.timestamp)
+            else:
+                start = bisect.bisect_right(segment, (timestamp, after_id.hex), key=trace_sort_key)
+
+            taken = 0
+            for trace in segment[start:]:
+                if limit is not None and taken >= limit:
+                    break
+
+                if trace.kind not in exclude_filters:
+                    traces.append(trace)
+                    taken += 1
+
+            traces = dedupe_traces(sorted(traces, key=trace_sort_key))
+
+        return traces[:limit]
+
+
+    def delete_chat(self, chat_id: uuid.UUID):
+        """
+        Deletes the archived traces of the given chat.
+        """
+        shutil.rmtree(self._chat_dir(chat_id), ignore_errors=True)
+
+        with self._segment_cache_lock:
+            for path in [path for path in self._segment_cache if path.parent == self._chat_dir(chat_id)]:
+                del self._segment_cache[path]
+
+
+    def _chat_dir(self, chat_id: uuid.UUID) -> Path:
+        return self.root_dir / chat_id.hex
+
+
+    def _read_segment(self, path: Path) -> list[Trace]:
+        """
+        Returns the traces of the given segment (sorted like the history of a chat), parsing it if it's not cached.
+        """
+        with self._segment_cache_lock:
+            traces = self._segment_cache.get(path)
+            if traces is not None:
+                self._segment_cache.move_to_end(path)
+                return traces
+
+        # Parsed outside of the lock, so that reads of other segments don't wait on it.
+        with gzip.open(path, "rb") as gz:
+            traces = sorted((_TRACE_ADAPTER.validate_json(line) for line in gz if line.strip()), key=trace_sort_key)
+
+        with self._segment_cache_lock:
+            self._segment_cache[path] = traces
+            self._segment_cache.move_to_end(path)
+
+            while len(self._segment_cache) > self.segment_cache_size:
+                self._segment_cache.popitem(last=False)
+
+        return traces
+
+
+    def _list_segments(self, chat_id: uuid.UUID) -> list[tuple[float, float, Path]]:
+        chat_dir = self._chat_dir(chat_id)
+        if not chat_dir.is_dir():
+            return []
+
+        segments = []
+        for path in chat_dir.iterdir():
+            if not path.name.endswith(_SEGMENT_SUFFIX) or path.name.startswith("."):
+                continue
+
+            min_timestamp, max_timestamp, _ = path.name.split("_", 2)
+            segments.append((float(min_timestamp), float(max_timestamp), path))
+
+        return sorted(segments)
+
+
+def trace_sort_key(trace: Trace) -> tuple[float, str]:
+    """
+    Returns the key by which the history of a chat is ordered (timestamp, then ID), matching the order of the DB reads.
+    """
+    return trace.timestamp, trace.id.hex
+
+
+def dedupe_traces(traces: list[Trace]) -> list[Trace]:
+    """
+    Removes the repeated traces from the given sorted traces. A trace can be both archived and in the `traces` 
+    table if the retention job was interrupted after writing a segment.
+    """
+    seen_trace_ids: set[uuid.UUID] = set()
+    deduped = []
+
+    for trace in traces:
+        if trace.id not in seen_trace_ids:
+            seen_trace_ids.add(trace.id)
+            deduped.append(trace)
+
+    return deduped
+
+
+_SINGLETON_TRACE_ARCHIVE: TraceArchive | None = None
+_init_lock = threading.Lock()
+
+def get_trace_archive() -> TraceArchive:
+    """
+    Returns the singleton trace archive, stored in the directory given by the `TRACE_ARCHIVE_DIR` environment variable.
+    """
+    global _SINGLETON_TRACE_ARCHIVE
+
+    with _init_lock:
+        if _SINGLETON_TRACE_ARCHIVE is None:
+            _SINGLETON_TRACE_ARCHIVE = TraceArchive(_TRACE_ARCHIVE_DIR)
+
+        return _SINGLETON_TRACE_ARCHIVE
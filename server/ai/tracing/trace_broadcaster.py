@@ -0,0 +1,110 @@
+"""
+This module defines the in-process publish/subscribe channel used for pushing traces to clients
+as soon as they are committed, instead of having the clients poll for them. The channel also carries 
+the live events that agents emit while their responses are being streamed.
+"""
+
+import asyncio
+import threading
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Sequence
+
+from ai.tracing.schemas import Trace, AgentStreamEvent
+
+_SUBSCRIPTION_QUEUE_SIZE = 1000
+
+BroadcastItem = Trace | AgentStreamEvent
+
+
+@dataclass(eq=False)
+class TraceSubscription:
+    """
+    A subscription to the traces of a single chat. Traces are delivered to the subscription's queue
+    on the event loop that created the subscription.
+    """
+    chat_id: uuid.UUID
+    loop: asyncio.AbstractEventLoop
+    queue: asyncio.Queue[BroadcastItem] = field(default_factory=lambda: asyncio.Queue(maxsize=_SUBSCRIPTION_QUEUE_SIZE))
+
+    # Set when the subscriber fell too far behind and traces were dropped. The subscriber
+    # should then end its stream so that the client resumes from its last cursor.
+    lagged: bool = False
+
+
+class TraceBroadcaster:
+    """
+    Publishes newly committed traces to the subscribers of their chat. Publishing is thread-safe, since
+    traces may be committed from the worker threads that run the agents' tools.
+    """
+
+    def __init__(self):
+        self._subscriptions: defaultdict[uuid.UUID, set[TraceSubscription]] = defaultdict(set)
+        self._lock = threading.Lock()
+
+
+    def subscribe(self, chat_id: uuid.UUID) -> TraceSubscription:
+        """
+        Subscribes to the traces of the given chat. Must be called from within a running event loop.
+        """
+        subscription = TraceSubscription(chat_id=chat_id, loop=asyncio.get_running_loop())
+
+        with self._lock:
+            self._subscriptions[chat_id].add(subscription)
+
+        return subscription
+
+
+    def unsubscribe(self, subscription: TraceSubscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.chat_id)
+            if subscriptions is None:
+                return
+
+            subscriptions.discard(subscription)
+            if len(subscriptions) == 0:
+                del self._subscriptions[subscription.chat_id]
+
+
+    def publish(self, chat_id: uuid.UUID, traces: Sequence[BroadcastItem]):
+        """
+        Publishes the given (already committed) traces or live events to all the subscribers of the given chat.
+        """
+        if len(traces) == 0:
+            return
+
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(chat_id, ()))
+
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(_deliver, subscription, traces)
+
+            except RuntimeError:
+                # The subscriber's event loop was closed.
+                self.unsubscribe(subscription)
+
+
+    def subscriber_count(self, chat_id: uuid.UUID) -> int:
+        with self._lock:
+            return len(self._subscriptions.get(chat_id, ()))
+
+
+def _deliver(subscription: TraceSubscription, traces: Sequence[BroadcastItem]):
+    for trace in traces:
+        try:
+            subscription.queue.put_nowait(trace)
+
+        except asyncio.QueueFull:
+            subscription.lagged = True
+            return
+
+
+_SINGLETON_BROADCASTER = TraceBroadcaster()
+
+def get_trace_broadcaster() -> TraceBroadcaster:
+    """
+    Returns the singleton trace broadcaster.
+    """
+    return _SINGLETON_BROADCASTER
@@ -0,0 +1,185 @@
+"""
+This module holds the helpers for tracing the images that tools show to the user. The images are stored 
+as raw bytes in the blob store, and the traces only refer to them by hash. Since the blob store is 
+content-addressed, an image that's shown several times (e.g. the same plot for a repeated query) is only stored once.
+
+Each distinct image also gets a thumbnail, which is generated in the background when the image is traced 
+(see :py:func:`ensure_image_thumbnail`), so that the chat view only loads the full image on demand.
+"""
+
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+from sqlalchemy.exc import IntegrityError
+
+from ai.tracing.schemas import ImageCreationTrace
+from ai.tracing.tables import TraceImageTable
+from blob_storage.blob_store import get_blob_store
+from database.database import SessionLocal
+from utils.utils import get_env_int_or_default
+
+# Largest width and height of the thumbnails. Smaller images are their own thumbnail.
+_THUMBNAIL_MAX_SIZE = get_env_int_or_default("TRACE_IMAGE_THUMBNAIL_MAX_SIZE", 320)
+
+# Number of threads that generate thumbnails in the background.
+_THUMBNAIL_WORKERS = get_env_int_or_default("TRACE_IMAGE_THUMBNAIL_WORKERS", 2)
+
+# Leading bytes of the image formats produced by the tools, along with their media types.
+_IMAGE_SIGNATURES: list[tuple[bytes, str]] = [
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+]
+
+
+def create_image_trace(image: bytes, caption: str) -> ImageCreationTrace:
+    """
+    Stores the given image in the blob store (unless the same image is stored already), and returns a trace 
+    that shows it to the user. The image's thumbnail is generated in the background.
+    """
+    image_blob_hash = get_blob_store().put(image)
+    image_size = _read_image_size(image)
+
+    _get_thumbnail_executor().submit(_ensure_image_thumbnail_in_background, image_blob_hash, image)
+
+    return ImageCreationTrace(
+        caption=caption,
+        image_blob_hash=image_blob_hash,
+        image_url=get_trace_image_url(image_blob_hash),
+        thumbnail_url=get_trace_thumbnail_url(image_blob_hash),
+        image_width=image_size[0] if image_size is not None else None,
+        image_height=image_size[1] if image_size is not None else None,
+    )
+
+
+def ensure_image_thumbnail(image_blob_hash: str, image: bytes | None = None) -> str | None:
+    """
+    Returns the blob hash of the thumbnail of the image with the given hash, generating the thumbnail (and 
+    recording the image's metadata) first if that hasn't happened yet. Returns `None` if there's no such image.
+    The image's contents may be given to avoid reading them back from the blob store.
+    """
+    with SessionLocal() as db:
+        image_metadata = db.get(TraceImageTable, image_blob_hash)
+        if image_metadata is not None:
+            return image_metadata.thumbnail_blob_hash
+
+        if image is None:
+            image = get_blob_store().get(image_blob_hash)
+
+        if image is None:
+            return None
+
+        thumbnail, image_size = _make_thumbnail(image)
+        thumbnail_blob_hash = get_blob_store().put(thumbnail)
+
+        db.add(TraceImageTable(
+            image_blob_hash=image_blob_hash,
+            size_bytes=len(image),
+            width=image_size[0] if image_size is not None else None,
+            height=image_size[1] if image_size is not None else None,
+            thumbnail_blob_hash=thumbnail_blob_hash,
+        ))
+
+        try:
+            db.commit()
+
+        except IntegrityError:
+            # The same thumbnail was generated concurrently, which stored the same blobs.
+            db.rollback()
+
+        return thumbnail_blob_hash
+
+
+def get_trace_image_url(image_blob_hash: str) -> str:
+    """
+    Returns the URL from which the client loads the traced image with the given hash.
+    """
+    return f"/api/chat/images/{image_blob_hash}/"
+
+
+def get_trace_thumbnail_url(image_blob_hash: str) -> str:
+    """
+    Returns the URL from which the client loads the thumbnail of the traced image with the given hash.
+    """
+    return f"/api/chat/images/{image_blob_hash}/thumbnail/"
+
+
+def get_image_media_type(image: bytes) -> str:
+    """
+    Returns the media type of the given image, going by its leading bytes.
+    """
+    for signature, media_type in _IMAGE_SIGNATURES:
+        if image.startswith(signature):
+            return media_type
+
+    if image[:4] == b"RIFF" and image[8:12] == b"WEBP":
+        return "image/webp"
+
+    return "application/octet-stream"
+
+
+def _read_image_size(image: bytes) -> tuple[int, int] | None:
+    """
+    Returns the width and height of the given image (which only needs its header to be parsed), or 
+    `None` if it isn't an image that Pillow can read.
+    """
+    try:
+        with Image.open(io.BytesIO(image)) as img:
+            return img.size
+
+    except OSError:
+        return None
+
+
+def _make_thumbnail(image: bytes) -> tuple[bytes, tuple[int, int] | None]:
+    """
+    Returns the thumbnail of the given image (encoded as a WebP) along with the image's size. Images that are 
+    already small enough, as well as images that Pillow can't read, are returned as they are.
+    """
+    try:
+        with Image.open(io.BytesIO(image)) as img:
+            image_size = img.size
+            if img.width <= _THUMBNAIL_MAX_SIZE and img.height <= _THUMBNAIL_MAX_SIZE:
+                return image, image_size
+
+            thumbnail = img.convert("RGBA") if img.mode not in ("RGB", "RGBA") else img.copy()
+            thumbnail.thumbnail((_THUMBNAIL_MAX_SIZE, _THUMBNAIL_MAX_SIZE))
+
+            buffered = io.BytesIO()
+            thumbnail.save(buffered, format="WEBP", quality=80)
+
+            return buffered.getvalue(), image_size
+
+    except OSError:
+        return image, None
+
+
+def _ensure_image_thumbnail_in_background(image_blob_hash: str, image: bytes):
+    try:
+        ensure_image_thumbnail(image_blob_hash, image)
+
+    except Exception as e:
+        # The thumbnail is generated on demand instead (see `ensure_image_thumbnail`).
+        print(f"LOG: could not generate the thumbnail of image '{image_blob_hash}': {e}")
+
+
+_SINGLETON_THUMBNAIL_EXECUTOR: ThreadPoolExecutor | None = None
+_init_lock = threading.Lock()
+
+def _get_thumbnail_executor() -> ThreadPoolExecutor:
+    """
+    Returns the executor that generates the thumbnails of new images, off the path of the tool that traced them.
+    """
+    global _SINGLETON_THUMBNAIL_EXECUTOR
+
+    with _init_lock:
+        if _SINGLETON_THUMBNAIL_EXECUTOR is None:
+            _SINGLETON_THUMBNAIL_EXECUTOR = ThreadPoolExecutor(
+                max_workers=max(_THUMBNAIL_WORKERS, 1), 
+                thread_name_prefix="trace-image-thumbnails",
+            )
+
+        return _SINGLETON_THUMBNAIL_EXECUTOR
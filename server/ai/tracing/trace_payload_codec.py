@@ -0,0 +1,97 @@
+"""
+This module holds the (opt-in) codec for the large payload columns of the traces, such as the arguments and 
+return values of tool calls (e.g. whole web search results or command outputs). Payloads above a size threshold 
+are compressed before they're stored, and decompressed when they're read back.
+
+Compressed payloads are stored as text (so that the columns keep their type), tagged with the codec that 
+compressed them. Payloads stored before compression was enabled are read as they are.
+"""
+
+import base64
+import os
+import zlib
+
+from utils.utils import get_env_int_or_default
+
+# "none" stores the payloads as they are, "zlib" or "zstd" compress the large ones. 
+# The "zstd" codec needs the optional `zstandard` package.
+_TRACE_PAYLOAD_CODEC = os.getenv("TRACE_PAYLOAD_COMPRESSION", "none")
+
+if _TRACE_PAYLOAD_CODEC not in ("none", "zlib", "zstd"):
+    raise ValueError(f"Unknown trace payload compression '{_TRACE_PAYLOAD_CODEC}', expected 'none', 'zlib' or 'zstd'")
+
+# Payloads smaller than this (in bytes) aren't worth compressing.
+_COMPRESSION_MIN_BYTES = get_env_int_or_default("TRACE_PAYLOAD_COMPRESSION_MIN_BYTES", 4096)
+
+# Stored payloads that start with this marker are followed by the name of their codec. The marker is 
+# a control character, so that it can't be mistaken for the start of a regular payload in practice.
+_MARKER = "\x01"
+
+_ZLIB_LEVEL = 6
+_ZSTD_LEVEL = 3
+
+
+def encode_trace_payload(payload: str) -> str:
+    """
+    Returns the given payload as it should be stored, compressed if compression is enabled and it's large enough.
+    """
+    data = payload.encode("utf-8")
+
+    if _TRACE_PAYLOAD_CODEC != "none" and len(data) >= _COMPRESSION_MIN_BYTES:
+        compressed = base64.b64encode(_compress(_TRACE_PAYLOAD_CODEC, data)).decode("ascii")
+
+        # Incompressible payloads are kept as they are.
+        if len(compressed) < len(data):
+            return f"{_MARKER}{_TRACE_PAYLOAD_CODEC}:{compressed}"
+
+    # A regular payload that happens to start with the marker is tagged, so that it's not mistaken for a compressed one.
+    if payload.startswith(_MARKER):
+        return f"{_MARKER}raw:{payload}"
+
+    return payload
+
+
+def decode_trace_payload(stored_payload: str) -> str:
+    """
+    Returns the original payload of the given stored payload (see :py:func:`encode_trace_payload`).
+    """
+    if not stored_payload.startswith(_MARKER):
+        return stored_payload
+
+    codec, _, encoded = stored_payload[len(_MARKER):].partition(":")
+
+    if codec == "raw":
+        return encoded
+
+    return _decompress(codec, base64.b64decode(encoded)).decode("utf-8")
+
+
+def _compress(codec: str, data: bytes) -> bytes:
+    if codec == "zlib":
+        return zlib.compress(data, _ZLIB_LEVEL)
+
+    elif codec == "zstd":
+        return _get_zstandard().ZstdCompressor(level=_ZSTD_LEVEL).compress(data)
+
+    else:
+        raise ValueError(f"unknown trace payload codec '{codec}'")
+
+
+def _decompress(codec: str, data: bytes) -> bytes:
+    if codec == "zlib":
+        return zlib.decompress(data)
+
+    elif codec == "zstd":
+        return _get_zstandard().ZstdDecompressor().decompress(data)
+
+    else:
+        raise ValueError(f"unknown trace payload codec '{codec}'")
+
+
+def _get_zstandard():
+    try:
+        import zstandard
+        return zstandard
+
+    except ImportError:
+        raise RuntimeError("the 'zstd' trace payload codec needs the 'zstandard' package to be installed")
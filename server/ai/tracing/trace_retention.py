@@ -0,0 +1,144 @@
+"""
+This module holds the retention job, which keeps the `traces` table small by periodically moving the old traces 
+to the trace archive (see :py:mod:`ai.tracing.trace_archive`). Both retention rules are disabled by default.
+"""
+
+import asyncio
+import time
+import uuid
+
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import Session
+
+from ai.tracing.tables import TraceTable
+from ai.tracing.tracer import ARCHIVABLE_TRACE_CRITERIA, Tracer
+from database.database import SessionLocal
+from utils.utils import get_env_int_or_default
+
+_SECONDS_PER_DAY = 24 * 60 * 60
+
+# Traces older than this many days are archived. Set to 0 to disable.
+_ARCHIVE_AFTER_DAYS = get_env_int_or_default("TRACE_ARCHIVE_AFTER_DAYS", 0)
+
+# All the traces of the chats that have been inactive for this many days are archived. Set to 0 to disable.
+_ARCHIVE_INACTIVE_CHAT_DAYS = get_env_int_or_default("TRACE_ARCHIVE_INACTIVE_CHAT_DAYS", 0)
+
+# Time between the runs of the retention job.
+_ARCHIVE_INTERVAL_MINUTES = get_env_int_or_default("TRACE_ARCHIVE_INTERVAL_MINUTES", 60)
+
+# Maximum number of chats whose traces are archived per run, so that a single run doesn't take too long.
+_ARCHIVE_MAX_CHATS_PER_RUN = get_env_int_or_default("TRACE_ARCHIVE_MAX_CHATS_PER_RUN", 100)
+
+# Maximum number of traces per archive segment.
+_ARCHIVE_BATCH_SIZE = get_env_int_or_default("TRACE_ARCHIVE_BATCH_SIZE", 5_000)
+
+
+class TraceRetentionJob:
+    """
+    Moves the traces older than :py:attr:`archive_after_seconds`, along with all the traces of the chats that have 
+    had no new traces for :py:attr:`inactive_chat_seconds`, to the trace archive every :py:attr:`interval_seconds`.
+    A rule is disabled if its age is `None`.
+    """
+
+    def __init__(
+        self, 
+        archive_after_seconds: float | None, 
+        inactive_chat_seconds: float | None, 
+        interval_seconds: float, 
+        max_chats_per_run: int, 
+        batch_size: int,
+    ):
+        self.archive_after_seconds = archive_after_seconds
+        self.inactive_chat_seconds = inactive_chat_seconds
+        self.interval_seconds = interval_seconds
+        self.max_chats_per_run = max_chats_per_run
+        self.batch_size = max(batch_size, 1)
+
+
+    def is_enabled(self) -> bool:
+        return self.archive_after_seconds is not None or self.inactive_chat_seconds is not None
+
+
+    async def arun(self):
+        """
+        Runs the job periodically until cancelled. Does nothing if both retention rules are disabled.
+        """
+        if not self.is_enabled():
+            return
+
+        while True:
+            try:
+                # The archival is done using sync DB sessions and file IO, so it's done in a worker thread.
+                await asyncio.to_thread(self.archive_once)
+
+            except Exception as e:
+                print(f"LOG: trace archival failed: {e}")
+
+            await asyncio.sleep(self.interval_seconds)
+
+
+    def archive_once(self, now: float | None = None) -> int:
+        """
+        Archives the traces that are due for archival. Returns the number of archived traces.
+        """
+        now = now if now is not None else time.time()
+        archived_count = 0
+
+        with SessionLocal() as db:
+            chats_to_archive = self._get_chats_to_archive(db, now)
+
+            for chat_id, cutoff_timestamp in chats_to_archive:
+                archived_count += Tracer(chat_id).archive_traces_before(db, cutoff_timestamp, self.batch_size)
+
+        if archived_count > 0:
+            print(f"LOG: archived {archived_count} trace(s) of {len(chats_to_archive)} chat(s)")
+
+        return archived_count
+
+
+    def _get_chats_to_archive(self, db: Session, now: float) -> list[tuple[uuid.UUID, float]]:
+        """
+        Returns the chats that have traces due for archival, each with the timestamp before which its traces are archived.
+        """
+        age_cutoff = now - self.archive_after_seconds if self.archive_after_seconds is not None else None
+        inactive_cutoff = now - self.inactive_chat_seconds if self.inactive_chat_seconds is not None else None
+
+        conditions = []
+        if age_cutoff is not None:
+            conditions.append(func.min(TraceTable.timestamp) < age_cutoff)
+        if inactive_cutoff is not None:
+            conditions.append(func.max(TraceTable.timestamp) < inactive_cutoff)
+
+        if len(conditions) == 0:
+            return []
+
+        rows = db.execute(
+            select(TraceTable.chat_id, func.max(TraceTable.timestamp))
+                .filter(ARCHIVABLE_TRACE_CRITERIA)
+                .group_by(TraceTable.chat_id)
+                .having(or_(*conditions))
+                .limit(self.max_chats_per_run)
+        ).all()
+
+        chats_to_archive = []
+        for chat_id, latest_timestamp in rows:
+            # All the traces of an inactive chat are archived, otherwise only the old ones are.
+            is_inactive = inactive_cutoff is not None and latest_timestamp < inactive_cutoff
+            chats_to_archive.append((chat_id, now if is_inactive else age_cutoff))
+
+        return chats_to_archive
+
+
+_SINGLETON_RETENTION_JOB = TraceRetentionJob(
+    _ARCHIVE_AFTER_DAYS * _SECONDS_PER_DAY if _ARCHIVE_AFTER_DAYS > 0 else None,
+    _ARCHIVE_INACTIVE_CHAT_DAYS * _SECONDS_PER_DAY if _ARCHIVE_INACTIVE_CHAT_DAYS > 0 else None,
+    _ARCHIVE_INTERVAL_MINUTES * 60,
+    _ARCHIVE_MAX_CHATS_PER_RUN,
+    _ARCHIVE_BATCH_SIZE,
+)
+
+def get_trace_retention_job() -> TraceRetentionJob:
+    """
+    Returns the singleton trace retention job, as configured by the `TRACE_ARCHIVE_*` environment variables.
+    """
+    return _SINGLETON_RETENTION_JOB
@@ -1,79 +1,439 @@
+import asyncio
+import threading
 from typing import Sequence
 import uuid
 
-from sqlalchemy import select
-from ai.tracing.schemas import Trace, AIMessageTrace, HumanMessageTrace, ToolTrace, ImageCreationTrace, TraceKind
-from ai.tracing.tables import TraceTable, AIMessageTraceTable, HumanMessageTraceTable, ToolTraceTable, ImageCreationTraceTable
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, delete, or_, select
+from ai.tracing.schemas import Trace, AIMessageTrace, HumanMessageTrace, ToolTrace, ImageCreationTrace, TraceKind, AgentStreamEvent
+from ai.tracing.tables import TraceTable, AIMessageTraceTable, HumanMessageTraceTable, ToolTraceTable, ImageCreationTraceTable, TraceArchiveWatermarkTable
+from ai.tracing.trace_archive import TraceArchive, get_trace_archive, trace_sort_key, dedupe_traces
+from ai.tracing.trace_broadcaster import TraceBroadcaster, get_trace_broadcaster
+from ai.tracing.trace_images import get_trace_image_url, get_trace_thumbnail_url
+from ai.tracing.trace_payload_codec import encode_trace_payload, decode_trace_payload
+from sqlalchemy.orm import Session, with_polymorphic
+from sqlalchemy.ext.asyncio import AsyncSession
 import json
 from pydantic import BaseModel
 from datetime import datetime
 
+from database.database import SessionLocal
+from utils.utils import get_env_int_or_default
+
+# Number of buffered traces at which the buffer is flushed, even if no message trace was added.
+_FLUSH_MAX_TRACES = get_env_int_or_default("TRACE_FLUSH_MAX_BUFFERED", 32)
+
+# Delay after which buffered image traces are flushed if nothing else flushed them in the meantime.
+_FLUSH_DELAY_MS = get_env_int_or_default("TRACE_FLUSH_DELAY_MS", 250)
+
+# Traces that flush the buffer as soon as they're added, since they're what the users are waiting on.
+_FLUSH_IMMEDIATELY_TRACE_KINDS: set[str] = {"human_message", "ai_message"}
+
+# Number of failed flushes after which a trace is dropped, so that a trace that can never be committed 
+# (e.g. one that violates a constraint) doesn't keep the traces after it from being committed.
+_FLUSH_MAX_ATTEMPTS = get_env_int_or_default("TRACE_FLUSH_MAX_ATTEMPTS", 5)
+
+_FLUSH_LOCK_POLL_INTERVAL_SECS = 0.005
+
+ARCHIVABLE_TRACE_CRITERIA = or_(TraceTable.kind != "image", ImageCreationTraceTable.image_blob_hash.is_(None))
+"""
+Criteria of the traces that may be moved to the trace archive. Image traces whose image is in the blob store 
+are kept in the DB, since their rows are small and the image endpoint authorizes access to images by them.
+"""
+
 
 class Tracer:
     """
     A tracer is an object which is meant to be used by the agent manager associated with the given chat. 
     It takes in trace schemas and transforms them into their ORM versions for insertion to the database. 
     This class also returns the trace history for a chat as a sequence of trace schemas.
+
+    Traces are group-committed: they're buffered and written to the DB in a single transaction when a message 
+    trace is added, when the buffer holds :py:attr:`flush_max_traces` traces, when the flush timer fires 
+    (:py:attr:`flush_delay_ms` after an image trace was buffered) or when the turn ends. Flushes are serialized 
+    and each one inserts its traces sorted by timestamp, so message traces are never visible before the traces 
+    that were buffered ahead of them.
     """
-    def __init__(self, chat_id: uuid.UUID):
+    def __init__(
+        self, 
+        chat_id: uuid.UUID, 
+        broadcaster: TraceBroadcaster | None = None, 
+        flush_max_traces: int = _FLUSH_MAX_TRACES, 
+        flush_delay_ms: int = _FLUSH_DELAY_MS,
+        archive: TraceArchive | None = None,
+        flush_max_attempts: int = _FLUSH_MAX_ATTEMPTS,
+    ):
         """
-        Initializes the given tracer with the ID of the chat that it is associated with.
+        Initializes the given tracer with the ID of the chat that it is associated with. Committed traces 
+        are published to the given broadcaster (the singleton broadcaster by default). Old traces are 
+        read from the given archive (the singleton archive by default) once they're moved there.
         """
         self.chat_id = chat_id
         self.pending_traces: list[Trace] = []
+        self.broadcaster = broadcaster or get_trace_broadcaster()
+        self.archive = archive or get_trace_archive()
+        self.flush_max_traces = max(flush_max_traces, 1)
+        self.flush_delay_ms = flush_delay_ms
+        self.flush_max_attempts = max(flush_max_attempts, 1)
+
+        # Guards the buffer, the flush timer and the flush failures.
+        self._lock = threading.Lock()
+
+        # Number of failed flushes of each buffered trace that failed to be committed.
+        self._flush_failures: dict[uuid.UUID, int] = {}
+
+        # Held while a flush takes the buffer and commits it, so that flushes are committed in order.
+        self._flush_lock = threading.Lock()
+        self._flush_timer: threading.Timer | None = None
 
 
     # This is for adding traces in scenarios where we don't have a DB context.
     def add_pending(self, trace: Trace):
-        self.pending_traces.append(trace)
+        """
+        Buffers the given trace. It is committed by the next flush (at the latest when the turn ends).
+        """
+        with self._lock:
+            self.pending_traces.append(trace)
 
 
     def commit_all_pending(self, db: Session):
-        # Removed in reverse order, but that doesn't matter since all the APIs 
-        # return the traces sorted by timestamp.
-        while len(self.pending_traces) > 0:
-            trace = self.pending_traces.pop()
-            trace_for_db = _trace_schema_to_table(trace)
-            trace_for_db.chat_id = self.chat_id
-            db.add(trace_for_db)
+        """
+        Flushes the buffered traces to the DB in a single transaction. If the flush fails, the traces are 
+        put back in the buffer, so that the next flush retries them (see :py:meth:`_flush_batches`).
+        """
+        committed: list[Trace] = []
+
+        try:
+            with self._flush_lock:
+                traces = self._take_pending()
+
+                try:
+                    for batch in self._flush_batches(traces):
+                        failed_batch = batch
+
+                        db.add_all([self._to_table(trace) for trace in batch])
+
+                        # Only commit at the end of the batch (no need to commit per trace).
+                        db.commit()
+
+                        committed.extend(batch)
+                        self._forget_flush_failures(batch)
+
+                except Exception:
+                    db.rollback()
+                    self._restore_pending(traces[len(committed):], failed_batch)
+                    raise
+
+        finally:
+            self._publish(committed)
+
+
+    async def acommit_all_pending(self, adb: AsyncSession):
+        """
+        Async version of :py:meth:`commit_all_pending`.
+        """
+        committed: list[Trace] = []
+
+        # The flush lock may be held by a flush running in another thread, so don't block the event loop on it.
+        while not self._flush_lock.acquire(blocking=False):
+            await asyncio.sleep(_FLUSH_LOCK_POLL_INTERVAL_SECS)
+
+        try:
+            traces = self._take_pending()
+
+            try:
+                for batch in self._flush_batches(traces):
+                    failed_batch = batch
+
+                    adb.add_all([self._to_table(trace) for trace in batch])
+                    await adb.commit()
+
+                    committed.extend(batch)
+                    self._forget_flush_failures(batch)
+
+            except Exception:
+                await adb.rollback()
+                self._restore_pending(traces[len(committed):], failed_batch)
+                raise
 
-        # Only commit at the end (no need to commit in the loop).
-        db.commit()
+        finally:
+            self._flush_lock.release()
+            self._publish(committed)
 
 
     def add(self, db: Session, trace: Trace):
         """
-        Adds a new trace to the trace history.
+        Adds a new trace to the trace history. Message traces are committed right away (along with the 
+        buffered traces), other traces are buffered until the next flush.
 
         Args:
             db: The DB session; used for inserting the traces to the DB.
             trace: The trace schema to convert to the ORM version for DB insertion.
         """
-        trace_for_db = _trace_schema_to_table(trace)
-        trace_for_db.chat_id = self.chat_id
+        if self._buffer(trace):
+            self.commit_all_pending(db)
+
+
+    async def aadd(self, adb: AsyncSession, trace: Trace):
+        """
+        Async version of :py:meth:`add`.
+        """
+        if self._buffer(trace):
+            await self.acommit_all_pending(adb)
+
+
+    def _buffer(self, trace: Trace) -> bool:
+        """
+        Buffers the given trace. Returns whether the buffer should be flushed right away; otherwise 
+        makes sure that the flush timer is running.
+        """
+        with self._lock:
+            self.pending_traces.append(trace)
+
+            if trace.kind in _FLUSH_IMMEDIATELY_TRACE_KINDS or len(self.pending_traces) >= self.flush_max_traces:
+                return True
+
+            if self._flush_timer is None:
+                self._flush_timer = threading.Timer(self.flush_delay_ms / 1000, self._flush_from_timer)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+
+            return False
+
+
+    def _take_pending(self) -> list[Trace]:
+        """
+        Empties the buffer and stops the flush timer. Returns the buffered traces sorted by timestamp.
+        """
+        with self._lock:
+            traces = self.pending_traces
+            self.pending_traces = []
+
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+
+        return sorted(traces, key=lambda tr: tr.timestamp)
+
+
+    def _flush_batches(self, traces: list[Trace]) -> list[list[Trace]]:
+        """
+        Splits the given (sorted) traces into the batches that a flush commits one after the other. The traces 
+        are committed in a single batch, unless some of them failed to be committed before. They're then 
+        committed one at a time, so that only the trace that keeps failing is retried (and eventually dropped) 
+        while the traces before it are committed. The flush stops at the first failed batch, so the traces 
+        are still committed in timestamp order.
+        """
+        with self._lock:
+            failed_before = any(trace.id in self._flush_failures for trace in traces)
+
+        if failed_before:
+            return [[trace] for trace in traces]
+        
+        return [traces]
+
+
+    def _forget_flush_failures(self, committed: list[Trace]):
+        with self._lock:
+            if len(self._flush_failures) > 0:
+                for trace in committed:
+                    self._flush_failures.pop(trace.id, None)
+
+
+    def _restore_pending(self, traces: list[Trace], failed_batch: list[Trace]):
+        """
+        Puts the given traces (taken by a failed flush) back at the front of the buffer, ahead of the traces 
+        that were buffered in the meantime. The traces of the batch that failed are dropped once they failed 
+        :py:attr:`flush_max_attempts` times.
+        """
+        with self._lock:
+            for trace in failed_batch:
+                self._flush_failures[trace.id] = self._flush_failures.get(trace.id, 0) + 1
 
-        db.add(trace_for_db)
-        db.commit()
+            dropped_ids = { trace.id for trace in failed_batch if self._flush_failures[trace.id] >= self.flush_max_attempts }
+            for trace_id in dropped_ids:
+                del self._flush_failures[trace_id]
+
+            self.pending_traces = [trace for trace in traces if trace.id not in dropped_ids] + self.pending_traces
+
+        for trace in failed_batch:
+            if trace.id in dropped_ids:
+                print(f"ERROR: dropped the {trace.kind} trace '{trace.id}' of chat {self.chat_id} after {self.flush_max_attempts} failed flushes")
+
+
+    def _flush_from_timer(self):
+        with self._lock:
+            self._flush_timer = None
+
+        try:
+            with SessionLocal() as db:
+                self.commit_all_pending(db)
+
+        except Exception as e:
+            print(f"LOG: could not flush the pending traces of chat {self.chat_id}: {e}")
+
+
+    def _publish(self, traces: list[Trace]):
+        if len(traces) > 0:
+            self.broadcaster.publish(self.chat_id, traces)
+
+
+    def publish_live_event(self, event: AgentStreamEvent):
+        """
+        Pushes a live event to the clients currently subscribed to this chat. Live events are not stored.
+        """
+        self.broadcaster.publish(self.chat_id, [event])
+
+
+    def has_live_subscribers(self) -> bool:
+        return self.broadcaster.subscriber_count(self.chat_id) > 0
+    
+
+    def get_traces_after_timestamp(
+        self, 
+        db: Session, 
+        timestamp: float, 
+        exclude_filters: list[TraceKind], 
+        after_id: uuid.UUID | None = None, 
+        limit: int | None = None,
+    ) -> Sequence[Trace]:
+        """
+        Returns the traces created after the given timestamp as a sequence of trace schemas, ordered by 
+        timestamp (and ID for traces with the same timestamp). At most :py:attr:`limit` traces are returned.
+
+        To read the next page, call this again with the timestamp and ID of the last returned trace 
+        (as :py:attr:`after_id`), which also returns the remaining traces that have that same timestamp.
+
+        The archived part of the history (if any) is read from the trace archive.
+        """
+        stmt = self._traces_after_timestamp_stmt(timestamp, exclude_filters, after_id, limit)
+        results = db.execute(stmt).scalars().all()
+        schemas = [_trace_table_to_schema(tr) for tr in results]
+
+        archived_until = db.scalar(self._archived_until_stmt())
+        if archived_until is None or timestamp > archived_until:
+            return schemas
+
+        archived_schemas = self.archive.read(self.chat_id, timestamp, exclude_filters, after_id, limit)
+        return _merge_trace_pages(archived_schemas, schemas, limit)
     
 
-    def get_traces_after_timestamp(self, db: Session, timestamp: float, exclude_filters: list[TraceKind]) -> Sequence[Trace]:
+    async def aget_traces_after_timestamp(
+        self, 
+        adb: AsyncSession, 
+        timestamp: float, 
+        exclude_filters: list[TraceKind], 
+        after_id: uuid.UUID | None = None, 
+        limit: int | None = None,
+    ) -> Sequence[Trace]:
         """
-        Returns the traces created after the given timestamp as a sequence of trace schemas.
+        Async version of :py:meth:`get_traces_after_timestamp`.
         """
-        stmt = select(TraceTable)\
+        stmt = self._traces_after_timestamp_stmt(timestamp, exclude_filters, after_id, limit)
+        results = (await adb.execute(stmt)).scalars().all()
+        schemas = [_trace_table_to_schema(tr) for tr in results]
+
+        archived_until = await adb.scalar(self._archived_until_stmt())
+        if archived_until is None or timestamp > archived_until:
+            return schemas
+
+        # Reading the archive's files may block, so it's done in a worker thread.
+        archived_schemas = await asyncio.to_thread(self.archive.read, self.chat_id, timestamp, exclude_filters, after_id, limit)
+        return _merge_trace_pages(archived_schemas, schemas, limit)
+
+
+    def archive_traces_before(self, db: Session, cutoff_timestamp: float, batch_size: int) -> int:
+        """
+        Moves the traces of this tracer's chat that were created before the given timestamp to the trace 
+        archive, in segments of at most :py:attr:`batch_size` traces. Only the traces that match 
+        :py:data:`ARCHIVABLE_TRACE_CRITERIA` are moved. Returns the number of archived traces.
+        """
+        archived_count = 0
+
+        while True:
+            results = db.execute(
+                select(_all_trace_kinds())
+                    .filter(
+                        TraceTable.chat_id == self.chat_id,
+                        TraceTable.timestamp < cutoff_timestamp,
+                        ARCHIVABLE_TRACE_CRITERIA)
+                    .order_by(TraceTable.timestamp, TraceTable.id)
+                    .limit(batch_size)
+            ).scalars().all()
+
+            if len(results) == 0:
+                break
+
+            traces = [_trace_table_to_schema(tr) for tr in results]
+
+            # The segment is written before the traces are deleted, so that they're never lost. If the deletion 
+            # fails, the traces are in both places until they're archived again, and reads ignore the duplicates.
+            self.archive.write_segment(self.chat_id, traces)
+
+            watermark = db.get(TraceArchiveWatermarkTable, self.chat_id)
+            if watermark is None:
+                watermark = TraceArchiveWatermarkTable(chat_id=self.chat_id, archived_until=traces[-1].timestamp, archived_trace_count=0)
+                db.add(watermark)
+
+            watermark.archived_until = max(watermark.archived_until, traces[-1].timestamp)
+            watermark.archived_trace_count += len(traces)
+
+            db.execute(delete(TraceTable).where(TraceTable.id.in_([tr.id for tr in results])), execution_options={"synchronize_session": False})
+            db.commit()
+
+            archived_count += len(traces)
+
+            if len(results) < batch_size:
+                break
+
+        return archived_count
+    
+
+    def _traces_after_timestamp_stmt(
+        self, 
+        timestamp: float, 
+        exclude_filters: list[TraceKind], 
+        after_id: uuid.UUID | None, 
+        limit: int | None,
+    ):
+        # Keyset pagination on (timestamp, id), which is served by the (chat_id, timestamp) index.
+        if after_id is None:
+            after_cursor = TraceTable.timestamp > timestamp
+        else:
+            after_cursor = or_(
+                TraceTable.timestamp > timestamp, 
+                and_(TraceTable.timestamp == timestamp, TraceTable.id > after_id),
+            )
+
+        stmt = select(_all_trace_kinds())\
             .filter(
                 TraceTable.chat_id == self.chat_id, 
-                TraceTable.timestamp > timestamp,
+                after_cursor,
                 TraceTable.kind.notin_(exclude_filters))\
-            .order_by(TraceTable.timestamp)
-        
-        results = db.execute(stmt).scalars().all()
-        schemas = [_trace_table_to_schema(tr) for tr in results]
+            .order_by(TraceTable.timestamp, TraceTable.id)
+
+        if limit is not None:
+            stmt = stmt.limit(limit)
+
+        return stmt
 
-        return schemas
+
+    def _archived_until_stmt(self):
+        return select(TraceArchiveWatermarkTable.archived_until).filter(TraceArchiveWatermarkTable.chat_id == self.chat_id)
+
+
+    def _to_table(self, trace: Trace) -> TraceTable:
+        trace_for_db = _trace_schema_to_table(trace)
+        trace_for_db.chat_id = self.chat_id
+        return trace_for_db
     
 
+def _merge_trace_pages(archived_traces: list[Trace], traces: Sequence[Trace], limit: int | None) -> Sequence[Trace]:
+    """
+    Merges the archived traces and the traces from the DB (both read after the same cursor) into a single page.
+    """
+    return dedupe_traces(sorted([*archived_traces, *traces], key=trace_sort_key))[:limit]
+
+
 def _custom_json_fallback_serializer(obj: object) -> object:
     if isinstance(obj, BaseModel):
         return obj.model_dump()
@@ -86,6 +446,12 @@ def _custom_json_fallback_serializer(obj: object) -> object:
         return str(obj)
 
 
+def _all_trace_kinds():
+    # Traces are read through the base table with the columns of every trace kind loaded up front, 
+    # since async sessions can't lazy load the columns of the trace subtypes.
+    return with_polymorphic(TraceTable, "*")
+
+
 def _trace_table_to_schema(trace_table: TraceTable) -> Trace:
     if trace_table.kind == 'ai_message':
         return AIMessageTrace(
@@ -112,9 +478,9 @@ def _trace_table_to_schema(trace_table: TraceTable) -> Trace:
             timestamp=trace_table.timestamp,
 
             called_by=trace_table.called_by,
-            bound_arguments=json.loads(trace_table.bound_arguments),
+            bound_arguments=json.loads(decode_trace_payload(trace_table.bound_arguments)),
             name=trace_table.name,
-            return_value=trace_table.return_value,
+            return_value=decode_trace_payload(trace_table.return_value),
         )
 
     elif trace_table.kind == 'image':
@@ -122,8 +488,13 @@ def _trace_table_to_schema(trace_table: TraceTable) -> Trace:
             id=trace_table.id,
             timestamp=trace_table.timestamp,
 
-            base64_encoded_image=trace_table.base64_encoded_image,
             caption=trace_table.caption,
+            image_blob_hash=trace_table.image_blob_hash,
+            image_url=get_trace_image_url(trace_table.image_blob_hash) if trace_table.image_blob_hash is not None else None,
+            thumbnail_url=get_trace_thumbnail_url(trace_table.image_blob_hash) if trace_table.image_blob_hash is not None else None,
+            image_width=trace_table.image_width,
+            image_height=trace_table.image_height,
+            base64_encoded_image=trace_table.base64_encoded_image,
         )
 
     else:
@@ -157,9 +528,9 @@ def _trace_schema_to_table(trace_schema: Trace) -> TraceTable:
             timestamp=trace_schema.timestamp,
 
             called_by=trace_schema.called_by,
-            bound_arguments=json.dumps(trace_schema.bound_arguments, default=_custom_json_fallback_serializer),
+            bound_arguments=encode_trace_payload(json.dumps(trace_schema.bound_arguments, default=_custom_json_fallback_serializer)),
             name=trace_schema.name,
-            return_value=trace_schema.return_value,
+            return_value=encode_trace_payload(trace_schema.return_value),
         )
 
     elif trace_schema.kind == 'image':
@@ -167,8 +538,11 @@ def _trace_schema_to_table(trace_schema: Trace) -> TraceTable:
             id=trace_schema.id,
             timestamp=trace_schema.timestamp,
 
-            base64_encoded_image=trace_schema.base64_encoded_image,
             caption=trace_schema.caption,
+            image_blob_hash=trace_schema.image_blob_hash,
+            image_width=trace_schema.image_width,
+            image_height=trace_schema.image_height,
+            base64_encoded_image=trace_schema.base64_encoded_image,
         )
 
     else:
@@ -1,3 +1,4 @@
+import os
 from datetime import datetime, timedelta, timezone
 from typing import Annotated
 import jwt
@@ -6,12 +7,14 @@ from fastapi.security import OAuth2
 from fastapi.security.utils import get_authorization_scheme_param
 from fastapi.openapi.models import OAuthFlows
 from jwt.exceptions import InvalidTokenError
-from passlib.context import CryptContext
 from auth.schemas import AuthCheck, CreateNewUser, UserWithPass
 from auth.tables import UserTable
+from auth.password_hashing import PasswordHasherBusyException, get_password_hasher
 from user_settings.tables import UserSettingsTable
-from database.database import get_database
+from database.database import get_database, get_async_database
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from utils.utils import get_env_raise_if_none
 
@@ -19,7 +22,8 @@ _SECRET_KEY = get_env_raise_if_none("AUTH_SECRET_KEY")
 _ALGORITHM = get_env_raise_if_none("AUTH_ALGORITHM")
 _ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-_PWD_CONTEXT = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Comma-separated usernames of the users that can access the admin routes.
+_ADMIN_USERNAMES = {username.strip() for username in os.getenv("ADMIN_USERNAMES", "").split(",") if username.strip() != ""}
 
 class OAuth2PasswordBearerFromCookies(OAuth2):
     def __init__(
@@ -55,17 +59,28 @@ def get_user_by_username(db: Session, username: str) -> UserTable | None:
     return db.query(UserTable).filter(UserTable.username == username).first()
 
 
-def authenticate_user(db: Session, username: str, password: str):
+async def aget_user_by_username(adb: AsyncSession, username: str) -> UserTable | None:
+    """
+    Async version of :py:func:`get_user_by_username`.
+    """
+    return (await adb.execute(select(UserTable).filter(UserTable.username == username))).scalars().first()
+
+
+async def authenticate_user(db: Session, username: str, password: str):
     user = get_user_by_username(db, username)
     if not user:
         return False
-    if not _verify_password(password, user.hashed_password):
+    if not await _verify_password(password, user.hashed_password):
         return False
     return user
 
 
-def _verify_password(plain_password: str, hashed_password: str) -> bool:
-    return _PWD_CONTEXT.verify(plain_password, hashed_password)
+async def _verify_password(plain_password: str, hashed_password: str) -> bool:
+    try:
+        return await get_password_hasher().verify(plain_password, hashed_password)
+
+    except PasswordHasherBusyException as ex:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(ex))
 
 
 def create_and_set_access_token(response: Response, user: UserTable) -> None:
@@ -93,7 +108,7 @@ def _create_access_token(data: dict, expires_delta: timedelta | None = None):
     return encoded_jwt
 
 
-def try_create_user_with_default_settings(db: Session, new_user: CreateNewUser) -> UserTable:
+async def try_create_user_with_default_settings(db: Session, new_user: CreateNewUser) -> UserTable:
     """
     This method adds a new user to the DB along with some default settings.
     """
@@ -101,7 +116,7 @@ def try_create_user_with_default_settings(db: Session, new_user: CreateNewUser)
     if get_user_by_username(db, new_user.username.strip()) is not None:
         raise HTTPException(status_code=400, detail=f"User '{new_user.username}' already exists.")
     
-    hashed_password = _get_password_hash(new_user.password)
+    hashed_password = await _get_password_hash(new_user.password)
     
     user = UserTable(
         username=new_user.username,
@@ -122,8 +137,12 @@ def try_create_user_with_default_settings(db: Session, new_user: CreateNewUser)
     return user
 
 
-def _get_password_hash(password: str) -> str:
-    return _PWD_CONTEXT.hash(password)
+async def _get_password_hash(password: str) -> str:
+    try:
+        return await get_password_hasher().hash(password)
+
+    except PasswordHasherBusyException as ex:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(ex))
 
 
 # This function is used for dependency injection directly, so the token and 
@@ -134,6 +153,14 @@ async def get_current_user(token: Annotated[str, Depends(OAUTH2_SCHEME)], db: An
     return user
 
 
+# Used for dependency injection in the admin routes.
+async def get_current_admin_user(user: Annotated[UserTable, Depends(get_current_user)]) -> UserTable:
+    if user.username not in _ADMIN_USERNAMES:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only admins can access this resource.")
+    
+    return user
+
+
 # This function is used for dependency injection directly, so the token and 
 # database session need to be marked as FastAPI dependencies. 
 async def check_user_auth(token: Annotated[str, Depends(OAUTH2_SCHEME)], db: Annotated[Session, Depends(get_database)]) -> AuthCheck:
@@ -151,42 +178,54 @@ async def check_user_auth(token: Annotated[str, Depends(OAUTH2_SCHEME)], db: Ann
     )
 
 
+# Async version of `get_current_user`, for async routes that use an async DB session.
+async def aget_current_user(token: Annotated[str, Depends(OAUTH2_SCHEME)], adb: Annotated[AsyncSession, Depends(get_async_database)]) -> UserTable:
+    username = _get_username_from_token(token)
+    user = await aget_user_by_username(adb, username) if username is not None else None
+
+    if user is None:
+        raise _credentials_exception()
+    
+    return user
+
+
 async def _get_curr_user_from_db_impl(
     token: str, 
     db: Session, 
     should_raise_credentials_exception: bool = True,
 ) -> UserTable | None:
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    try:
-        payload = jwt.decode(token, _SECRET_KEY, algorithms=[_ALGORITHM])
-        username = payload.get("sub")
-        if username is None:
-            if should_raise_credentials_exception:
-                raise credentials_exception
-            else:
-                return None
-            
-        user = get_user_by_username(db, username)
-
-    except InvalidTokenError:
-        if should_raise_credentials_exception:
-            raise credentials_exception
-        else:
-            return None
+    username = _get_username_from_token(token)
+    user = get_user_by_username(db, username) if username is not None else None
 
     if user is None:
         if should_raise_credentials_exception:
-            raise credentials_exception
+            raise _credentials_exception()
         else:
             return None
     
     return user
 
 
+def _get_username_from_token(token: str) -> str | None:
+    """
+    Returns the username stored in the given JWT token. Returns `None` if the token is invalid.
+    """
+    try:
+        payload = jwt.decode(token, _SECRET_KEY, algorithms=[_ALGORITHM])
+        return payload.get("sub")
+
+    except InvalidTokenError:
+        return None
+    
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
 def user_from_db_to_dto(user_from_db: UserTable) -> UserWithPass:
     return UserWithPass(
         id=user_from_db.id,
@@ -0,0 +1,113 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, TypeVar
+
+from passlib.context import CryptContext
+
+from auth.schemas import PasswordHashingStats
+from utils.utils import get_env_int_or_default
+
+_WORKER_COUNT = get_env_int_or_default("PASSWORD_HASHING_WORKER_COUNT", 2)
+_MAX_PENDING = get_env_int_or_default("PASSWORD_HASHING_MAX_PENDING", 64)
+
+T = TypeVar("T")
+
+
+class PasswordHasherBusyException(Exception):
+    """
+    Raised when too many password hashing operations are already pending.
+    """
+    pass
+
+
+class PasswordHasher:
+    """
+    Runs the (deliberately slow) bcrypt hashing and verification on a dedicated, bounded thread pool, so that
+    bursts of logins or registrations don't stall the event loop or starve the default executor used by the
+    rest of the server. At most :py:attr:`max_pending` operations can be queued or running at a time.
+    """
+
+    def __init__(self, worker_count: int, max_pending: int):
+        self.worker_count = worker_count
+        self.max_pending = max_pending
+
+        self._pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+        self._executor = ThreadPoolExecutor(max_workers=worker_count, thread_name_prefix="password-hashing")
+
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._rejected = 0
+        self._total_wait_seconds = 0.0
+        self._total_run_seconds = 0.0
+
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self._pwd_context.hash, password)
+
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(self._pwd_context.verify, plain_password, hashed_password)
+
+
+    def get_stats(self) -> PasswordHashingStats:
+        with self._lock:
+            return PasswordHashingStats(
+                worker_count=self.worker_count,
+                max_pending=self.max_pending,
+                queued=self._queued,
+                running=self._running,
+                completed=self._completed,
+                rejected=self._rejected,
+                avg_wait_ms=_average_ms(self._total_wait_seconds, self._completed),
+                avg_run_ms=_average_ms(self._total_run_seconds, self._completed),
+            )
+
+
+    async def _run(self, func: Callable[..., T], *args) -> T:
+        """
+        Runs the given function on the executor. Raises :py:class:`auth.password_hashing.PasswordHasherBusyException`
+        if the executor already has the maximum number of pending operations.
+        """
+        with self._lock:
+            if self._queued + self._running >= self.max_pending:
+                self._rejected += 1
+                raise PasswordHasherBusyException("Too many login attempts are being processed. Try again later.")
+
+            self._queued += 1
+
+        submitted_at = time.perf_counter()
+
+        def timed_call() -> T:
+            started_at = time.perf_counter()
+            with self._lock:
+                self._queued -= 1
+                self._running += 1
+                self._total_wait_seconds += started_at - submitted_at
+
+            try:
+                return func(*args)
+
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._completed += 1
+                    self._total_run_seconds += time.perf_counter() - started_at
+
+        return await asyncio.get_running_loop().run_in_executor(self._executor, timed_call)
+
+
+def _average_ms(total_seconds: float, count: int) -> float:
+    return (total_seconds / count) * 1000 if count > 0 else 0.0
+
+
+_SINGLETON_PASSWORD_HASHER = PasswordHasher(_WORKER_COUNT, _MAX_PENDING)
+
+def get_password_hasher() -> PasswordHasher:
+    """
+    Returns the singleton password hasher.
+    """
+    return _SINGLETON_PASSWORD_HASHER
@@ -7,7 +7,7 @@ from fastapi.routing import APIRouter
 
 from auth.auth import *
 
-from auth.schemas import CreateNewUser, User
+from auth.schemas import CreateNewUser, User, PasswordHashingStats
 from auth import services
 
 from sqlalchemy.orm import Session
@@ -21,7 +21,7 @@ async def login_for_authorization_in_cookies(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
     db: Annotated[Session, Depends(get_database)],
 ):
-    services.try_login_user(db, response, form_data.username, form_data.password)
+    await services.try_login_user(db, response, form_data.username, form_data.password)
     return { "message": "Successfully authenticated." }
 
 
@@ -38,7 +38,7 @@ async def register(
     new_user: CreateNewUser,
     db: Annotated[Session, Depends(get_database)],
 ):    
-    services.try_register_and_login_user(db, response, new_user)
+    await services.try_register_and_login_user(db, response, new_user)
     return { "message": "Successfully registered." }
 
 
@@ -54,3 +54,9 @@ async def read_users_me(
 ) -> User:
     return user_from_db_to_dto(current_user)
 
+
+@router.get("/api/auth/password-hashing-stats/", tags=["auth"])
+async def get_password_hashing_stats(
+    current_user: Annotated[UserTable, Depends(get_current_admin_user)],
+) -> PasswordHashingStats:
+    return services.get_password_hashing_stats()
@@ -42,4 +42,18 @@ class UserWithPass(User):
 
 class AuthCheck(BaseModel):
     is_auth: bool
-    user: User | None
\ No newline at end of file
+    user: User | None
+
+
+class PasswordHashingStats(BaseModel):
+    """
+    A snapshot of the state of the password hashing executor.
+    """
+    worker_count: int
+    max_pending: int
+    queued: int
+    running: int
+    completed: int
+    rejected: int
+    avg_wait_ms: float
+    avg_run_ms: float
@@ -0,0 +1,4 @@
+"""
+This package contains the content-addressed blob store, which holds binary payloads (such as the images 
+shown to the user) outside of the DB rows that refer to them.
+"""
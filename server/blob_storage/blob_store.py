@@ -0,0 +1,27 @@
+import os
+from pathlib import Path
+
+from blob_storage.blob_store_interface import IBlobStore
+from blob_storage.filesystem_blob_store import FilesystemBlobStore
+
+# Only the local filesystem backend is supported for now.
+_BLOB_STORE_KIND = os.getenv("BLOB_STORE", "filesystem")
+
+if _BLOB_STORE_KIND != "filesystem":
+    raise ValueError(f"Unknown blob store '{_BLOB_STORE_KIND}', expected 'filesystem'")
+
+# Directory of the filesystem blob store. Relative paths are resolved against the server's directory.
+_BLOB_STORE_DIR = Path(__file__).parent.parent / os.getenv("BLOB_STORE_DIR", "blobs")
+
+_SINGLETON_BLOB_STORE: IBlobStore | None = None
+
+def get_blob_store() -> IBlobStore:
+    """
+    Returns the singleton blob store, as configured by the `BLOB_STORE*` environment variables.
+    """
+    global _SINGLETON_BLOB_STORE
+
+    if _SINGLETON_BLOB_STORE is None:
+        _SINGLETON_BLOB_STORE = FilesystemBlobStore(_BLOB_STORE_DIR)
+
+    return _SINGLETON_BLOB_STORE
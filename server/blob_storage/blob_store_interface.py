@@ -0,0 +1,23 @@
+from typing import Protocol
+
+
+class IBlobStore(Protocol):
+    """
+    An interface that represents a content-addressed store of binary blobs. Blobs are immutable and 
+    identified by the SHA-256 hash of their contents, so storing the same contents twice stores them once.
+    """
+
+    def put(self, data: bytes) -> str:
+        """
+        Stores the given blob (if it isn't stored already) and returns its hash.
+        """
+        ...
+
+    def get(self, blob_hash: str) -> bytes | None:
+        """
+        Returns the contents of the blob with the given hash. Returns `None` if there's no such blob.
+        """
+        ...
+
+    def contains(self, blob_hash: str) -> bool:
+        ...
@@ -0,0 +1,68 @@
+import hashlib
+import os
+import re
+import tempfile
+from pathlib import Path
+
+_BLOB_HASH_PATTERN = re.compile(r"[0-9a-f]{64}")
+
+
+class FilesystemBlobStore:
+    """
+    Blob store that keeps each blob in a file under :py:attr:`root_dir`, named after its hash. The files are 
+    spread over subdirectories by the first characters of their hash, so no single directory grows too large.
+    """
+
+    def __init__(self, root_dir: Path):
+        self.root_dir = root_dir
+        self.root_dir.mkdir(parents=True, exist_ok=True)
+
+
+    def put(self, data: bytes) -> str:
+        blob_hash = hashlib.sha256(data).hexdigest()
+        path = self._path_for(blob_hash)
+
+        if path.exists():
+            return blob_hash
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Written to a temporary file first, so that a blob is never seen half-written.
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+
+            os.replace(tmp_path, path)
+
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+        return blob_hash
+
+
+    def get(self, blob_hash: str) -> bytes | None:
+        if not is_blob_hash(blob_hash):
+            return None
+
+        try:
+            return self._path_for(blob_hash).read_bytes()
+
+        except FileNotFoundError:
+            return None
+
+
+    def contains(self, blob_hash: str) -> bool:
+        return is_blob_hash(blob_hash) and self._path_for(blob_hash).exists()
+
+
+    def _path_for(self, blob_hash: str) -> Path:
+        return self.root_dir / blob_hash[:2] / blob_hash[2:4] / blob_hash
+
+
+def is_blob_hash(value: str) -> bool:
+    """
+    Returns whether the given value is a well-formed blob hash (which also keeps it from escaping the store's directory).
+    """
+    return _BLOB_HASH_PATTERN.fullmatch(value) is not None
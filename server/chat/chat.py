@@ -1,17 +1,33 @@
+import asyncio
 import uuid
+from typing import AsyncIterator, Sequence
 from fastapi import HTTPException
 from ai.agent_manager.runtime_agent_manager import RuntimeAgentManager
 from ai.agent_manager.agent_manager_interface import IAgentManager
+from ai.agent_manager.chat_turn_serializer import get_chat_turn_serializer
 from ai.tracing.tracer import Tracer
+from ai.tracing.schemas import Trace, TraceKind, AgentStreamEvent
+from ai.tracing.trace_broadcaster import TraceSubscription
+from ai.tracing.tables import ImageCreationTraceTable
+from ai.tracing.trace_images import ensure_image_thumbnail
+from ai.tracing.trace_archive import get_trace_archive
+from blob_storage.blob_store import get_blob_store
 from chat.tables import ChatTable
 from chat.chat_summaries.tables import ChatSummaryTable
 from chat.schemas import Chat
 from auth.tables import UserTable
 from auth.auth import get_user_by_username
-from ai.agent_manager.agent_manager_store import AgentMangerInMemoryStore
+from ai.agent_manager.agent_manager_store_interface import IAgentManagerStore
+from sqlalchemy import exists, select
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from collections import defaultdict
 from ai.agent.agent_factory import get_agents_for_user
+from ai.agent_manager.agent_context import AgentCtx
+from ai.agent.templates.agent_templates import get_all_agent_template_schemas_for_user
+from ai.checkpointing.agent_checkpointers import delete_agent_checkpoints_for_chat
+from database.database import AsyncSessionLocal
+from utils.utils import get_env_int_or_default
 
 def chat_schema_from_db(chat: ChatTable) -> Chat:
     return Chat(
@@ -20,7 +36,7 @@ def chat_schema_from_db(chat: ChatTable) -> Chat:
     )
 
 
-def initialize_new_chat_for_user(db: Session,  manager_store: AgentMangerInMemoryStore, chat_name: str, username: str) -> ChatTable:
+def initialize_new_chat_for_user(db: Session,  manager_store: IAgentManagerStore, chat_name: str, username: str) -> ChatTable:
     user = get_user_by_username(db, username)
     assert user
 
@@ -38,7 +54,7 @@ def initialize_new_chat_for_user(db: Session,  manager_store: AgentMangerInMemor
     return new_chat
 
 
-def _create_and_register_agent_manager_for_chat(db: Session, chat: ChatTable, manager_store: AgentMangerInMemoryStore) -> IAgentManager:
+def _create_and_register_agent_manager_for_chat(db: Session, chat: ChatTable, manager_store: IAgentManagerStore) -> IAgentManager:
     """
     Automatically creates and registers an Agent Manager for the given chat. Returns the registered manager.
     """
@@ -80,14 +96,17 @@ def _load_chat_summaries_as_default_dict(summaries: list[ChatSummaryTable]) -> d
 
 
 def get_chat_by_id_from_user_throwing(db: Session, user: UserTable, chat_id: uuid.UUID) -> ChatTable:
-    chat = _get_chat_by_id_from_user(db, user, chat_id)
+    chat = get_chat_by_id_from_user(db, user, chat_id)
     if chat is None:
         raise HTTPException(status_code=400, detail=f"Invalid chat ID '{chat_id}'")
     
     return chat
 
 
-def _get_chat_by_id_from_user(db: Session, user: UserTable, chat_id: uuid.UUID) -> ChatTable | None:
+def get_chat_by_id_from_user(db: Session, user: UserTable, chat_id: uuid.UUID) -> ChatTable | None:
+    """
+    Returns the chat with the given ID if it belongs to the given user. Returns `None` otherwise.
+    """
     chat = db.get(ChatTable, chat_id)
     if chat is None:
         return None
@@ -99,28 +118,100 @@ def _get_chat_by_id_from_user(db: Session, user: UserTable, chat_id: uuid.UUID)
     return chat
 
 
+async def aget_chat_by_id_from_user_throwing(adb: AsyncSession, user: UserTable, chat_id: uuid.UUID) -> ChatTable:
+    """
+    Async version of :py:func:`get_chat_by_id_from_user_throwing`.
+    """
+    chat = await adb.get(ChatTable, chat_id)
+
+    # A user should not be able to view other user's chats. The IDs are compared since 
+    # relationships can't be lazy loaded with async sessions.
+    if chat is None or chat.user_id != user.id:
+        raise HTTPException(status_code=400, detail=f"Invalid chat ID '{chat_id}'")
+    
+    return chat
+
+
+async def aget_trace_image_from_user_throwing(adb: AsyncSession, user: UserTable, image_blob_hash: str, thumbnail: bool = False) -> bytes:
+    """
+    Returns the traced image with the given hash (or its thumbnail), as long as it was shown in one of 
+    the user's chats. Raises an :py:class:`HTTPException` otherwise.
+    """
+    # Images are shared by hash across chats, so the user only needs one of their chats to have shown it.
+    is_users_image = await adb.scalar(
+        select(exists()
+            .where(
+                ImageCreationTraceTable.image_blob_hash == image_blob_hash,
+                ImageCreationTraceTable.chat_id == ChatTable.id,
+                ChatTable.user_id == user.id,
+            ))
+    )
+
+    image = None
+
+    if is_users_image:
+        # The thumbnail may still be being generated (or the image may predate thumbnails), in which case it's generated now.
+        blob_hash = await asyncio.to_thread(ensure_image_thumbnail, image_blob_hash) if thumbnail else image_blob_hash
+
+        # Reading the file may block, so it's done in a worker thread.
+        image = await asyncio.to_thread(get_blob_store().get, blob_hash) if blob_hash is not None else None
+
+    if image is None:
+        raise HTTPException(status_code=404, detail=f"Image '{image_blob_hash}' not found")
+
+    return image
+
+
 def _chat_belongs_to_user(chat: ChatTable, user: UserTable) -> bool:
     return chat.user.username == user.username
 
 
-def get_or_init_agent_manager_for_chat(db: Session, manager_store: AgentMangerInMemoryStore, owner: UserTable, chat: ChatTable) -> IAgentManager:
+def get_or_init_agent_manager_for_chat(db: Session, manager_store: IAgentManagerStore, owner: UserTable, chat: ChatTable) -> IAgentManager:
     manager = manager_store.get_manager_for_chat(chat.id)
 
     if manager is None:
-        chat = _get_chat_by_id_from_user(db, owner, chat.id)
+        chat = get_chat_by_id_from_user(db, owner, chat.id)
         assert chat
-        manager = _create_and_register_agent_manager_for_chat(db, chat, manager_store)
+
+        # The store may hold the chat's state from an earlier manager (e.g. one built by another process), 
+        # which is restored into the new manager.
+        manager = _create_agent_manager_from_chat(db, chat)
+        manager_store.restore_and_register_manager_for_chat(manager)
 
     return manager
 
 
-def reset_all_agent_managers_for_user(db: Session, manager_store: AgentMangerInMemoryStore, user: UserTable):
+def refresh_all_agent_managers_for_user(db: Session, manager_store: IAgentManagerStore, user: UserTable):
+    """
+    Brings the live agent managers of the user's chats up to date with the user's agent templates and settings. 
+    Only the agents whose definition changed are replaced (and they're built on their next use), so the 
+    conversations of the other agents are kept as they are. Each manager is refreshed between the turns of 
+    its chat, so this blocks while waiting for running turns to finish.
+    """
+    agent_templates = get_all_agent_template_schemas_for_user(db, user)
+    refreshed_agent_count = 0
+
+    def refresh_manager(manager: IAgentManager):
+        nonlocal refreshed_agent_count
+
+        agents = get_agents_for_user(AgentCtx(manager=manager, default_db=db), user, manager.get_tracer(), agent_templates)
+
+        # Replacing the agents in the middle of a turn would swap them out from under the running agent.
+        with get_chat_turn_serializer().turn(manager.get_chat_id()):
+            refreshed_agent_count += manager.refresh_agents(agents)
+
+    manager_store.refresh_managers_for_chats([chat.id for chat in user.chats], refresh_manager)
+
+    print(f"LOG: refreshed {refreshed_agent_count} agent(s) in the agent managers of user '{user.username}'")
+
+
+def reset_all_agent_managers_for_user(db: Session, manager_store: IAgentManagerStore, user: UserTable):
     for chat in user.chats:
         _reset_agent_manager_for_chat(db, manager_store, user, chat.id)
 
 
-def _reset_agent_manager_for_chat(db: Session, manager_store: AgentMangerInMemoryStore, owner: UserTable, chat_id: uuid.UUID):
-    chat = _get_chat_by_id_from_user(db, owner, chat_id)
+def _reset_agent_manager_for_chat(db: Session, manager_store: IAgentManagerStore, owner: UserTable, chat_id: uuid.UUID):
+    chat = get_chat_by_id_from_user(db, owner, chat_id)
     assert chat
     # Replace the existing manager by just creating and registering a new one.
     _create_and_register_agent_manager_for_chat(db, chat, manager_store)
@@ -128,7 +219,7 @@ def _reset_agent_manager_for_chat(db: Session, manager_store: AgentMangerInMemor
     print(f"LOG: agent manager for chat '{chat.id}' was reset")
 
 
-def delete_chat(db: Session, manager_store: AgentMangerInMemoryStore, owner: UserTable, chat: ChatTable) -> bool:
+def delete_chat(db: Session, manager_store: IAgentManagerStore, owner: UserTable, chat: ChatTable) -> bool:
     # A user should not be able to delete other user's chats.
     if not _chat_belongs_to_user(chat, owner):
         return False
@@ -136,4 +227,110 @@ def delete_chat(db: Session, manager_store: AgentMangerInMemoryStore, owner: Use
     db.delete(chat)
     db.commit()
     manager_store.delete_entry_with_chat_id(chat.id)
+    delete_agent_checkpoints_for_chat(chat.id)
+    get_trace_archive().delete_chat(chat.id)
     return True
+
+
+_TRACE_STREAM_KEEP_ALIVE_SECONDS = 15.0
+
+TRACE_HISTORY_PAGE_SIZE = get_env_int_or_default("TRACE_HISTORY_PAGE_SIZE", 200)
+"""
+Number of traces read (and sent) at a time when a client requests the trace history of a chat.
+"""
+
+TRACE_HISTORY_MAX_PAGE_SIZE = 1_000
+"""
+Largest page of traces that a client may request at once.
+"""
+
+# The kind of trace that each kind of live event eventually turns into. Used for filtering.
+_LIVE_EVENT_TRACE_KINDS: dict[str, TraceKind] = {
+    "ai_token": "ai_message",
+    "ai_message_end": "ai_message",
+    "tool_start": "tool",
+    "tool_end": "tool",
+}
+
+
+async def open_trace_stream(adb: AsyncSession, tracer: Tracer, after_timestamp: float, exclude_filters: list[TraceKind]) -> AsyncIterator[str]:
+    """
+    Opens a server-sent event stream of the traces of the tracer's chat. The stream starts with the traces created 
+    after the given timestamp, followed by a `ready` event, and then pushes new traces as they are committed. 
+    Each trace event has its timestamp as its ID, so a reconnecting client can resume from the last event it saw. 
+    Live events from agents that are being streamed are sent as `live` events, which have no ID.
+
+    The backlog is read and sent a page of :py:data:`TRACE_HISTORY_PAGE_SIZE` traces at a time, so that 
+    opening a long chat doesn't load its whole history at once.
+    """
+    # Subscribe before reading the backlog so that no trace committed in between is missed.
+    subscription = tracer.broadcaster.subscribe(tracer.chat_id)
+
+    try:
+        first_page = await tracer.aget_traces_after_timestamp(adb, after_timestamp, exclude_filters, limit=TRACE_HISTORY_PAGE_SIZE)
+
+    except Exception:
+        tracer.broadcaster.unsubscribe(subscription)
+        raise
+
+    # The stream may stay open for a long time, so the DB connection is released right away.
+    await adb.close()
+
+    return _trace_event_stream(tracer, subscription, first_page, exclude_filters)
+
+
+async def _trace_event_stream(
+    tracer: Tracer, 
+    subscription: TraceSubscription, 
+    first_page: Sequence[Trace], 
+    exclude_filters: list[TraceKind],
+) -> AsyncIterator[str]:
+    try:
+        # Traces committed while the backlog was being read may also have been published.
+        sent_trace_ids: set[uuid.UUID] = set()
+
+        page = first_page
+        while True:
+            for trace in page:
+                yield _format_trace_event(trace)
+                sent_trace_ids.add(trace.id)
+
+            if len(page) < TRACE_HISTORY_PAGE_SIZE:
+                break
+
+            # Each page is read using a short-lived session, for the same reason as in `open_trace_stream`.
+            last_trace = page[-1]
+            async with AsyncSessionLocal() as adb:
+                page = await tracer.aget_traces_after_timestamp(
+                    adb, last_trace.timestamp, exclude_filters, after_id=last_trace.id, limit=TRACE_HISTORY_PAGE_SIZE,
+                )
+
+        yield "event: ready\ndata: {}\n\n"
+
+        # A lagging subscriber has lost traces, so its stream is ended and the client resumes from its cursor.
+        while not subscription.lagged:
+            try:
+                item = await asyncio.wait_for(subscription.queue.get(), timeout=_TRACE_STREAM_KEEP_ALIVE_SECONDS)
+
+            except TimeoutError:
+                # Comment lines keep proxies from closing idle connections.
+                yield ": keep-alive\n\n"
+                continue
+
+            if isinstance(item, AgentStreamEvent):
+                if _LIVE_EVENT_TRACE_KINDS[item.kind] not in exclude_filters:
+                    yield _format_live_event(item)
+
+            elif item.id not in sent_trace_ids and item.kind not in exclude_filters:
+                yield _format_trace_event(item)
+
+    finally:
+        tracer.broadcaster.unsubscribe(subscription)
+
+
+def _format_trace_event(trace: Trace) -> str:
+    return f"id: {trace.timestamp}\nevent: trace\ndata: {trace.model_dump_json()}\n\n"
+
+
+def _format_live_event(event: AgentStreamEvent) -> str:
+    return f"event: live\ndata: {event.model_dump_json()}\n\n"
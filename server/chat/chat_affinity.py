@@ -0,0 +1,83 @@
+"""
+This module defines the chat-affinity hints for load balancers, which must send all the requests of a chat to 
+the same worker or replica whenever several of them serve the same chats (i.e. with the "db" agent manager store). 
+
+Sticky routing is required, not just an optimization. Only the state of the agent managers is shared through the 
+DB; the rest of a chat's live state is local to the process serving it:
+- the turn serializer, which keeps two turns of the chat from running at once,
+- the turn job queue, which answers the chat's job status requests,
+- the trace broadcaster, which pushes the chat's new traces to its streams.
+
+The shared store only covers a chat moving to another worker between turns (e.g. when a worker restarts), 
+in which case the new worker rebuilds the chat's manager from its latest snapshot.
+"""
+
+import os
+import re
+import socket
+import uuid
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+CHAT_AFFINITY_HEADER = "x-chat-affinity"
+"""
+Response header holding the affinity key of the chat that a request was about. Load balancers should hash on the 
+chat ID in the request path (:py:func:`get_chat_affinity_key`), which gives the same key as this header.
+"""
+
+SERVED_BY_HEADER = "x-served-by"
+"""
+Response header identifying the worker that served the request. Useful for checking that affinity routing works.
+"""
+
+_CHAT_PATH_PATTERN = re.compile(r"^/api/chat/([0-9a-fA-F-]{36})/")
+
+_WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def get_chat_affinity_key(path: str) -> str | None:
+    """
+    Returns the affinity key of the chat that the given request path is about. Returns `None` for paths that aren't about a single chat.
+    """
+    match = _CHAT_PATH_PATTERN.match(path)
+    if match is None:
+        return None
+    
+    try:
+        return str(uuid.UUID(match.group(1)))
+    
+    except ValueError:
+        return None
+
+
+class ChatAffinityMiddleware:
+    """
+    ASGI middleware that adds the chat-affinity headers to the responses of chat requests. Written as a 
+    plain ASGI middleware so that streamed responses (e.g. server-sent events) are passed through untouched.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        affinity_key = get_chat_affinity_key(scope["path"])
+        if affinity_key is None:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_affinity_headers(message: Message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (CHAT_AFFINITY_HEADER.encode(), affinity_key.encode()),
+                    (SERVED_BY_HEADER.encode(), _WORKER_ID.encode()),
+                ]
+
+            await send(message)
+
+        await self.app(scope, receive, send_with_affinity_headers)
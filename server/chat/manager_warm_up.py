@@ -0,0 +1,145 @@
+import asyncio
+import threading
+import time
+import uuid
+
+from sqlalchemy import func, select
+
+from ai.agent.runtime.lazy_agent import LazyAgent
+from ai.agent_manager.agent_manager_store import get_agent_manager_store
+from ai.agent_manager.agent_manager_store_interface import IAgentManagerStore
+from ai.agent_manager.schemas import AgentManagerWarmUpStats
+from ai.tracing.tables import TraceTable
+from chat.chat import get_or_init_agent_manager_for_chat
+from chat.tables import ChatTable
+from database.database import SessionLocal
+from utils.utils import get_env_int_or_default
+
+# Number of recently active chats whose managers are built at startup. Set to 0 to disable the warm-up.
+_WARM_UP_CHAT_COUNT = get_env_int_or_default("AGENT_MANAGER_WARM_UP_CHAT_COUNT", 16)
+
+# Maximum number of managers that are built at the same time during the warm-up.
+_WARM_UP_CONCURRENCY = get_env_int_or_default("AGENT_MANAGER_WARM_UP_CONCURRENCY", 4)
+
+
+class AgentManagerWarmer:
+    """
+    Builds the agent managers of the :py:attr:`chat_count` most recently active chats (going by their latest trace)
+    in the background after startup, at most :py:attr:`concurrency` at a time, so that the first requests after
+    a deploy don't all pay for building their manager at once. The main agent of each manager is built as well,
+    which also compiles the agent graphs that are shared with the other chats.
+
+    The process reports itself as ready (see :py:meth:`get_stats`) once the warm-up is done, even if it failed.
+    """
+
+    def __init__(self, manager_store: IAgentManagerStore, chat_count: int, concurrency: int):
+        self.manager_store = manager_store
+        self.chat_count = chat_count
+        self.concurrency = max(concurrency, 1)
+
+        self._lock = threading.Lock()
+        self._status = "pending" if chat_count > 0 else "disabled"
+        self._warmed = 0
+        self._failed = 0
+        self._started_at: float | None = None
+        self._finished_at: float | None = None
+
+
+    async def awarm_up(self):
+        """
+        Warms up the managers of the most recently active chats. Does nothing if the warm-up is disabled.
+        """
+        if self._status != "pending":
+            return
+
+        self._status = "warming"
+        self._started_at = time.time()
+
+        try:
+            await self._awarm_up_recently_active_chats()
+            self._status = "ready"
+
+        except Exception as e:
+            print(f"LOG: agent manager warm-up failed: {e}")
+            self._status = "failed"
+
+        finally:
+            # A warm-up that was cancelled (e.g. during shutdown) shouldn't keep the process from being ready either.
+            if self._status == "warming":
+                self._status = "failed"
+
+            self._finished_at = time.time()
+            print(f"LOG: agent manager warm-up finished ({self._status}) in {self._finished_at - self._started_at:.2f}s")
+
+
+    async def _awarm_up_recently_active_chats(self):
+        chat_ids = await asyncio.to_thread(self._get_recently_active_chat_ids)
+        print(f"LOG: warming up the agent managers of {len(chat_ids)} recently active chat(s)")
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def warm_up(chat_id: uuid.UUID):
+            async with semaphore:
+                try:
+                    await asyncio.to_thread(self._warm_up_chat, chat_id)
+
+                    with self._lock:
+                        self._warmed += 1
+
+                except Exception as e:
+                    print(f"LOG: could not warm up the agent manager of chat {chat_id}: {e}")
+
+                    with self._lock:
+                        self._failed += 1
+
+        await asyncio.gather(*(warm_up(chat_id) for chat_id in chat_ids))
+
+
+    def is_ready(self) -> bool:
+        return self._status in ("disabled", "ready", "failed")
+
+
+    def get_stats(self) -> AgentManagerWarmUpStats:
+        with self._lock:
+            return AgentManagerWarmUpStats(
+                status=self._status,  # type: ignore
+                ready=self.is_ready(),
+                chat_count=self.chat_count,
+                concurrency=self.concurrency,
+                warmed=self._warmed,
+                failed=self._failed,
+                started_at=self._started_at,
+                finished_at=self._finished_at,
+            )
+
+
+    def _get_recently_active_chat_ids(self) -> list[uuid.UUID]:
+        with SessionLocal() as db:
+            return list(db.scalars(
+                select(TraceTable.chat_id)
+                    .group_by(TraceTable.chat_id)
+                    .order_by(func.max(TraceTable.timestamp).desc())
+                    .limit(self.chat_count)
+            ).all())
+
+
+    def _warm_up_chat(self, chat_id: uuid.UUID):
+        with SessionLocal() as db:
+            chat = db.get(ChatTable, chat_id)
+            if chat is None:
+                return
+
+            manager = get_or_init_agent_manager_for_chat(db, self.manager_store, chat.user, chat)
+
+        main_agent = manager.get_agent_dict()["main_agent"]
+        if isinstance(main_agent, LazyAgent):
+            main_agent.build()
+
+
+_SINGLETON_WARMER = AgentManagerWarmer(get_agent_manager_store(), _WARM_UP_CHAT_COUNT, _WARM_UP_CONCURRENCY)
+
+def get_agent_manager_warmer() -> AgentManagerWarmer:
+    """
+    Returns the singleton agent manager warmer.
+    """
+    return _SINGLETON_WARMER
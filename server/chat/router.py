@@ -1,18 +1,23 @@
 from typing import Annotated, Sequence
 import uuid
-from fastapi import Depends, Query
+from fastapi import Depends, Header, Query, Response
+from fastapi.responses import StreamingResponse
 from fastapi.routing import APIRouter
 
 from ai.tracing.schemas import Trace, TraceKind
-from ai.agent_manager.agent_manager_store import AgentMangerInMemoryStore, get_manager_in_mem_store
+from ai.agent_manager.agent_manager_store import get_agent_manager_store
+from ai.agent_manager.agent_manager_store_interface import IAgentManagerStore
+from ai.agent_manager.schemas import AgentManagerStoreStats, AgentManagerWarmUpStats, AgentManagerStoreIntrospection
 from auth.tables import UserTable
-from auth.auth import get_current_user
+from auth.auth import get_current_user, aget_current_user, get_current_admin_user
 from chat.schemas import ChatModification, CreateNewChat, Chat, UserTextRequest
+from chat.turn_jobs.schemas import TurnJob, TurnJobQueueStats, ChatTurnQueueDepth
 from chat import services
 from chat import chat
 
 from sqlalchemy.orm import Session
-from database.database import get_database
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.database import get_database, get_async_database
 
 router = APIRouter()
 
@@ -36,7 +41,7 @@ async def get_chat_info(
 async def create_new_chat(
     current_user: Annotated[UserTable, Depends(get_current_user)],
     db: Annotated[Session, Depends(get_database)],
-    manager_store: Annotated[AgentMangerInMemoryStore, Depends(get_manager_in_mem_store)],
+    manager_store: Annotated[IAgentManagerStore, Depends(get_agent_manager_store)],
     new_chat_req_body: CreateNewChat,
 ) -> Chat:
     return services.create_and_return_new_chat_for_user(db, manager_store, new_chat_req_body, current_user)
@@ -47,7 +52,7 @@ async def delete_chat_with_id(
     chat_id: uuid.UUID, 
     current_user: Annotated[UserTable, Depends(get_current_user)],
     db: Annotated[Session, Depends(get_database)],
-    manager_store: Annotated[AgentMangerInMemoryStore, Depends(get_manager_in_mem_store)],
+    manager_store: Annotated[IAgentManagerStore, Depends(get_agent_manager_store)],
 ):
     could_delete = services.try_delete_chat_for_user(db, manager_store, chat_id, current_user)
 
@@ -74,11 +79,22 @@ async def modify_chat(
         return { "response": "could not modify chat" }
     
 
+# Not async, since refreshing waits for the running turns of the user's chats (and must not block the event loop while doing so).
+@router.post("/api/chat/refresh-agent-managers/all/")
+def refresh_all_chat_agent_managers(
+    current_user: Annotated[UserTable, Depends(get_current_user)],
+    db: Annotated[Session, Depends(get_database)],
+    manager_store: Annotated[IAgentManagerStore, Depends(get_agent_manager_store)],
+):
+    chat.refresh_all_agent_managers_for_user(db, manager_store, current_user)
+    return { "response": "successfully refreshed agent managers of user in all chats" }
+
+
 @router.post("/api/chat/reset-agent-managers/all/")
 async def reset_all_chat_agent_managers(
     current_user: Annotated[UserTable, Depends(get_current_user)],
     db: Annotated[Session, Depends(get_database)],
-    manager_store: Annotated[AgentMangerInMemoryStore, Depends(get_manager_in_mem_store)],
+    manager_store: Annotated[IAgentManagerStore, Depends(get_agent_manager_store)],
 ):
     chat.reset_all_agent_managers_for_user(db, manager_store, current_user)
     return { "response": "successfully reset agent managers user in all chats" }
@@ -87,20 +103,77 @@ async def reset_all_chat_agent_managers(
 @router.get("/api/chat/{chat_id}/get-latest-messages/{latest_timestamp}/", tags=["chat"])
 async def get_latest_messages(
     chat_id: uuid.UUID, 
-    current_user: Annotated[UserTable, Depends(get_current_user)],
-    db: Annotated[Session, Depends(get_database)],
-    manager_store: Annotated[AgentMangerInMemoryStore, Depends(get_manager_in_mem_store)],
+    current_user: Annotated[UserTable, Depends(aget_current_user)],
+    adb: Annotated[AsyncSession, Depends(get_async_database)],
     latest_timestamp: float, 
     exclude_filters: list[TraceKind] | None = Query(None),
+    after_id: uuid.UUID | None = None,
+    limit: int = Query(chat.TRACE_HISTORY_PAGE_SIZE, ge=1, le=chat.TRACE_HISTORY_MAX_PAGE_SIZE),
 ) -> Sequence[Trace]:
-    return services.get_trace_schemas_after_timestamp_for_user_chat(
-        db, 
-        manager_store, 
+    return await services.get_trace_schemas_after_timestamp_for_user_chat(
+        adb, 
         chat_id, 
         current_user, 
         latest_timestamp,
         exclude_filters or [],  # pass an empty list if no queries were provided
+        after_id,  # ID of the last trace of the previous page (if any), for traces with the same timestamp
+        limit,
+    )
+
+
+@router.get("/api/chat/{chat_id}/stream-messages/", tags=["chat"])
+async def stream_messages(
+    chat_id: uuid.UUID, 
+    current_user: Annotated[UserTable, Depends(aget_current_user)],
+    adb: Annotated[AsyncSession, Depends(get_async_database)],
+    after_timestamp: float = 0.0,
+    exclude_filters: list[TraceKind] | None = Query(None),
+    last_event_id: Annotated[float | None, Header()] = None,
+) -> StreamingResponse:
+    event_stream = await services.open_trace_stream_for_user_chat(
+        adb, 
+        chat_id, 
+        current_user, 
+        last_event_id if last_event_id is not None else after_timestamp,  # resume from the cursor when reconnecting
+        exclude_filters or [],
     )
+    return StreamingResponse(
+        event_stream, 
+        media_type="text/event-stream", 
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/api/chat/images/{image_blob_hash}/", tags=["chat"])
+async def get_trace_image(
+    image_blob_hash: str,
+    current_user: Annotated[UserTable, Depends(aget_current_user)],
+    adb: Annotated[AsyncSession, Depends(get_async_database)],
+    if_none_match: Annotated[str | None, Header()] = None,
+) -> Response:
+    image, media_type = await services.get_trace_image_for_user(adb, current_user, image_blob_hash)
+    return _cacheable_image_response(image, media_type, f'"{image_blob_hash}"', if_none_match)
+
+
+@router.get("/api/chat/images/{image_blob_hash}/thumbnail/", tags=["chat"])
+async def get_trace_image_thumbnail(
+    image_blob_hash: str,
+    current_user: Annotated[UserTable, Depends(aget_current_user)],
+    adb: Annotated[AsyncSession, Depends(get_async_database)],
+    if_none_match: Annotated[str | None, Header()] = None,
+) -> Response:
+    image, media_type = await services.get_trace_image_for_user(adb, current_user, image_blob_hash, thumbnail=True)
+    return _cacheable_image_response(image, media_type, f'"{image_blob_hash}-thumbnail"', if_none_match)
+
+
+def _cacheable_image_response(image: bytes, media_type: str, etag: str, if_none_match: str | None) -> Response:
+    # Images are content-addressed, so they never change and can be cached for as long as the browser likes.
+    cache_headers = {"Cache-Control": "private, max-age=31536000, immutable", "ETag": etag}
+
+    if if_none_match == etag:
+        return Response(status_code=304, headers=cache_headers)
+
+    return Response(content=image, media_type=media_type, headers=cache_headers)
 
 
 @router.post("/api/chat/{chat_id}/send-message/", tags=["chat"])
@@ -109,7 +182,60 @@ async def recieve_user_input(
     user_req: UserTextRequest, 
     current_user: Annotated[UserTable, Depends(get_current_user)],
     db: Annotated[Session, Depends(get_database)],
-    manager_store: Annotated[AgentMangerInMemoryStore, Depends(get_manager_in_mem_store)],
-):
-    services.invoke_agent_manager_for_chat_with_text(db, manager_store, chat_id, current_user, user_req)
-    return { "result": "finished processing" }
\ No newline at end of file
+) -> TurnJob:
+    return services.submit_turn_job_for_chat(db, chat_id, current_user, user_req)
+
+
+@router.get("/api/chat/jobs/stats/", tags=["chat"])
+async def get_turn_job_stats(
+    current_user: Annotated[UserTable, Depends(get_current_admin_user)],
+) -> TurnJobQueueStats:
+    return services.get_turn_job_queue_stats()
+
+
+@router.get("/api/chat/manager-store/stats/", tags=["chat"])
+async def get_agent_manager_store_stats(
+    current_user: Annotated[UserTable, Depends(get_current_admin_user)],
+    manager_store: Annotated[IAgentManagerStore, Depends(get_agent_manager_store)],
+) -> AgentManagerStoreStats:
+    return services.get_agent_manager_store_stats(manager_store)
+
+
+@router.get("/api/admin/agent-managers/", tags=["chat"])
+async def introspect_agent_managers(
+    current_user: Annotated[UserTable, Depends(get_current_admin_user)],
+    manager_store: Annotated[IAgentManagerStore, Depends(get_agent_manager_store)],
+) -> AgentManagerStoreIntrospection:
+    return services.introspect_agent_manager_store(manager_store)
+
+
+@router.get("/api/ready/", tags=["chat"])
+async def get_readiness(response: Response) -> AgentManagerWarmUpStats:
+    """
+    Readiness probe. Responds with 503 until the agent managers of the recently active chats are warmed up.
+    """
+    stats = services.get_agent_manager_warm_up_stats()
+
+    if not stats.ready:
+        response.status_code = 503
+
+    return stats
+
+
+@router.get("/api/chat/{chat_id}/jobs/{job_id}/", tags=["chat"])
+async def get_turn_job(
+    chat_id: uuid.UUID, 
+    job_id: uuid.UUID, 
+    current_user: Annotated[UserTable, Depends(get_current_user)],
+    db: Annotated[Session, Depends(get_database)],
+) -> TurnJob:
+    return services.get_turn_job_for_user_chat(db, chat_id, current_user, job_id)
+
+
+@router.get("/api/chat/{chat_id}/turn-queue-depth/", tags=["chat"])
+async def get_turn_queue_depth(
+    chat_id: uuid.UUID, 
+    current_user: Annotated[UserTable, Depends(get_current_user)],
+    db: Annotated[Session, Depends(get_database)],
+) -> ChatTurnQueueDepth:
+    return services.get_turn_queue_depth_for_user_chat(db, chat_id, current_user)
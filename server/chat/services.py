@@ -1,17 +1,24 @@
-from typing import Sequence
+from typing import AsyncIterator, Sequence
 import uuid
 
-from ai.agent_manager.errors import AgentManagerException
 from ai.tracing.schemas import Trace, TraceKind
-from ai.agent_manager.agent_manager_store import AgentMangerInMemoryStore
+from ai.tracing.tracer import Tracer
+from ai.tracing.trace_images import get_image_media_type
+from ai.agent_manager.agent_manager_store_interface import IAgentManagerStore
+from ai.agent_manager.schemas import AgentManagerStoreStats, AgentManagerWarmUpStats, AgentManagerStoreIntrospection
 from auth.tables import UserTable
 from chat.chat import *
 from chat.schemas import CreateNewChat, Chat, UserTextRequest, ChatModification
+from chat.turn_jobs.schemas import TurnJob, TurnJobQueueStats, ChatTurnQueueDepth
+from ai.agent_manager.chat_turn_serializer import get_chat_turn_serializer
+from chat.turn_jobs.turn_jobs import TurnJobQueueFullException, get_turn_job_queue
+from chat.manager_warm_up import get_agent_manager_warmer
 
 from pydantic import ValidationError
 from fastapi.exceptions import RequestValidationError
 
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 def get_all_user_chat_schemas(user: UserTable) -> Sequence[Chat]:
     """
@@ -24,7 +31,7 @@ def get_chat_info(db: Session, user: UserTable, chat_id: uuid.UUID) -> Chat:
     return chat_schema_from_db(get_chat_by_id_from_user_throwing(db, user, chat_id))
 
 
-def create_and_return_new_chat_for_user(db: Session, manager_store: AgentMangerInMemoryStore, new_chat_schema: CreateNewChat, user: UserTable) -> Chat:
+def create_and_return_new_chat_for_user(db: Session, manager_store: IAgentManagerStore, new_chat_schema: CreateNewChat, user: UserTable) -> Chat:
     """
     Create a new chat using the provided chat creation data :py:attr:`new_chat_schema`. Returns the schema of the newly created chat.
     """
@@ -37,7 +44,7 @@ def create_and_return_new_chat_for_user(db: Session, manager_store: AgentMangerI
     return chat_schema_from_db(new_chat_from_db)
 
 
-def try_delete_chat_for_user(db: Session, manager_store: AgentMangerInMemoryStore, chat_id: uuid.UUID, user: UserTable) -> bool:
+def try_delete_chat_for_user(db: Session, manager_store: IAgentManagerStore, chat_id: uuid.UUID, user: UserTable) -> bool:
     """
     Tries deleting the chat with the given ID for the given user. Raises the :py:class:`fastapi.HTTPException` exception if 
     an issue occurs, such as the given ID not existing in the database or the chat not belonging to the given user.
@@ -72,43 +79,107 @@ def try_modify_chat(db: Session, chat_id: uuid.UUID, user: UserTable, chat_modif
     return True
 
 
-def get_trace_schemas_after_timestamp_for_user_chat(
-    db: Session, 
-    manager_store: AgentMangerInMemoryStore, 
+async def get_trace_schemas_after_timestamp_for_user_chat(
+    adb: AsyncSession, 
     chat_id: uuid.UUID, 
     user: UserTable, 
     timestamp: float,
     exclude_filters: list[TraceKind],
+    after_id: uuid.UUID | None = None,
+    limit: int | None = None,
 ) -> Sequence[Trace]:
     """
     Similar to the :py:func:`chat.services.get_full_trace_schema_history_for_user_chat` service, except that 
-    it only returns the traces created after the provided timestamp.
+    it only returns (at most :py:attr:`limit`) traces created after the provided timestamp. The next page 
+    starts after the timestamp and ID of the last returned trace.
     """
-    chat = get_chat_by_id_from_user_throwing(db, user, chat_id)
-    
-    agent_manager = get_or_init_agent_manager_for_chat(db, manager_store, user, chat)
-    return agent_manager.get_tracer().get_traces_after_timestamp(db, timestamp, exclude_filters)
+    chat = await aget_chat_by_id_from_user_throwing(adb, user, chat_id)
 
+    # Reading the trace history doesn't need the chat's agent manager, so none is built (or awaited) here.
+    return await Tracer(chat.id).aget_traces_after_timestamp(adb, timestamp, exclude_filters, after_id, limit)
 
-def invoke_agent_manager_for_chat_with_text(
+
+async def open_trace_stream_for_user_chat(
+    adb: AsyncSession, 
+    chat_id: uuid.UUID, 
+    user: UserTable, 
+    timestamp: float,
+    exclude_filters: list[TraceKind],
+) -> AsyncIterator[str]:
+    """
+    Push-based alternative to the :py:func:`chat.services.get_trace_schemas_after_timestamp_for_user_chat` service. 
+    Returns a server-sent event stream that starts with the traces created after the provided timestamp and then 
+    delivers new traces as they are committed.
+    """
+    chat = await aget_chat_by_id_from_user_throwing(adb, user, chat_id)
+
+    # Traces are published by chat ID, so the stream doesn't need the chat's agent manager either.
+    return await open_trace_stream(adb, Tracer(chat.id), timestamp, exclude_filters)
+
+
+async def get_trace_image_for_user(adb: AsyncSession, user: UserTable, image_blob_hash: str, thumbnail: bool = False) -> tuple[bytes, str]:
+    """
+    Returns the contents and media type of the traced image with the given hash (or of its thumbnail), if the user has access to it.
+    """
+    image = await aget_trace_image_from_user_throwing(adb, user, image_blob_hash, thumbnail)
+    return image, get_image_media_type(image)
+
+
+def submit_turn_job_for_chat(
     db: Session, 
-    manager_store: AgentMangerInMemoryStore, 
     chat_id: uuid.UUID, 
     current_user: UserTable, 
     user_request: UserTextRequest,
-) -> None:
+) -> TurnJob:
     """
-    Invokes the agent manager associated with the chat with the given ID for the given user. Uses the 
-    contents of the provided :py:attr:`user_request` to generate traces from the agent manager.
+    Submits a job that invokes the agent manager associated with the chat with the given ID for the given user, 
+    using the contents of the provided :py:attr:`user_request`. Returns immediately with the queued job, whose 
+    status can be checked using the :py:func:`chat.services.get_turn_job_for_user_chat` service.
     """
     chat = get_chat_by_id_from_user_throwing(db, current_user, chat_id)
-    
+
     try:
-        agent_manager = get_or_init_agent_manager_for_chat(db, manager_store, current_user, chat)
-        _ = agent_manager.invoke_main_agent_with_text(current_user.username, user_request.user_message, db)
+        return get_turn_job_queue().submit(current_user, chat.id, user_request.user_message)
 
-    except AgentManagerException as ex:
+    except TurnJobQueueFullException as ex:
         raise HTTPException(
-            status_code=400,
+            status_code=503,
             detail=str(ex),
-        )
\ No newline at end of file
+        )
+
+
+def get_turn_job_for_user_chat(db: Session, chat_id: uuid.UUID, current_user: UserTable, job_id: uuid.UUID) -> TurnJob:
+    chat = get_chat_by_id_from_user_throwing(db, current_user, chat_id)
+    job = get_turn_job_queue().get_job(job_id)
+
+    if job is None or job.chat_id != chat.id:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Job '{job_id}' not found.",
+        )
+
+    return job
+
+
+def get_turn_job_queue_stats() -> TurnJobQueueStats:
+    return get_turn_job_queue().get_stats()
+
+
+def get_agent_manager_store_stats(manager_store: IAgentManagerStore) -> AgentManagerStoreStats:
+    return manager_store.get_stats()
+
+
+def introspect_agent_manager_store(manager_store: IAgentManagerStore) -> AgentManagerStoreIntrospection:
+    return manager_store.introspect()
+
+
+def get_agent_manager_warm_up_stats() -> AgentManagerWarmUpStats:
+    return get_agent_manager_warmer().get_stats()
+
+
+def get_turn_queue_depth_for_user_chat(db: Session, chat_id: uuid.UUID, current_user: UserTable) -> ChatTurnQueueDepth:
+    chat = get_chat_by_id_from_user_throwing(db, current_user, chat_id)
+    return ChatTurnQueueDepth(
+        chat_id=chat.id, 
+        queue_depth=get_chat_turn_serializer().get_queue_depth(chat.id),
+    )
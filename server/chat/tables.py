@@ -7,7 +7,7 @@ from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     from auth.tables import UserTable
     from chat.chat_summaries.tables import ChatSummaryTable
-    from ai.tracing.tables import TraceTable
+    from ai.tracing.tables import TraceTable, TraceArchiveWatermarkTable
 
 class ChatTable(Base):
     __tablename__ = "chats"
@@ -18,4 +18,5 @@ class ChatTable(Base):
 
     user: Mapped["UserTable"] = relationship(back_populates="chats")
     summaries: Mapped[list["ChatSummaryTable"]] = relationship(back_populates="chat", cascade="all, delete-orphan")
-    trace_history: Mapped[list["TraceTable"]] = relationship(back_populates="chat", cascade="all, delete-orphan")
\ No newline at end of file
+    trace_history: Mapped[list["TraceTable"]] = relationship(back_populates="chat", cascade="all, delete-orphan")
+    trace_archive_watermark: Mapped["TraceArchiveWatermarkTable | None"] = relationship(back_populates="chat", cascade="all, delete-orphan")
\ No newline at end of file
@@ -0,0 +1,5 @@
+"""
+This package defines the background execution of chat turns. Instead of holding the HTTP request open while 
+the agents of a chat respond, a turn is submitted as a job to the :py:class:`chat.turn_jobs.turn_jobs.TurnJobQueue` 
+queue, which runs it on one of a bounded pool of workers. The status of a job can then be checked using its ID.
+"""
@@ -0,0 +1,45 @@
+from pydantic import BaseModel
+from typing import Literal
+import uuid
+
+TurnJobStatus = Literal["queued", "running", "succeeded", "failed"]
+
+
+class TurnJob(BaseModel):
+    """
+    A chat turn that was submitted for background execution.
+    """
+    id: uuid.UUID
+    chat_id: uuid.UUID
+    status: TurnJobStatus
+    attempts: int
+    error: str | None
+    created_at: float
+    started_at: float | None
+    finished_at: float | None
+
+
+class TurnJobQueueStats(BaseModel):
+    """
+    A snapshot of the state of the turn job queue.
+    """
+    worker_count: int
+    max_queue_size: int
+    queued: int
+    running: int
+    succeeded: int
+    failed: int
+    retried: int
+    rejected: int
+
+    # Number of chats with running or waiting turns, and the deepest per-chat turn queue among them.
+    busy_chats: int
+    max_chat_queue_depth: int
+
+
+class ChatTurnQueueDepth(BaseModel):
+    """
+    The number of turns of a chat that are either running or waiting for the chat's previous turns to finish.
+    """
+    chat_id: uuid.UUID
+    queue_depth: int
@@ -0,0 +1,341 @@
+import asyncio
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from ai.agent_manager.agent_manager_interface import IAgentManager
+from ai.agent_manager.agent_manager_store import get_agent_manager_store
+from ai.agent_manager.agent_manager_store_interface import IAgentManagerStore
+from ai.agent_manager.chat_turn_serializer import get_chat_turn_serializer
+from ai.agent_manager.errors import AgentManagerException
+from auth.tables import UserTable
+from chat.chat import get_or_init_agent_manager_for_chat, get_chat_by_id_from_user
+from chat.turn_jobs.schemas import TurnJob, TurnJobQueueStats
+from database.database import SessionLocal
+from utils.utils import get_env_int_or_default
+
+_WORKER_COUNT = get_env_int_or_default("TURN_JOB_WORKER_COUNT", 4)
+_MAX_QUEUE_SIZE = get_env_int_or_default("TURN_JOB_MAX_QUEUE_SIZE", 100)
+_MAX_RETRIES = get_env_int_or_default("TURN_JOB_MAX_RETRIES", 2)
+
+# Finished jobs are kept around (for status checks) until this many newer jobs are submitted.
+_MAX_FINISHED_JOBS_KEPT = 1000
+
+_RETRY_BASE_DELAY_SECONDS = 1.0
+
+# How long a chat that is running a turn from outside of the queue (e.g. a streamed message) waits before 
+# its jobs are tried again.
+_BUSY_CHAT_RETRY_DELAY_SECONDS = 0.25
+
+
+class TurnJobQueueFullException(Exception):
+    """
+    Raised when a job is submitted while the turn job queue is full.
+    """
+    pass
+
+
+class _TurnStartedException(Exception):
+    """
+    Raised when a job fails after its turn started, in which case retrying the job would replay the turn.
+    """
+    pass
+
+
+class _ChatBusyException(Exception):
+    """
+    Raised when a job's chat is running a turn that was not submitted as a job.
+    """
+    pass
+
+
+@dataclass
+class _TurnJobEntry:
+    job: TurnJob
+    user_id: uuid.UUID
+    username: str
+    user_message: str
+
+
+class TurnJobQueue:
+    """
+    A bounded queue of chat turns, which are run in the background by a fixed pool of workers. The workers
+    are started lazily, the first time that a job is submitted from within the event loop.
+
+    Each chat has a mailbox holding its jobs in submission order. Workers take chats instead of jobs, and 
+    a chat is only handed to one worker at a time, so the jobs of a busy chat wait in its mailbox instead 
+    of occupying the workers that other chats need.
+    """
+
+    def __init__(self, worker_count: int, max_queue_size: int, max_retries: int):
+        self.worker_count = worker_count
+        self.max_queue_size = max_queue_size
+        self.max_retries = max_retries
+
+        self._jobs: OrderedDict[uuid.UUID, _TurnJobEntry] = OrderedDict()
+        self._workers: list[asyncio.Task] = []
+
+        # A chat has a mailbox while it has jobs that haven't finished. Its ID is in the ready queue 
+        # while no worker holds the chat, and taken out of it by the worker that runs the chat's next job.
+        self._mailboxes: dict[uuid.UUID, deque[_TurnJobEntry]] = {}
+        self._ready_chats: asyncio.Queue[uuid.UUID] | None = None
+
+        self._queued = 0
+        self._running = 0
+        self._succeeded = 0
+        self._failed = 0
+        self._retried = 0
+        self._rejected = 0
+
+
+    def submit(self, user: UserTable, chat_id: uuid.UUID, user_message: str) -> TurnJob:
+        """
+        Submits a turn in which the given user sends the given message to the given chat. Returns the queued job.
+        Raises :py:class:`chat.turn_jobs.turn_jobs.TurnJobQueueFullException` if the queue is full.
+        """
+        ready_chats = self._ensure_workers_started()
+
+        if self._queued >= self.max_queue_size:
+            self._rejected += 1
+            raise TurnJobQueueFullException("The server is busy processing other messages. Try again later.")
+
+        entry = _TurnJobEntry(
+            job=TurnJob(
+                id=uuid.uuid4(),
+                chat_id=chat_id,
+                status="queued",
+                attempts=0,
+                error=None,
+                created_at=_now(),
+                started_at=None,
+                finished_at=None,
+            ),
+            user_id=user.id,
+            username=user.username,
+            user_message=user_message,
+        )
+
+        mailbox = self._mailboxes.get(chat_id)
+        if mailbox is None:
+            mailbox = deque()
+            self._mailboxes[chat_id] = mailbox
+            ready_chats.put_nowait(chat_id)
+
+        mailbox.append(entry)
+        self._queued += 1
+
+        self._jobs[entry.job.id] = entry
+        self._forget_old_jobs()
+
+        return entry.job
+
+
+    def get_job(self, job_id: uuid.UUID) -> TurnJob | None:
+        entry = self._jobs.get(job_id)
+        return entry.job if entry is not None else None
+
+
+    def get_stats(self) -> TurnJobQueueStats:
+        chat_queue_depths = get_chat_turn_serializer().get_queue_depths()
+
+        # The jobs waiting in a chat's mailbox haven't reached the chat's turn serializer yet.
+        for chat_id, mailbox in self._mailboxes.items():
+            chat_queue_depths[chat_id] = chat_queue_depths.get(chat_id, 0) + len(mailbox)
+
+        return TurnJobQueueStats(
+            worker_count=self.worker_count,
+            max_queue_size=self.max_queue_size,
+            queued=self._queued,
+            running=self._running,
+            succeeded=self._succeeded,
+            failed=self._failed,
+            retried=self._retried,
+            rejected=self._rejected,
+            busy_chats=len(chat_queue_depths),
+            max_chat_queue_depth=max(chat_queue_depths.values(), default=0),
+        )
+
+
+    def _ensure_workers_started(self) -> asyncio.Queue[uuid.UUID]:
+        if self._ready_chats is None:
+            self._ready_chats = asyncio.Queue()
+            self._workers = [
+                asyncio.create_task(self._work(), name=f"turn-job-worker-{i}")
+                for i in range(self.worker_count)
+            ]
+
+        return self._ready_chats
+
+
+    async def _work(self):
+        assert self._ready_chats is not None
+
+        while True:
+            chat_id = await self._ready_chats.get()
+            mailbox = self._mailboxes[chat_id]
+
+            entry = mailbox.popleft()
+            self._queued -= 1
+
+            self._running += 1
+            try:
+                ran = await self._run_job(entry)
+
+            finally:
+                self._running -= 1
+
+            if not ran:
+                # The job goes back to the front of its chat's mailbox, and the worker moves on to other chats.
+                mailbox.appendleft(entry)
+                self._queued += 1
+                asyncio.get_running_loop().call_later(_BUSY_CHAT_RETRY_DELAY_SECONDS, self._ready_chats.put_nowait, chat_id)
+
+            elif len(mailbox) > 0:
+                # The chat's next job goes behind the chats that are already waiting.
+                self._ready_chats.put_nowait(chat_id)
+
+            else:
+                del self._mailboxes[chat_id]
+
+
+    async def _run_job(self, entry: _TurnJobEntry) -> bool:
+        """
+        Runs the given job, retrying it if it fails before its turn started. Returns False if the job 
+        wasn't run because its chat was busy with another turn, in which case it's left queued.
+        """
+        job = entry.job
+        job.status = "running"
+        job.started_at = _now()
+
+        while True:
+            job.attempts += 1
+
+            try:
+                await _run_turn(entry)
+
+                job.status = "succeeded"
+                self._succeeded += 1
+                break
+
+            except _ChatBusyException:
+                job.attempts -= 1
+                job.status = "queued"
+                job.started_at = None
+                return False
+
+            # These errors come from the agents themselves and are meant for the user. The turn already
+            # started by then (e.g. the user's message was traced), so it is not retried.
+            except AgentManagerException as ex:
+                job.status = "failed"
+                job.error = str(ex)
+                self._failed += 1
+                break
+
+            # The turn may have been partly or fully run (e.g. the user's message was traced and tools with side 
+            # effects were called), so it is not retried.
+            except _TurnStartedException as ex:
+                print(f"ERROR: caught exception [{type(ex.__cause__)}] {ex.__cause__} after the turn of job '{job.id}' started")
+
+                job.status = "failed"
+                job.error = "Unknown error while sending message, try again later."
+                self._failed += 1
+                break
+
+            # Any other error happened before the turn started (e.g. while loading the chat or its agent manager),
+            # so the turn can safely be retried.
+            except Exception as ex:
+                print(f"ERROR: caught exception [{type(ex)}] {ex} while running turn job '{job.id}' (attempt {job.attempts})")
+
+                if job.attempts > self.max_retries:
+                    job.status = "failed"
+                    job.error = "Unknown error while sending message, try again later."
+                    self._failed += 1
+                    break
+
+                self._retried += 1
+                await asyncio.sleep(_RETRY_BASE_DELAY_SECONDS * 2 ** (job.attempts - 1))
+
+        job.finished_at = _now()
+        return True
+
+
+    def _forget_old_jobs(self):
+        """
+        Forgets the oldest finished jobs once more than the allowed number of jobs are being kept.
+        """
+        excess = len(self._jobs) - _MAX_FINISHED_JOBS_KEPT
+
+        for job_id in list(self._jobs.keys()):
+            if excess <= 0:
+                break
+
+            if self._jobs[job_id].job.status in ("succeeded", "failed"):
+                del self._jobs[job_id]
+                excess -= 1
+
+
+async def _run_turn(entry: _TurnJobEntry):
+    """
+    Runs the turn of the given job using a DB session of its own, since the request that
+    submitted the job has already finished.
+    """
+    db = SessionLocal()
+
+    try:
+        user = db.get(UserTable, entry.user_id)
+        assert user
+
+        chat = get_chat_by_id_from_user(db, user, entry.job.chat_id)
+        if chat is None:
+            raise AgentManagerException(f"Chat '{entry.job.chat_id}' no longer exists.")
+
+        manager_store = get_agent_manager_store()
+        manager = get_or_init_agent_manager_for_chat(db, manager_store, user, chat)
+
+        # The workers never wait on a chat's turn. This job's chat only runs one job at a time, so a turn in 
+        # progress was started outside of the queue.
+        if get_chat_turn_serializer().get_queue_depth(chat.id) > 0:
+            raise _ChatBusyException()
+
+        try:
+            await manager.ainvoke_main_agent_with_text(entry.username, entry.user_message, db)
+
+        except AgentManagerException:
+            raise
+
+        except Exception as ex:
+            raise _TurnStartedException() from ex
+
+        finally:
+            # Even a failed turn may have changed the state of the manager (e.g. the agents' memories).
+            await _asave_manager_state(manager_store, manager)
+
+    finally:
+        db.close()
+
+
+async def _asave_manager_state(manager_store: IAgentManagerStore, manager: IAgentManager):
+    """
+    Saves the state of the given manager after its turn. The state may be written to the DB, so it's saved in a 
+    worker thread. Failures are only logged, since the turn itself is already committed and the state is saved 
+    again after the chat's next turn.
+    """
+    try:
+        await asyncio.to_thread(manager_store.save_manager_state, manager)
+
+    except Exception as ex:
+        print(f"ERROR: caught exception [{type(ex)}] {ex} while saving the agent manager state of chat '{manager.get_chat_id()}'")
+
+
+def _now() -> float:
+    return datetime.now(tz=timezone.utc).timestamp()
+
+
+_SINGLETON_TURN_JOB_QUEUE = TurnJobQueue(_WORKER_COUNT, _MAX_QUEUE_SIZE, _MAX_RETRIES)
+
+def get_turn_job_queue() -> TurnJobQueue:
+    """
+    Returns the singleton turn job queue.
+    """
+    return _SINGLETON_TURN_JOB_QUEUE
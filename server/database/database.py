@@ -1,8 +1,17 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 from utils.utils import get_env_raise_if_none
 
+# Async drivers used for each of the supported (sync) database backends.
+_ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
 engine = create_engine(
     get_env_raise_if_none("DATABASE_URL"), 
     pool_pre_ping=True,
@@ -10,11 +19,77 @@ engine = create_engine(
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+def _to_async_url(database_url: str) -> URL:
+    """
+    Converts the given database URL into one that uses the async driver of the same backend.
+    """
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+
+    if backend not in _ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for database backend '{backend}'")
+    
+    url = url.set(drivername=_ASYNC_DRIVERS[backend])
+
+    # asyncpg doesn't understand libpq's `sslmode` parameter, it uses `ssl` instead.
+    if url.get_backend_name() == "postgresql" and "sslmode" in url.query:
+        url = url.difference_update_query(["sslmode"]).update_query_dict({"ssl": url.query["sslmode"]})
+
+    return url
+
+
+async_engine = create_async_engine(
+    _to_async_url(get_env_raise_if_none("DATABASE_URL")), 
+    pool_pre_ping=True,
+)
+
+# Objects loaded by async sessions can't lazy load their attributes after a commit, so they are not expired.
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 """
 The base class for all ORM table classes.
 """
 
+def add_missing_columns():
+    """
+    Adds the (nullable) columns declared by the ORM tables that don't exist in the DB yet. Like indexes, 
+    columns added to an existing table aren't created by `create_all`.
+    """
+    inspector = inspect(engine)
+    preparer = engine.dialect.identifier_preparer
+
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+
+        existing_column_names = {column["name"] for column in inspector.get_columns(table.name)}
+
+        for column in table.columns:
+            if column.name in existing_column_names:
+                continue
+
+            if not column.nullable:
+                raise RuntimeError(f"Cannot add the non-nullable column '{column.name}' to the existing table '{table.name}'")
+
+            column_type = column.type.compile(dialect=engine.dialect)
+            with engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {preparer.format_column(column)} {column_type}"))
+
+            print(f"LOG: added the missing column '{column.name}' to the table '{table.name}'")
+
+
+def create_missing_indexes():
+    """
+    Creates the indexes declared by the ORM tables that don't exist in the DB yet. Unlike tables, indexes 
+    added to an existing table aren't created by `create_all`.
+    """
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+
 def get_database():
     db = SessionLocal()
     try:
@@ -22,3 +97,16 @@ def get_database():
 
     finally:
         db.close()
+
+
+async def get_async_database():
+    """
+    Async version of :py:func:`get_database`. Used by async routes, so that they don't block the 
+    event loop while waiting on the database.
+    """
+    adb: AsyncSession = AsyncSessionLocal()
+    try:
+        yield adb
+
+    finally:
+        await adb.close()
@@ -9,11 +9,16 @@ from auth.router import router as auth_router
 from ai.agent.templates.router import router as agent_router
 from chat.router import router as chat_router
 from user_settings.router import router as user_settings_router
+from chat.chat_affinity import ChatAffinityMiddleware
+from chat.manager_warm_up import get_agent_manager_warmer
+from ai.tracing.trace_retention import get_trace_retention_job
 
+import asyncio
 from pathlib import Path
+from contextlib import asynccontextmanager
 
 # For making sure the database is setup.
-from database.database import Base, engine
+from database.database import Base, engine, async_engine, add_missing_columns, create_missing_indexes
 
 # Side-effect import all the tables to make sure they are loaded.
 import auth.tables as _
@@ -23,11 +28,35 @@ import ai.tools.scheduling.tables as _
 import chat.tables as _
 import chat.chat_summaries.tables as _
 import ai.tracing.tables as _
+import ai.agent_manager.tables as _
+import ai.checkpointing.tables as _
 
 # Create the metadata on the engine.
 Base.metadata.create_all(bind=engine)
+add_missing_columns()
+create_missing_indexes()
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build the agent managers of the recently active chats in the background (see `/api/ready/`).
+    warm_up_task = asyncio.create_task(get_agent_manager_warmer().awarm_up())
+
+    # Periodically move the old traces to the trace archive (if enabled).
+    trace_retention_task = asyncio.create_task(get_trace_retention_job().arun())
+
+    yield
+
+    warm_up_task.cancel()
+    trace_retention_task.cancel()
+
+    # Close the pooled async connections (some async drivers keep a thread per connection).
+    await async_engine.dispose()
+
+
+app = FastAPI(lifespan=lifespan)
+
+# Affinity headers for the load balancer, which must route all the requests of a chat to the same worker.
+app.add_middleware(ChatAffinityMiddleware)
 
 app.include_router(auth_router)
 app.include_router(agent_router)
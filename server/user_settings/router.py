@@ -8,7 +8,8 @@ from database.database import get_database
 from user_settings.schemas import UserSettings
 from user_settings.user_settings import get_settings_table_with_username, settings_to_schema
 from chat import chat
-from ai.agent_manager.agent_manager_store import AgentMangerInMemoryStore, get_manager_in_mem_store
+from ai.agent_manager.agent_manager_store import get_agent_manager_store
+from ai.agent_manager.agent_manager_store_interface import IAgentManagerStore
 
 router = APIRouter()
 
@@ -24,7 +25,7 @@ def view_all_settings(
 def set_settings(
     current_user: Annotated[UserTable, Depends(get_current_user)],
     db: Annotated[Session, Depends(get_database)],
-    manager_store: Annotated[AgentMangerInMemoryStore, Depends(get_manager_in_mem_store)],
+    manager_store: Annotated[IAgentManagerStore, Depends(get_agent_manager_store)],
     new_settings: UserSettings,
 ):
     # Change core settings on the settings table.
@@ -15,3 +15,16 @@ def get_env_raise_if_none(var_name: str) -> str:
     else:
         return value
 
+
+
+def get_env_int_or_default(var_name: str, default: int) -> int:
+    """
+    Gets the given environment variable as an integer. Returns the default if not set.
+    """
+
+    value = os.getenv(var_name)
+
+    if value is None:
+        return default
+    else:
+        return int(value)